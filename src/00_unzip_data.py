@@ -4,6 +4,9 @@ import zipfile
 import hashlib
 import json
 import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
 from logging_config import configure_logging
@@ -21,6 +24,8 @@ SANITIZED_DIR = EXTRACT_ROOT_DIR / "hashed_pages"
 PATH_MAP_FILE = EXTRACT_ROOT_DIR / "path_map.json"
 HASH_FILE = EXTRACT_ROOT_DIR / "file_hashes.json"
 TARGET_FILENAME = "WebHome.html"
+EXTRACT_WORKERS = os.cpu_count() or 1
+EXTRACT_CHUNKSIZE = 32
 
 def get_file_sha256(file_path):
     """Calculates the SHA256 hash of a file."""
@@ -30,12 +35,48 @@ def get_file_sha256(file_path):
             sha256.update(chunk)
     return sha256.hexdigest()
 
+def get_member_fingerprint(member: zipfile.ZipInfo) -> str:
+    """
+    Builds a change-detection key from the zip central directory (CRC32, size, timestamp),
+    so unchanged members never have to be decompressed.
+    """
+    timestamp = "%04d%02d%02d%02d%02d%02d" % member.date_time
+    return f"{member.CRC:08x}-{member.file_size}-{timestamp}"
+
+_WORKER_ZIP = None
+
+def _init_extract_worker(zip_path: str):
+    """Opens one ZipFile handle per worker process."""
+    global _WORKER_ZIP
+    _WORKER_ZIP = zipfile.ZipFile(zip_path, 'r')
+
+def _extract_member(task):
+    member_name, target_path = task
+    target = Path(target_path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    with _WORKER_ZIP.open(member_name) as source, open(target, "wb") as out:
+        shutil.copyfileobj(source, out)
+    return member_name
+
+def extract_members(tasks):
+    """Extracts (member name, target path) pairs, in parallel worker processes when there are enough of them."""
+    if len(tasks) < EXTRACT_CHUNKSIZE:
+        _init_extract_worker(str(ZIP_FILE))
+        for task in tqdm(tasks, desc="Extracting pages"):
+            _extract_member(task)
+        return
+
+    with ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, initializer=_init_extract_worker, initargs=(str(ZIP_FILE),)) as executor:
+        for _ in tqdm(executor.map(_extract_member, tasks, chunksize=EXTRACT_CHUNKSIZE), total=len(tasks), desc="Extracting pages"):
+            pass
+
 def main():
     """
     Extracts only the 'WebHome.html' files from the wiki zip, renaming them
     based on a hash of their original path to create a clean, flat directory
     structure that avoids all path length issues.
-    Performs an incremental unzip by comparing file hashes.
+    Performs an incremental unzip by comparing central-directory fingerprints,
+    then extracts changed pages in parallel.
     """
     if not ZIP_FILE.exists():
         logger.error(f"Zip file not found at '{ZIP_FILE}'. Please download the wiki data.")
@@ -59,11 +100,12 @@ def main():
     new_files = []
     updated_files = []
     processed_keys = set()
+    extract_tasks = []
 
     with zipfile.ZipFile(ZIP_FILE, 'r') as zip_ref:
         file_list = [f for f in zip_ref.infolist() if f.filename.endswith(TARGET_FILENAME)]
 
-        for member in tqdm(file_list, desc="Checking and extracting pages"):
+        for member in tqdm(file_list, desc="Checking pages"):
             original_path_str = member.filename
             
             path_hash = hashlib.md5(original_path_str.encode()).hexdigest()
@@ -76,28 +118,24 @@ def main():
             relative_new_path_key = f"{dir1}/{dir2}/{new_filename}"
             processed_keys.add(relative_new_path_key)
 
-            # Calculate hash of the file content in the zip
-            with zip_ref.open(member) as source:
-                zip_file_content = source.read()
-                zip_file_hash = hashlib.sha256(zip_file_content).hexdigest()
-
-            # Compare with existing file
-            if new_path.exists() and file_hashes.get(relative_new_path_key) == zip_file_hash:
+            # Compare the central-directory fingerprint with the one recorded last run
+            fingerprint = get_member_fingerprint(member)
+            if new_path.exists() and file_hashes.get(relative_new_path_key) == fingerprint:
                 continue  # Skip if file is unchanged
 
-            # Write new/updated file
-            new_path.parent.mkdir(parents=True, exist_ok=True)
-            with open(new_path, "wb") as target:
-                target.write(zip_file_content)
+            extract_tasks.append((original_path_str, str(new_path)))
 
             if relative_new_path_key not in file_hashes:
                 new_files.append(relative_new_path_key)
             else:
                 updated_files.append(relative_new_path_key)
 
-            file_hashes[relative_new_path_key] = zip_file_hash
+            file_hashes[relative_new_path_key] = fingerprint
             path_map[relative_new_path_key] = original_path_str
 
+    if extract_tasks:
+        extract_members(extract_tasks)
+
     # Detect and handle deleted files
     deleted_keys = set(file_hashes.keys()) - processed_keys
     for key in deleted_keys:
@@ -114,10 +152,10 @@ def main():
 
 
     with open(PATH_MAP_FILE, 'w', encoding='utf-8') as f:
-        json.dump(path_map, f, indent=2)
+        json.dump(path_map, f, separators=(',', ':'))
 
     with open(HASH_FILE, 'w', encoding='utf-8') as f:
-        json.dump(file_hashes, f, indent=2)
+        json.dump(file_hashes, f, separators=(',', ':'))
 
     logger.info(f"--> Extraction complete.")
     logger.info(f"    {len(new_files)} new files extracted.")
@@ -1,20 +1,26 @@
 # 01a_html_to_md.py
 
 import argparse
+import os
 import re
+import sys
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup
 from markdownify import markdownify as md
 from pathlib import Path
+from tqdm import tqdm
+from typing import List, Optional, Tuple
+from build_state import BuildState
 from logging_config import configure_logging
+from pipeline_stages import MD_PAGES_DIR, SANITIZED_DIR, markdown_build_state
 
 configure_logging()
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-DATA_SOURCE_DIR = Path("x4-foundations-wiki")
-SANITIZED_DIR = Path(DATA_SOURCE_DIR,  "hashed_pages")
-MD_PAGES_DIR = Path(DATA_SOURCE_DIR, "pages_md")
+# Directories and MARKDOWN_BUILD_VERSION live in pipeline_stages.py, shared with 01c
+BATCH_CHUNKSIZE = 16
 
 def parse_changelog_to_list(table_soup):
     """
@@ -62,11 +68,12 @@ def parse_changelog_to_list(table_soup):
             
     return '\n'.join(markdown_lines)
 
-def process_html_file(input_path: Path, output_path: Path):
+def process_html_file(input_path: Path, output_path: Path) -> bool:
     """
     Reads a single HTML file, extracts the title and main content, converts
     it to Markdown, and saves it to a new file.
     Uses a specialized parser for changelog pages.
+    Returns True if the file was converted.
     """
     try:
         with input_path.open('r', encoding='utf-8') as f:
@@ -76,7 +83,7 @@ def process_html_file(input_path: Path, output_path: Path):
         main_content = soup.find('main', id="mainContentArea")
         if not main_content:
             logger.warning(f"No main content area found in {input_path}. Skipping.")
-            return
+            return False
 
         title_tag = main_content.find('h1')
         title = title_tag.get_text(strip=True) if title_tag else "Untitled"
@@ -84,7 +91,7 @@ def process_html_file(input_path: Path, output_path: Path):
         body_container = main_content.find('div', id="xwikicontent")
         if not body_container:
             logger.warning(f"No body container found in {input_path}. Skipping.")
-            return
+            return False
             
         changelog_table = body_container.find("table")
         is_changelog = False
@@ -108,15 +115,74 @@ def process_html_file(input_path: Path, output_path: Path):
             f.write(cleaned_markdown)
 
         logger.info(f"Successfully converted {input_path} to {output_path}")
+        return True
 
     except Exception as e:
         logger.error(f"Error processing file {input_path}: {e}")
+        return False
+
+def convert_relative_file(relative_file: str) -> Tuple[str, Optional[bool]]:
+    """
+    Worker entry point: converts one page given its path relative to the sanitized pages
+    directory. Returns whether it was converted, or None if the input doesn't exist.
+    """
+    input_file_path = Path(SANITIZED_DIR, relative_file)
+    output_file_path = Path(MD_PAGES_DIR, Path(relative_file).with_suffix(".md"))
+    if not input_file_path.exists():
+        logger.error(f"Input file not found: {input_file_path}")
+        return relative_file, None
+    return relative_file, process_html_file(input_file_path, output_file_path)
+
+def convert_batch(relative_files: List[str], workers: int, state: BuildState, chunksize: int = BATCH_CHUNKSIZE):
+    """
+    Converts many pages in a process pool. Each worker imports the parsing libraries
+    once and receives files in chunks, so the run is bound by parsing, not process startup.
+    """
+    if not relative_files:
+        logger.info("No HTML files need converting.")
+        return
+
+    logger.info(f"Converting {len(relative_files)} HTML files with {workers} workers...")
+    failed_files = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(convert_relative_file, relative_files, chunksize=chunksize)
+        for relative_file, converted in tqdm(results, total=len(relative_files), desc="Converting HTML to Markdown"):
+            if converted:
+                state.record(relative_file)
+                continue
+            if converted is False:
+                # Recorded as skipped, so it isn't parsed again until the page changes
+                state.record_skipped(relative_file)
+            failed_files.append(relative_file)
+    state.save()
+
+    logger.info(f"--> Conversion complete. {len(relative_files) - len(failed_files)} converted, {len(failed_files)} skipped or failed.")
+    for relative_file in failed_files:
+        logger.info(f"    Not converted: {relative_file}")
 
 def main():
-    parser = argparse.ArgumentParser(description="Convert a single HTML file to Markdown.")
-    parser.add_argument("input_file", type=str, help="Path to the input HTML file relative to the sanitized pages directory.")
-    
+    parser = argparse.ArgumentParser(description="Convert HTML files to Markdown.")
+    parser.add_argument("input_file", type=str, nargs="?", help="Path to the input HTML file relative to the sanitized pages directory.")
+    parser.add_argument("--batch", action="store_true", help="Convert many files in a process pool instead of a single file.")
+    parser.add_argument("--files-from", type=str, help="In batch mode, read relative file paths from this file ('-' for stdin) instead of discovering them.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes in batch mode.")
+
     args = parser.parse_args()
+
+    state = markdown_build_state()
+    if args.batch:
+        state.remove_orphans()
+        if args.files_from == "-":
+            relative_files = [line.strip() for line in sys.stdin if line.strip()]
+        elif args.files_from:
+            relative_files = [line.strip() for line in Path(args.files_from).read_text("utf-8").splitlines() if line.strip()]
+        else:
+            relative_files = state.stale_inputs()
+        convert_batch(relative_files, args.workers, state)
+        return
+
+    if not args.input_file:
+        parser.error("input_file is required unless --batch is given.")
     clean_input_file = args.input_file.strip()
 
     input_file_path = Path(SANITIZED_DIR, clean_input_file)
@@ -126,7 +192,11 @@ def main():
         logger.error(f"Input file not found: {input_file_path}")
         return
 
-    process_html_file(input_file_path, output_file_path)
+    if process_html_file(input_file_path, output_file_path):
+        state.record(clean_input_file)
+    else:
+        state.record_skipped(clean_input_file)
+    state.save()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,28 +1,36 @@
 # 01b_summarize_md.py
 
 import argparse
+import asyncio
 import logging
 import re
 import tiktoken
 import config
 import json
-from openai import OpenAI, APIError
+from openai import APIError
 from pathlib import Path
 from tqdm import tqdm
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Set, Tuple
 from dataclasses import dataclass, field
 from markdown_it import MarkdownIt
+from build_state import BuildState
 from logging_config import configure_logging
+from llm_client import get_async_openai_client
+from llm_cache import get_llm_cache
+from stats_store import StatsStore, row_entity
+from pipeline_stages import (
+    MD_PAGES_DIR, SUMMARIZED_PAGES_DIR, SUMMARIZER_PROMPT_PATH, TABLE_ROW_PROMPT_PATH, TABLE_ROWS_BATCH_PROMPT_PATH,
+    summaries_build_state,
+)
 
 configure_logging()
 logger = logging.getLogger(__name__)
 
 # --- Configuration ---
-DATA_SOURCE_DIR = Path("x4-foundations-wiki")
-MD_PAGES_DIR = Path(DATA_SOURCE_DIR, "pages_md")
-SUMMARIZED_PAGES_DIR = Path(DATA_SOURCE_DIR, "pages_summarized")
+# Directories, prompt paths and SUMMARIES_BUILD_VERSION live in pipeline_stages.py, shared with 01c
 CHANGELOG_KEYWORDS = ["changelog", "patch history"]
+MD_PARSER = MarkdownIt("gfm-like")
 
 @dataclass
 class Section:
@@ -32,22 +40,35 @@ class Section:
     summary: str = ""
     children: List['Section'] = field(default_factory=list)
     parent: Optional['Section'] = None
+    failed: bool = False  # The summarizer gave no usable reply, so the summary is missing
 
     def __repr__(self):
         return f"Section(title='{self.title}', level={self.level}, children={len(self.children)})"
 
-API_KEY = "not-needed"
-SUMMARIZER_PROMPT_PATH = "prompts/document_summarizer_prompt.txt"
-TABLE_ROW_PROMPT_PATH = "prompts/table_row_summarizer_prompt.txt" # New prompt for table rows
+@dataclass
+class DocumentAnalysis:
+    tree: Section
+    tables: List[List[Dict[str, str]]] = field(default_factory=list)
+    changelog_entries: List[Tuple[str, str]] = field(default_factory=list)
+
 MAX_CONTEXT_TOKENS = 15750
 LIST_SUMMARY_THRESHOLD = 10
-
-CLIENT = OpenAI(base_url=config.BASE_URL, api_key=API_KEY)
+MAX_CONCURRENT_LLM_CALLS = 4  # Shared by every file handled in one process
+MAX_CONCURRENT_FILES = 8
+TABLE_ROW_BATCH_MAX_ROWS = 20
+TABLE_ROW_OUTPUT_TOKENS_ESTIMATE = 120  # Room left in the context window for each row's generated paragraph
+
+CLIENT = get_async_openai_client()
+LLM_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+LLM_CACHE = get_llm_cache()
+SUMMARY_TEMPERATURE = 0.2
 SUMMARIZER_PROMPT_TEMPLATE = Path(SUMMARIZER_PROMPT_PATH).read_text("utf-8")
 TABLE_ROW_PROMPT_TEMPLATE = Path(TABLE_ROW_PROMPT_PATH).read_text("utf-8") # Load the new prompt
+TABLE_ROWS_BATCH_PROMPT_TEMPLATE = Path(TABLE_ROWS_BATCH_PROMPT_PATH).read_text("utf-8")
 TOKENIZER = tiktoken.get_encoding("cl100k_base")
 PROMPT_TEMPLATE_SIZE = len(TOKENIZER.encode(SUMMARIZER_PROMPT_TEMPLATE.format(task="", content="", context_path="")))
 EFFECTIVE_CONTEXT_SIZE = MAX_CONTEXT_TOKENS - PROMPT_TEMPLATE_SIZE - 200
+ROW_BATCH_CONTEXT_SIZE = MAX_CONTEXT_TOKENS - len(TOKENIZER.encode(TABLE_ROWS_BATCH_PROMPT_TEMPLATE.format(rows=""))) - 200
 
 def is_changelog_file(file_path: Path, md_content: str) -> bool:
     """Checks if a file is a changelog based on its name or content."""
@@ -61,38 +82,61 @@ def is_changelog_file(file_path: Path, md_content: str) -> bool:
 def strip_until_newline(text: str) -> str:
     return re.sub(r'^.*\n', '', text, count=1)
 
-def call_llm(prompt: str, context_for_logging: str) -> str:
-    """Generic LLM call function with error handling."""
+class LLMCallError(Exception):
+    """The summarizer model gave no usable reply. The page is written without that part and left stale."""
+
+async def call_llm(prompt: str, context_for_logging: str) -> str:
+    """
+    Generic LLM call function with error handling. Responses are read through the
+    shared on-disk cache and concurrency is capped by LLM_SEMAPHORE. Callers store a
+    response with cache_response once they have validated it, so a malformed reply
+    isn't replayed from the cache. Raises LLMCallError on an API error, an oversized
+    prompt or an empty reply.
+    """
+    cached = LLM_CACHE.get(config.SUMMARY_MODEL_NAME, prompt, SUMMARY_TEMPERATURE)
+    if cached is not None:
+        return cached
+
+    prompt_tokens = len(TOKENIZER.encode(prompt))
+    if prompt_tokens > MAX_CONTEXT_TOKENS:
+        logger.warning(f"Prompt for context '{context_for_logging}' is too large ({prompt_tokens} tokens).")
+        raise LLMCallError(f"Prompt too large ({prompt_tokens} tokens)")
+
     try:
-        prompt_tokens = len(TOKENIZER.encode(prompt))
-        if prompt_tokens > MAX_CONTEXT_TOKENS:
-            logger.warning(f"Prompt for context '{context_for_logging}' is too large ({prompt_tokens} tokens).")
-            return ""
-        
-        response = CLIENT.chat.completions.create(
-            model=config.SUMMARY_MODEL_NAME,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-        )
-        return response.choices[0].message.content.strip() # type: ignore
+        async with LLM_SEMAPHORE:
+            response = await CLIENT.chat.completions.create(
+                model=config.SUMMARY_MODEL_NAME,
+                messages=[{"role": "user", "content": prompt}],
+                temperature=SUMMARY_TEMPERATURE,
+            )
     except APIError as e:
         logger.error(f"API error for context '{context_for_logging}': {e}")
-        return ""
+        raise LLMCallError(str(e)) from e
     except Exception as e:
         logger.error(f"An unexpected error occurred for context '{context_for_logging}': {e}")
-        return ""
+        raise LLMCallError(str(e)) from e
+    result = (response.choices[0].message.content or "").strip()
+    if not result:
+        logger.error(f"Empty response for context '{context_for_logging}'.")
+        raise LLMCallError("Empty response")
+    return result
+
+def cache_response(prompt: str, response: str):
+    LLM_CACHE.set(config.SUMMARY_MODEL_NAME, prompt, SUMMARY_TEMPERATURE, response)
 
-def call_summarizer(content: str, task: str, context_path: str) -> str:
+async def call_summarizer(content: str, task: str, context_path: str) -> str:
     if not content.strip():
         return ""
     if len(content.split()) < 10:
         return f"Context: {context_path}\n\n{content.strip()}"
     
     formatted_prompt = SUMMARIZER_PROMPT_TEMPLATE.format(task=task, content=content, context_path=context_path)
-    return call_llm(formatted_prompt, f"Summarizer: {context_path}")
+    summary = await call_llm(formatted_prompt, f"Summarizer: {context_path}")
+    cache_response(formatted_prompt, summary)
+    return summary
 
-def call_table_row_summarizer(row_data: Dict[str, str]) -> str:
-    """Calls the LLM with the specific prompt to convert a table row to a sentence."""
+async def call_table_row_summarizer(row_data: Dict[str, str]) -> Optional[str]:
+    """Calls the LLM with the specific prompt to convert a table row to a sentence. Returns None if the call failed."""
     if not row_data:
         return ""
     
@@ -100,28 +144,120 @@ def call_table_row_summarizer(row_data: Dict[str, str]) -> str:
     formatted_prompt = TABLE_ROW_PROMPT_TEMPLATE.format(data=json_data)
     
     item_name = row_data.get("Ship", row_data.get("Name", "Unknown Item"))
-    return call_llm(formatted_prompt, f"Table Row: {item_name}")
-
-def recursive_summarize(texts: List[str], task: str, context_path: str) -> str:
+    try:
+        sentence = await call_llm(formatted_prompt, f"Table Row: {item_name}")
+    except LLMCallError:
+        return None
+    cache_response(formatted_prompt, sentence)
+    return sentence
+
+def pack_row_batches(rows: List[Dict[str, str]]) -> List[List[int]]:
+    """Groups row indexes into batches whose data and expected output fit one prompt."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, row_data in enumerate(rows):
+        row_tokens = len(TOKENIZER.encode(json.dumps(row_data, indent=4))) + TABLE_ROW_OUTPUT_TOKENS_ESTIMATE
+        if current and (len(current) >= TABLE_ROW_BATCH_MAX_ROWS or current_tokens + row_tokens > ROW_BATCH_CONTEXT_SIZE):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += row_tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_row_batch_response(response: str) -> Dict[int, str]:
+    """Extracts {row index: paragraph} from the batch summarizer's JSON array, ignoring malformed items."""
+    start, end = response.find('['), response.rfind(']')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    parsed = {}
+    for item in items if isinstance(items, list) else []:
+        if isinstance(item, dict) and isinstance(item.get("text"), str):
+            try:
+                parsed[int(item["index"])] = item["text"].strip()
+            except (KeyError, TypeError, ValueError):
+                continue
+    return parsed
+
+async def call_table_rows_batch_summarizer(rows: List[Dict[str, str]]) -> List[Optional[str]]:
+    """
+    Converts several table rows to sentences in one LLM call, retrying unparsed rows one
+    at a time. A row is None if its single-row retry failed as well.
+    """
+    if len(rows) == 1:
+        return [await call_table_row_summarizer(rows[0])]
+
+    json_data = json.dumps({str(i): row_data for i, row_data in enumerate(rows)}, indent=4)
+    formatted_prompt = TABLE_ROWS_BATCH_PROMPT_TEMPLATE.format(rows=json_data)
+    first_item = rows[0].get("Ship", rows[0].get("Name", "Unknown Item"))
+    try:
+        response = await call_llm(formatted_prompt, f"Table Rows: {len(rows)} rows from {first_item}")
+    except LLMCallError:
+        response = ""
+    parsed = parse_row_batch_response(response)
+    # Only a reply covering every row is cached; a partial one is asked again on the next run
+    if len(parsed) == len(rows) and all(parsed.values()):
+        cache_response(formatted_prompt, response)
+
+    sentences: List[Optional[str]] = [parsed.get(i, "") for i in range(len(rows))]
+    missing = [i for i in range(len(rows)) if i not in parsed]
+    if missing:
+        logger.info(f"Batch row synthesis returned {len(rows) - len(missing)}/{len(rows)} rows. Falling back to single-row calls for the rest.")
+        fallbacks = await asyncio.gather(*(call_table_row_summarizer(rows[i]) for i in missing))
+        for i, sentence in zip(missing, fallbacks):
+            sentences[i] = sentence
+    return sentences
+
+async def synthesize_table_rows(rows: List[Dict[str, str]]) -> List[Optional[str]]:
+    """Synthesizes prose for every row of a table, running the packed batches concurrently."""
+    batches = pack_row_batches(rows)
+    batch_results = await asyncio.gather(*(
+        call_table_rows_batch_summarizer([rows[i] for i in batch]) for batch in batches
+    ))
+    return [sentence for sentences in batch_results for sentence in sentences]
+
+async def recursive_summarize(texts: List[str], task: str, context_path: str) -> str:
     if not texts: return ""
     combined_text = "\n\n---\n\n".join(texts)
     if len(TOKENIZER.encode(combined_text)) <= EFFECTIVE_CONTEXT_SIZE:
-        return call_summarizer(combined_text, task, context_path)
+        return await call_summarizer(combined_text, task, context_path)
     else:
         logger.info(f"Content for recursive summarization is too large. Splitting {len(texts)} texts in half.")
         mid_point = len(texts) // 2
-        first_half_summary = recursive_summarize(texts[:mid_point], task, context_path)
-        second_half_summary = recursive_summarize(texts[mid_point:], task, context_path)
-        return recursive_summarize([first_half_summary, second_half_summary], "SUMMARIZE_SUMMARIES", context_path)
-
-def build_section_tree(md_content: str) -> Section:
-    """Builds a hierarchical tree of sections from markdown content."""
-    md = MarkdownIt("gfm-like")
-    tokens = md.parse(md_content)
+        first_half_summary, second_half_summary = await asyncio.gather(
+            recursive_summarize(texts[:mid_point], task, context_path),
+            recursive_summarize(texts[mid_point:], task, context_path),
+        )
+        return await recursive_summarize([first_half_summary, second_half_summary], "SUMMARIZE_SUMMARIES", context_path)
+
+def analyze_document(md_content: str) -> DocumentAnalysis:
+    """
+    Builds the section tree, unrolls every table into row dictionaries and collects
+    changelog (version, entry) pairs from a single parse of the document.
+    """
+    tokens = MD_PARSER.parse(md_content)
     lines = md_content.splitlines()
     root = Section(title="root", level=0)
+    analysis = DocumentAnalysis(tree=root)
+
     node_stack = [root]
     last_line = 0
+    # Table state
+    current_table: Optional[List[Dict[str, str]]] = None
+    headers: List[str] = []
+    row_cells: Optional[List[str]] = None
+    in_header = False
+    is_data_row = False
+    # Changelog list state
+    list_level = 0
+    current_version = ""
+
     for i, token in enumerate(tokens):
         if token.type == 'heading_open':
             current_heading_start_line = token.map[0]
@@ -137,19 +273,56 @@ def build_section_tree(md_content: str) -> Section:
             parent.children.append(new_node)
             new_node.parent = parent
             node_stack.append(new_node)
+
+        elif token.type == 'table_open':
+            current_table, headers = [], []
+        elif token.type == 'table_close':
+            analysis.tables.append(current_table or [])
+            current_table = None
+        elif token.type == 'thead_open': in_header = True
+        elif token.type == 'thead_close': in_header = False
+        elif token.type == 'tbody_open': is_data_row = True
+        elif token.type == 'tbody_close': is_data_row = False
+        elif token.type == 'tr_open':
+            row_cells = []
+        elif token.type == 'inline' and row_cells is not None:
+            row_cells.append(token.content.strip())
+        elif token.type == 'tr_close':
+            if in_header:
+                headers = row_cells or []
+            elif is_data_row and headers and row_cells and any(cell for cell in row_cells) and current_table is not None:
+                row_dict = {h.strip(): c.strip() for h, c in zip(headers, row_cells) if h and c and c not in ['-', '']}
+                if row_dict: current_table.append(row_dict)
+            row_cells = None
+
+        elif token.type == 'bullet_list_open': list_level += 1
+        elif token.type == 'bullet_list_close': list_level -= 1
+        elif token.type == 'list_item_open':
+            item_content = tokens[i+2].content.strip() if (i+2) < len(tokens) and tokens[i+2].type == 'inline' else ""
+            if list_level == 1: current_version = item_content
+            elif list_level == 2 and current_version: analysis.changelog_entries.append((current_version, item_content))
+
     if last_line < len(lines):
         node_stack[-1].content = "\n".join(lines[last_line:]).strip()
-    return root
+    return analysis
 
-def summarize_tree_post_order(node: Section, context_path: str = ""):
-    """Recursively summarizes the prose in the tree from the bottom up."""
+def build_section_tree(md_content: str) -> Section:
+    """Builds a hierarchical tree of sections from markdown content."""
+    return analyze_document(md_content).tree
+
+async def summarize_tree_post_order(node: Section, context_path: str = ""):
+    """
+    Recursively summarizes the prose in the tree from the bottom up.
+    Sibling subtrees are independent and run concurrently; a section is summarized
+    as soon as all of its children have finished.
+    """
     if node.level == 0:
         first_h1 = next((child for child in node.children if child.level == 1), None)
         context_path = first_h1.title if first_h1 else "Document Overview"
     
-    for child in node.children:
-        child_context_path = f"{context_path} > {child.title}"
-        summarize_tree_post_order(child, child_context_path)
+    await asyncio.gather(*(
+        summarize_tree_post_order(child, f"{context_path} > {child.title}") for child in node.children
+    ))
 
     child_summaries = "".join([f"Sub-section '{c.title}': {c.summary}" for c in node.children if c.summary])
     content_to_summarize = node.content
@@ -161,13 +334,25 @@ def summarize_tree_post_order(node: Section, context_path: str = ""):
         return
 
     section_tokens = len(TOKENIZER.encode(content_to_summarize))
-    if section_tokens > EFFECTIVE_CONTEXT_SIZE:
-        logger.info(f"Section '{node.title[:50]}...' is too large ({section_tokens} tokens). Splitting for summarization.")
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=EFFECTIVE_CONTEXT_SIZE, chunk_overlap=200, length_function=lambda text: len(TOKENIZER.encode(text)))
-        texts = text_splitter.split_text(content_to_summarize)
-        node.summary = recursive_summarize(texts, "SUMMARIZE_SECTION", context_path=context_path)
-    else:
-        node.summary = call_summarizer(content_to_summarize, "SUMMARIZE_SECTION", context_path=context_path)
+    try:
+        if section_tokens > EFFECTIVE_CONTEXT_SIZE:
+            logger.info(f"Section '{node.title[:50]}...' is too large ({section_tokens} tokens). Splitting for summarization.")
+            text_splitter = RecursiveCharacterTextSplitter(chunk_size=EFFECTIVE_CONTEXT_SIZE, chunk_overlap=200, length_function=lambda text: len(TOKENIZER.encode(text)))
+            texts = text_splitter.split_text(content_to_summarize)
+            node.summary = await recursive_summarize(texts, "SUMMARIZE_SECTION", context_path=context_path)
+        else:
+            node.summary = await call_summarizer(content_to_summarize, "SUMMARIZE_SECTION", context_path=context_path)
+    except LLMCallError:
+        node.summary, node.failed = "", True
+
+def failed_sections(node: Section, context_path: str = "") -> List[str]:
+    """Paths of the sections whose summary is missing because the summarizer call failed."""
+    title = node.title if node.level > 0 else "Overview"
+    path = f"{context_path} > {title}" if context_path else title
+    failed = [path] if node.failed else []
+    for child in node.children:
+        failed.extend(failed_sections(child, path))
+    return failed
 
 def format_summary_appendix(node: Section) -> str:
     """Formats the collected summaries into a markdown appendix."""
@@ -181,127 +366,180 @@ def format_summary_appendix(node: Section) -> str:
         parts.append(format_summary_appendix(child))
     return "".join(parts)
 
-def find_all_tables_in_tree(node: Section) -> List[str]:
-    """Recursively finds all markdown tables in the entire section tree."""
-    all_tables = find_all_tables_in_md(node.content)
-    for child in node.children:
-        all_tables.extend(find_all_tables_in_tree(child))
-    return all_tables
-
-def find_all_tables_in_md(md_content: str) -> List[str]:
-    """Finds all complete Markdown tables in a string."""
-    md = MarkdownIt("gfm-like")
-    tokens = md.parse(md_content)
-    lines = md_content.splitlines()
-    tables = []
-    for token in tokens:
-        if token.type == 'table_open' and token.map:
-            start_line, end_line = token.map
-            tables.append("\n".join(lines[start_line:end_line]))
-    return tables
-
 def unroll_single_table(md_content: str) -> List[Dict[str, str]]:
     """Converts a single markdown table into a list of dictionaries, one per row."""
-    md = MarkdownIt("gfm-like")
-    tokens = md.parse(md_content)
-    unrolled_rows = []
-    headers = []
-    in_header = False
-    is_data_row = False
-    for i, token in enumerate(tokens):
-        if token.type == 'thead_open': in_header = True; continue
-        if token.type == 'thead_close': in_header = False; continue
-        if token.type == 'tbody_open': is_data_row = True; continue
-        if token.type == 'tbody_close': is_data_row = False; continue
-        if token.type == 'tr_open':
-            row_cells = []
-            j = i + 1
-            while j < len(tokens) and tokens[j].type != 'tr_close':
-                if tokens[j].type == 'inline': row_cells.append(tokens[j].content.strip())
-                j += 1
-            if in_header:
-                headers = row_cells
-            elif is_data_row and headers and row_cells and any(cell for cell in row_cells):
-                row_dict = {h.strip(): c.strip() for h, c in zip(headers, row_cells) if h and c and c not in ['-', '']}
-                if row_dict: unrolled_rows.append(row_dict)
-    return unrolled_rows
+    tables = analyze_document(md_content).tables
+    return tables[0] if tables else []
+
+def format_unrolled_changelog(changelog_entries: List[Tuple[str, str]]) -> str:
+    """Renders changelog (version, entry) pairs as one header per entry."""
+    if not changelog_entries:
+        return ""
+    unrolled_parts = ["\n\n---\n\n## Unrolled Changelog Data"]
+    unrolled_parts.extend(f"\n### {version} - {entry}\n" for version, entry in changelog_entries)
+    return "".join(unrolled_parts)
 
 def unroll_changelog(md_content: str) -> str:
     """Parses a changelog file and unrolls its list items into headers."""
-    md = MarkdownIt("gfm-like")
-    tokens = md.parse(md_content)
-    unrolled_parts = ["\n\n---\n\n## Unrolled Changelog Data"]
-    current_version = ""
-    list_level = 0
-    for i, token in enumerate(tokens):
-        if token.type == 'bullet_list_open': list_level += 1
-        elif token.type == 'bullet_list_close': list_level -= 1
-        elif token.type == 'list_item_open':
-            item_content = tokens[i+2].content.strip() if (i+2) < len(tokens) and tokens[i+2].type == 'inline' else ""
-            if list_level == 1: current_version = item_content
-            elif list_level == 2 and current_version: unrolled_parts.append(f"\n### {current_version} - {item_content}\n")
-    return "".join(unrolled_parts) if len(unrolled_parts) > 1 else ""
+    return format_unrolled_changelog(analyze_document(md_content).changelog_entries)
+
+async def summarize_and_enrich_content(md_content: str, file_path_for_logging: Path, prompts_used: Optional[Set[str]] = None,
+                                       failed_parts: Optional[List[str]] = None) -> str:
+    """
+    Orchestrates the summarization and enrichment process for a markdown file.
+    If given, prompts_used is filled with the prompt templates the output depends on,
+    and failed_parts with the sections and table rows left out because their LLM call failed.
+    """
+    if prompts_used is None:
+        prompts_used = set()
+    if failed_parts is None:
+        failed_parts = []
+    # One parse yields the section tree, the table rows and the changelog entries.
+    analysis = analyze_document(md_content)
 
-def summarize_and_enrich_content(md_content: str, file_path_for_logging: Path) -> str:
-    """Orchestrates the summarization and enrichment process for a markdown file."""
     if is_changelog_file(file_path_for_logging, md_content):
         logger.info(f"Processing '{file_path_for_logging.name}' as a changelog file.")
-        return md_content + unroll_changelog(md_content)
+        return md_content + format_unrolled_changelog(analysis.changelog_entries)
 
-    logger.info(f"Building section tree for {file_path_for_logging.name}...")
-    document_tree = build_section_tree(md_content)
+    document_tree = analysis.tree
 
     if not document_tree.children and len(TOKENIZER.encode(md_content)) < 500:
         logger.info("Document is short and has no sections, skipping summarization.")
         return md_content
 
     logger.info(f"Summarizing document prose for {file_path_for_logging.name}...")
-    summarize_tree_post_order(document_tree)
+    prompts_used.add(SUMMARIZER_PROMPT_PATH)
+    await summarize_tree_post_order(document_tree)
+    failed_parts.extend(f"section '{path}'" for path in failed_sections(document_tree))
     summary_appendix = format_summary_appendix(document_tree)
     if summary_appendix:
         summary_appendix = "\n\n---\n\n# Executive Summary" + summary_appendix
 
     logger.info(f"Unrolling structured data for {file_path_for_logging.name}...")
-    all_tables = find_all_tables_in_tree(document_tree)
+    all_table_rows = analysis.tables
     detailed_stats_parts = []
-    if all_tables:
+    if all_table_rows:
         detailed_stats_parts.append("\n\n---\n\n## Detailed Statistics")
-        for table_md in all_tables:
-            unrolled_rows = unroll_single_table(table_md)
-            for row_data in tqdm(unrolled_rows, desc="Synthesizing table rows"):
-                # item_name = row_data.get("Ship", row_data.get("Name", None))
-                # if not item_name: continue
-                prose_sentence = call_table_row_summarizer(row_data)
-                if prose_sentence and prose_sentence != "[NO ENTITY]":
+        prompts_used.update([TABLE_ROW_PROMPT_PATH, TABLE_ROWS_BATCH_PROMPT_PATH])
+        logger.info(f"Synthesizing {sum(len(rows) for rows in all_table_rows)} table rows from {len(all_table_rows)} tables...")
+        all_table_sentences = await asyncio.gather(*(synthesize_table_rows(rows) for rows in all_table_rows))
+        for unrolled_rows, prose_sentences in zip(all_table_rows, all_table_sentences):
+            for row_data, prose_sentence in zip(unrolled_rows, prose_sentences):
+                if prose_sentence is None:
+                    failed_parts.append(f"table row {row_entity(row_data)!r}")
+                elif prose_sentence and prose_sentence != "[NO ENTITY]":
                     detailed_stats_parts.append(f"\n\n### {row_data}\n{prose_sentence}")
     
     detailed_stats_section = "".join(detailed_stats_parts)
     
     return md_content + summary_appendix + detailed_stats_section
 
-def main():
-    parser = argparse.ArgumentParser(description="Summarize and enrich a single Markdown file.")
-    parser.add_argument("input_file", type=str, help="Path to the input Markdown file relative to the MD pages directory.")
-    args = parser.parse_args()
-    clean_input_file = args.input_file.strip()
-
-    input_file_path = Path(MD_PAGES_DIR, clean_input_file)
-    output_file_path = Path(SUMMARIZED_PAGES_DIR, clean_input_file)
+async def process_file(relative_file: str, state: BuildState) -> bool:
+    """
+    Summarizes one markdown page, given its path relative to the MD pages directory.
+    A page with failed LLM calls is still written, but not recorded as built, so it
+    stays stale and is retried on the next run. Returns True if the page is complete.
+    """
+    input_file_path = Path(MD_PAGES_DIR, relative_file)
+    output_file_path = Path(SUMMARIZED_PAGES_DIR, relative_file)
 
     if not input_file_path.exists():
         logger.error(f"Input file not found: {input_file_path}")
-        return
+        return False
 
     with open(input_file_path, 'r', encoding='utf-8') as f:
         md_content = f.read()
 
-    enriched_content = summarize_and_enrich_content(md_content, input_file_path)
+    prompts_used: Set[str] = set()
+    failed_parts: List[str] = []
+    enriched_content = await summarize_and_enrich_content(md_content, input_file_path, prompts_used, failed_parts)
 
     output_file_path.parent.mkdir(parents=True, exist_ok=True)
     with open(output_file_path, 'w', encoding='utf-8') as f:
         f.write(enriched_content)
 
+    if failed_parts:
+        state.invalidate(relative_file)
+        logger.warning(f"Wrote {output_file_path} without {len(failed_parts)} parts whose LLM call failed ({', '.join(failed_parts[:5])}). It will be retried on the next run.")
+        return False
+    state.record(relative_file, prompts_used)
     logger.info(f"Successfully summarized and enriched {input_file_path} to {output_file_path}")
+    return True
+
+def sync_stats_store(state: BuildState, relative_files: Optional[List[str]] = None):
+    """
+    Stores the unrolled table rows of every page whose markdown changed since it was
+    last stored, and drops pages that no longer exist. Only parses, so it runs for every
+    page on each build, whether or not its summary is stale. Given relative_files, only
+    those pages are checked.
+    """
+    store = StatsStore(config.STATS_STORE_PATH)
+    stored = store.page_hashes()
+    inputs = relative_files if relative_files is not None else state.inputs()
+    updated = rows = 0
+    for relative_file in inputs:
+        input_file_path = Path(MD_PAGES_DIR, relative_file)
+        if not input_file_path.exists():
+            continue
+        input_hash = state.input_hash(relative_file)
+        if stored.get(relative_file) == store.versioned_hash(input_hash):
+            continue
+        md_content = input_file_path.read_text("utf-8")
+        title = md_content.split('\n')[0].replace('#', '').strip() if md_content.startswith('#') else input_file_path.stem
+        tables = [] if is_changelog_file(input_file_path, md_content) else analyze_document(md_content).tables
+        rows += store.replace_page(relative_file, title, input_hash, tables)
+        updated += 1
+    if relative_files is None:
+        current = set(inputs)
+        store.remove_pages([source for source in stored if source not in current])
+    store.close()
+    logger.info(f"Stats store: stored {rows} table rows from {updated} new or changed pages in '{config.STATS_STORE_PATH}'.")
+
+async def summarize_batch(state: BuildState):
+    """Summarizes every stale page in one process so they all share the LLM concurrency cap."""
+    state.remove_orphans()
+    sync_stats_store(state)
+    relative_files = state.stale_inputs()
+    if not relative_files:
+        logger.info("No markdown files need summarizing.")
+        state.save()
+        return
+
+    file_semaphore = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+    failed_files = []
+
+    async def process_file_bounded(relative_file: str):
+        async with file_semaphore:
+            try:
+                if not await process_file(relative_file, state):
+                    failed_files.append(relative_file)
+            except Exception as e:
+                logger.error(f"Error summarizing {relative_file}: {e}")
+                failed_files.append(relative_file)
+
+    tasks = [asyncio.create_task(process_file_bounded(f)) for f in relative_files]
+    for task in tqdm(asyncio.as_completed(tasks), total=len(tasks), desc="Summarizing pages"):
+        await task
+
+    state.save()
+    logger.info(f"--> Summarization complete. {len(relative_files) - len(failed_files)} succeeded, {len(failed_files)} failed or incomplete.")
+    LLM_CACHE.log_stats()
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize and enrich Markdown files.")
+    parser.add_argument("input_file", type=str, nargs="?", help="Path to the input Markdown file relative to the MD pages directory.")
+    parser.add_argument("--batch", action="store_true", help="Summarize every stale page in this process, sharing one LLM concurrency limit.")
+    args = parser.parse_args()
+
+    state = summaries_build_state()
+    if args.batch:
+        asyncio.run(summarize_batch(state))
+    elif args.input_file:
+        asyncio.run(process_file(args.input_file.strip(), state))
+        sync_stats_store(state, [args.input_file.strip()])
+        state.save()
+    else:
+        parser.error("input_file is required unless --batch is given.")
 
 if __name__ == "__main__":
     main()
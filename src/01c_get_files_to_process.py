@@ -3,36 +3,43 @@
 import argparse
 import logging
 from pathlib import Path
+from typing import List
+from build_state import BuildState
 from logging_config import configure_logging
+from pipeline_stages import STAGES
 
 configure_logging()
 logger = logging.getLogger(__name__)
 # --- End Logging Configuration ---
 
-def get_files_to_process(input_dir: Path, output_dir: Path, input_ext: str, output_ext: str):
+def get_files_to_process(state: BuildState) -> List[str]:
     """
-    Compares two directories and returns a list of files that need to be processed.
+    Returns the inputs whose content, prompts or stage version changed, according
+    to the output directory's build manifest. This only reads: orphaned outputs are left
+    for the stage itself to remove and the manifest is not rewritten.
     """
-    files_to_process = []
-    for input_file in input_dir.glob(f"**/*{input_ext}"):
-        relative_path = input_file.relative_to(input_dir)
-        output_file = output_dir / relative_path.with_suffix(output_ext)
-        if not output_file.exists() or input_file.stat().st_mtime > output_file.stat().st_mtime:
-            files_to_process.append(str(relative_path).replace("\\", "/"))
-    return files_to_process
+    return state.stale_inputs()
 
 def main():
     parser = argparse.ArgumentParser(description="Get a list of files to process.")
-    parser.add_argument("input_dir", type=str, help="Path to the input directory.")
-    parser.add_argument("output_dir", type=str, help="Path to the output directory.")
-    parser.add_argument("input_ext", type=str, help="Extension of the input files.")
-    parser.add_argument("output_ext", type=str, help="Extension of the output files.")
+    parser.add_argument("input_dir", type=str, nargs="?", help="Path to the input directory.")
+    parser.add_argument("output_dir", type=str, nargs="?", help="Path to the output directory.")
+    parser.add_argument("input_ext", type=str, nargs="?", help="Extension of the input files.")
+    parser.add_argument("output_ext", type=str, nargs="?", help="Extension of the output files.")
+    parser.add_argument("--stage", choices=sorted(STAGES), help="Use this pipeline stage's directories, prompts and version instead of the positional arguments.")
+    parser.add_argument("--prompts", type=str, nargs="*", default=[], help="Prompt templates the stage's outputs depend on.")
+    parser.add_argument("--version", type=str, default="1", help="Stage version; changing it invalidates every output.")
 
     args = parser.parse_args()
 
-    files_to_process = get_files_to_process(Path(args.input_dir), Path(args.output_dir), args.input_ext, args.output_ext)
+    if args.stage:
+        state = STAGES[args.stage]()
+    elif args.input_dir and args.output_dir and args.input_ext and args.output_ext:
+        state = BuildState(Path(args.input_dir), Path(args.output_dir), args.input_ext, args.output_ext, args.prompts, args.version)
+    else:
+        parser.error("input_dir, output_dir, input_ext and output_ext are required unless --stage is given.")
 
-    for file_path in files_to_process:
+    for file_path in get_files_to_process(state):
         print(file_path)
 
 if __name__ == "__main__":
@@ -1,14 +1,16 @@
 # 01d_process_changelogs.py
 
+import asyncio
+import hashlib
 import json
 import logging
-import time
-import concurrent.futures
 from pathlib import Path
-from openai import OpenAI
+from typing import Dict, List, Optional
 from tqdm import tqdm
 from markdown_it import MarkdownIt
 from logging_config import configure_logging
+from llm_client import get_async_openai_client
+from llm_cache import get_llm_cache
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -18,20 +20,30 @@ logger = logging.getLogger(__name__)
 INPUT_DIR = Path("x4-foundations-wiki/pages_md")
 OUTPUT_FILE = "x4_changelog_chunks.json"
 PROMPT_PATH = "prompts/changelog_analyzer_prompt.txt"
+BATCH_PROMPT_PATH = "prompts/changelog_batch_analyzer_prompt.txt"
 CHANGELOG_KEYWORDS = ["changelog", "patch history"]
 
-LM_STUDIO_BASE_URL = "http://localhost:1234/v1"
-API_KEY = "not-needed"
 MODEL_NAME = "local-model"
+TEMPERATURE = 0.1
 
-MAX_WORKERS = 4
+MAX_CONCURRENT_LLM_CALLS = 4
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 5
+ENTRY_BATCH_MAX_ENTRIES = 16
+ENTRY_BATCH_MAX_CHARS = 6000  # Raw entry text per batch prompt, leaving room for one summary per entry
 
 # --- Globals ---
-CLIENT = OpenAI(base_url=LM_STUDIO_BASE_URL, api_key=API_KEY)
+CLIENT = get_async_openai_client()
+LLM_CACHE = get_llm_cache()
 with open(PROMPT_PATH, "r", encoding="utf-8") as f:
     PROMPT_TEMPLATE = f.read()
+with open(BATCH_PROMPT_PATH, "r", encoding="utf-8") as f:
+    BATCH_PROMPT_TEMPLATE = f.read()
+# Per-entry results live in the shared response cache under their own namespace, keyed
+# by (version_info, original_entry) and this digest of the model and both prompts, so an
+# entry is only re-analyzed when its text or the prompts change.
+ENTRY_CACHE_NAMESPACE = f"changelog-entry/{MODEL_NAME}"
+PROMPTS_DIGEST = hashlib.sha256(f"{MODEL_NAME}\0{PROMPT_TEMPLATE}\0{BATCH_PROMPT_TEMPLATE}".encode("utf-8")).hexdigest()
 MD_PARSER = MarkdownIt()
 
 def is_changelog_file(file_path: Path) -> bool:
@@ -87,7 +99,55 @@ def parse_raw_entries(file_path: Path) -> list:
         logger.error(f"Error parsing raw entries from {file_path}: {e}")
     return entries
 
-def process_entry_with_llm(entry_data):
+def entry_cache_key(entry_data: Dict) -> str:
+    return json.dumps([entry_data["version_info"], entry_data["original_entry"], PROMPTS_DIGEST], ensure_ascii=False)
+
+def get_cached_analysis(entry_data: Dict) -> Optional[Dict[str, str]]:
+    cached = LLM_CACHE.get(ENTRY_CACHE_NAMESPACE, entry_cache_key(entry_data), TEMPERATURE)
+    return json.loads(cached) if cached is not None else None
+
+def cache_analysis(entry_data: Dict, analysis: Dict[str, str]):
+    LLM_CACHE.set(ENTRY_CACHE_NAMESPACE, entry_cache_key(entry_data), TEMPERATURE, json.dumps(analysis, ensure_ascii=False))
+
+def parse_single_entry_output(llm_output: str) -> Dict[str, str]:
+    parsed_data = {}
+    for line in llm_output.split('\n'):
+        if ':' in line:
+            key, value = line.split(':', 1)
+            parsed_data[key.strip().lower()] = value.strip()
+    if 'category' not in parsed_data or 'summary' not in parsed_data:
+        raise ValueError("LLM output did not contain both 'category' and 'summary' keys.")
+    return {"category": parsed_data["category"], "summary": parsed_data["summary"]}
+
+def parse_batch_output(llm_output: str) -> Dict[int, Dict[str, str]]:
+    """Extracts {entry index: analysis} from the batch analyzer's JSON array, ignoring malformed items."""
+    start, end = llm_output.find('['), llm_output.rfind(']')
+    if start == -1 or end <= start:
+        return {}
+    try:
+        items = json.loads(llm_output[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not item.get("category") or not item.get("summary"):
+            continue
+        try:
+            results[int(item["index"])] = {"category": str(item["category"]).strip(), "summary": str(item["summary"]).strip()}
+        except (KeyError, TypeError, ValueError):
+            continue
+    return results
+
+async def call_llm(prompt: str, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        response = await CLIENT.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+        )
+    return response.choices[0].message.content.strip()
+
+async def process_entry_with_llm(entry_data: Dict, semaphore: asyncio.Semaphore) -> Optional[Dict[str, str]]:
     formatted_prompt = PROMPT_TEMPLATE.format(
         version_info=entry_data["version_info"],
         entry=entry_data["original_entry"]
@@ -95,40 +155,82 @@ def process_entry_with_llm(entry_data):
     llm_output = ""
     for attempt in range(MAX_RETRIES):
         try:
-            response = CLIENT.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{"role": "user", "content": formatted_prompt}],
-                temperature=0.1,
-            )
-            llm_output = response.choices[0].message.content.strip()
-
-            # --- New Parsing Logic ---
-            parsed_data = {}
-            lines = llm_output.split('\n')
-            for line in lines:
-                if ':' in line:
-                    key, value = line.split(':', 1)
-                    parsed_data[key.strip().lower()] = value.strip()
-            
-            if 'category' not in parsed_data or 'summary' not in parsed_data:
-                 raise ValueError("LLM output did not contain both 'category' and 'summary' keys.")
-
-            return {
-                "source": entry_data["source"],
-                "title": entry_data["title"],
-                "version_info": entry_data["version_info"],
-                "category": parsed_data.get("category", "General"),
-                "content": parsed_data.get("summary", entry_data["original_entry"]),
-                "chunk_index": 0 # Placeholder
-            }
+            llm_output = await call_llm(formatted_prompt, semaphore)
+            analysis = parse_single_entry_output(llm_output)
+            cache_analysis(entry_data, analysis)
+            return analysis
         except Exception as e:
             logger.warning(f"Attempt {attempt + 1} failed for '{entry_data['original_entry'][:50]}...': {e}. Raw LLM Output: '{llm_output}'")
             if attempt < MAX_RETRIES - 1:
-                time.sleep(RETRY_DELAY_SECONDS)
+                await asyncio.sleep(RETRY_DELAY_SECONDS)
             else:
                 logger.error(f"Final failure processing entry after {MAX_RETRIES} attempts.")
                 return None
 
+async def process_entry_batch(entries: List[Dict], semaphore: asyncio.Semaphore) -> List[Optional[Dict[str, str]]]:
+    """Analyzes several entries in one LLM call. Entries missing from the reply are retried concurrently on their own."""
+    if len(entries) == 1:
+        return [await process_entry_with_llm(entries[0], semaphore)]
+
+    payload = {str(i): {"version_info": e["version_info"], "entry": e["original_entry"]} for i, e in enumerate(entries)}
+    llm_output = ""
+    try:
+        llm_output = await call_llm(BATCH_PROMPT_TEMPLATE.format(entries=json.dumps(payload, indent=2, ensure_ascii=False)), semaphore)
+    except Exception as e:
+        logger.warning(f"Batch of {len(entries)} entries failed: {e}. Falling back to single-entry prompts.")
+    parsed = parse_batch_output(llm_output)
+
+    results: List[Optional[Dict[str, str]]] = [parsed.get(i) for i in range(len(entries))]
+    missing = []
+    for i, entry_data in enumerate(entries):
+        if i in parsed:
+            cache_analysis(entry_data, parsed[i])
+        else:
+            missing.append(i)
+    fallbacks = await asyncio.gather(*(process_entry_with_llm(entries[i], semaphore) for i in missing))
+    for i, analysis in zip(missing, fallbacks):
+        results[i] = analysis
+    return results
+
+def pack_entry_batches(entries: List[Dict]) -> List[List[int]]:
+    """Groups entry positions into batches bounded by entry count and raw text size."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_chars = 0
+    for i, entry_data in enumerate(entries):
+        entry_chars = len(entry_data["original_entry"]) + len(entry_data["version_info"])
+        if current and (len(current) >= ENTRY_BATCH_MAX_ENTRIES or current_chars + entry_chars > ENTRY_BATCH_MAX_CHARS):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(i)
+        current_chars += entry_chars
+    if current:
+        batches.append(current)
+    return batches
+
+async def analyze_entries(raw_entries: List[Dict]) -> List[Optional[Dict[str, str]]]:
+    """Returns one analysis per raw entry, in input order, calling the LLM only for uncached entries."""
+    analyses = [get_cached_analysis(entry_data) for entry_data in raw_entries]
+    pending = [i for i, analysis in enumerate(analyses) if analysis is None]
+    logger.info(f"{len(raw_entries) - len(pending)} entries cached, {len(pending)} need the LLM.")
+    if not pending:
+        return analyses
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+    pending_entries = [raw_entries[i] for i in pending]
+    batches = pack_entry_batches(pending_entries)
+
+    async def run_batch(batch: List[int]):
+        results = await process_entry_batch([pending_entries[j] for j in batch], semaphore)
+        for j, analysis in zip(batch, results):
+            analyses[pending[j]] = analysis
+        return len(batch)
+
+    with tqdm(total=len(pending), desc="Processing entries with LLM") as progress:
+        for finished in asyncio.as_completed([run_batch(batch) for batch in batches]):
+            progress.update(await finished)
+    return analyses
+
 def main():
     logger.info("--- Starting LLM-Powered Changelog Processing ---")
 
@@ -136,7 +238,7 @@ def main():
         logger.error(f"Input directory not found at '{INPUT_DIR}'.")
         return
 
-    changelog_files = [f for f in INPUT_DIR.rglob("*.md") if is_changelog_file(f)]
+    changelog_files = sorted(f for f in INPUT_DIR.rglob("*.md") if is_changelog_file(f))
     logger.info(f"Found {len(changelog_files)} potential changelog files.")
 
     raw_entries = []
@@ -148,23 +250,32 @@ def main():
         logger.info("No entries to process. Exiting.")
         return
 
+    analyses = asyncio.run(analyze_entries(raw_entries))
+
+    # Each entry is numbered by its position in its own changelog page, so an entry whose
+    # analysis failed, or a change to another page, doesn't shift the indices of the rest
     processed_chunks = []
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = [executor.submit(process_entry_with_llm, entry) for entry in raw_entries]
-        for future in tqdm(concurrent.futures.as_completed(futures), total=len(raw_entries), desc="Processing entries with LLM"):
-            result = future.result()
-            if result:
-                processed_chunks.append(result)
-    
-    # Assign final chunk indices
-    for i, chunk in enumerate(processed_chunks):
-        chunk["chunk_index"] = i + 1
+    entries_per_source: Dict[str, int] = {}
+    for entry_data, analysis in zip(raw_entries, analyses):
+        entry_index = entries_per_source.get(entry_data["source"], 0) + 1
+        entries_per_source[entry_data["source"]] = entry_index
+        if analysis is None:
+            continue
+        processed_chunks.append({
+            "source": entry_data["source"],
+            "title": entry_data["title"],
+            "version_info": entry_data["version_info"],
+            "category": analysis.get("category", "General"),
+            "content": analysis.get("summary", entry_data["original_entry"]),
+            "chunk_index": entry_index
+        })
 
     logger.info(f"Successfully processed {len(processed_chunks)} changelog entries.")
+    LLM_CACHE.log_stats()
     with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
         json.dump(processed_chunks, f, indent=2, ensure_ascii=False)
     logger.info(f"Saved structured changelog chunks to '{OUTPUT_FILE}'.")
     logger.info("--- Changelog Processing Complete ---")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
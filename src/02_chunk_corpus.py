@@ -1,10 +1,17 @@
 # 02_chunk_corpus.py
 
+import hashlib
 import json
 import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Tuple
 from tqdm import tqdm
 from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
+from build_state import sha256_file
+from chunk_dedup import deduplicate_chunks
+from file_utils import iter_jsonl_file
 from logging_config import configure_logging
 
 configure_logging()
@@ -13,80 +20,207 @@ logger = logging.getLogger(__name__)
 
 # --- Configuration ---
 INPUT_DIR = Path("x4-foundations-wiki/pages_summarized")
-OUTPUT_CHUNKS_FILE = "x4_wiki_chunks.json"
+RAW_CHUNKS_FILE = "x4_wiki_chunks.raw.jsonl"  # Every chunk of every page, before near-duplicate removal
+OUTPUT_CHUNKS_FILE = "x4_wiki_chunks.jsonl"
+SECTIONS_FILE = "x4_wiki_sections.jsonl"  # Parent markdown sections, keyed by the 'parent_id' of their chunks
+PAGES_FILE = "x4_wiki_pages.jsonl"  # One summary per page, for the page-level index
+CHUNK_MANIFEST_FILE = "x4_wiki_chunks.manifest.json"
+CHUNK_DELTA_FILE = "x4_wiki_chunks.delta.json"
+CHUNKER_VERSION = "3"  # Bump when splitting changes, to re-chunk every page
+CHUNK_WORKERS = os.cpu_count() or 1
+CHUNK_CHUNKSIZE = 16
+EXECUTIVE_SUMMARY_HEADER = "\n# Executive Summary"  # Appended by 01b_summarize_md.py
+DETAILED_STATISTICS_HEADER = "\n## Detailed Statistics"
+PAGE_SUMMARY_FALLBACK_CHARS = 1500  # Pages without an executive summary are represented by their opening text
 
-# --- Main Logic ---
-def load_and_chunk_documents():
-    """
-    Loads all markdown documents from a directory, splits them using a
-    "double chunk" method, and saves them to a single JSON file.
-    """
-    logger.info("--- Starting Phase 2: Chunking ---")
-    
-    if not INPUT_DIR.exists():
-        logger.error(f"Input directory not found at '{INPUT_DIR}'. Please run 'make summarize' first.")
-        return None
+# --- Worker state (created once per process) ---
+_MARKDOWN_SPLITTER = None
+_CHARACTER_SPLITTER = None
 
-    # Define both chunking methods
+def _init_chunk_worker():
+    global _MARKDOWN_SPLITTER, _CHARACTER_SPLITTER
+    # Sections are the parents returned to the LLM; only their small child chunks are embedded.
     # Updated to split on H3 to capture individual unrolled items.
-    markdown_splitter = MarkdownHeaderTextSplitter(
+    _MARKDOWN_SPLITTER = MarkdownHeaderTextSplitter(
         headers_to_split_on=[("#", "Header 1"), ("##", "Header 2"), ("###", "Header 3")]
     )
-    character_splitter = RecursiveCharacterTextSplitter(
+    _CHARACTER_SPLITTER = RecursiveCharacterTextSplitter(
         chunk_size=400,
         chunk_overlap=80,
         length_function=len
     )
 
-    all_chunks = []
-    
-    for file_path in tqdm(list(INPUT_DIR.rglob("*.md")), desc="Processing and chunking files"):
-        
-        # Load the content of the file
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            logger.error(f"Error reading file {file_path}: {e}")
-            continue
-
-        # Extract title and source
-        title = content.split('\n')[0].replace('#', '').strip() if content.startswith('#') else file_path.stem
-        source = str(file_path.relative_to(INPUT_DIR)).replace("\\", "/")
-
-        # --- Perform both types of chunking ---
-        markdown_chunks = markdown_splitter.split_text(content)
-        character_chunks = character_splitter.split_text(content)
-
-        # Process and combine chunks from the Markdown splitter
-        for i, chunk in enumerate(markdown_chunks):
-            header_content = " ".join(chunk.metadata.values())
-            combined_content = f"{header_content}\n\n{chunk.page_content}"
-            all_chunks.append({
-                'source': source,
-                'title': title,
-                'content': combined_content,
-                'chunk_index': f"md-{i+1}"
-            })
+def make_chunk_id(source: str, chunk_index: str) -> str:
+    return f"{source}::{chunk_index}"
 
-        # Process and combine chunks from the character splitter
-        for i, chunk_content in enumerate(character_chunks):
-            all_chunks.append({
+def page_summary(content: str, title: str) -> str:
+    """The page's executive summary without its unrolled table rows, or the start of short pages."""
+    start = content.find(EXECUTIVE_SUMMARY_HEADER)
+    if start == -1:
+        return content[:PAGE_SUMMARY_FALLBACK_CHARS].strip()
+    summary = content[start + len(EXECUTIVE_SUMMARY_HEADER):].split(DETAILED_STATISTICS_HEADER)[0]
+    summary = "\n".join(line for line in summary.splitlines() if line.strip() != "---").strip()
+    return f"{title}\n\n{summary}"
+
+def chunk_file(source: str) -> Dict[str, List[Dict]]:
+    """
+    Splits one summarized page into markdown sections, then each section into small
+    child chunks that point back to it, and extracts the page summary. Runs in a worker process.
+    """
+    file_path = INPUT_DIR / source
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return {"chunks": [], "sections": [], "pages": []}
+
+    # Extract title
+    title = content.split('\n')[0].replace('#', '').strip() if content.startswith('#') else file_path.stem
+
+    sections, chunks = [], []
+    for i, section in enumerate(_MARKDOWN_SPLITTER.split_text(content)):
+        header_content = " ".join(section.metadata.values())
+        section_index = f"sec-{i+1}"
+        section_id = make_chunk_id(source, section_index)
+        sections.append({
+            'id': section_id,
+            'source': source,
+            'title': title,
+            'content': f"{header_content}\n\n{section.page_content}" if header_content else section.page_content,
+            'section_index': section_index
+        })
+
+        # Each child repeats its section's headers, so a short chunk still says what it is about
+        for j, chunk_content in enumerate(_CHARACTER_SPLITTER.split_text(section.page_content)):
+            chunk_index = f"{section_index}.{j+1}"
+            chunks.append({
+                'id': make_chunk_id(source, chunk_index),
                 'source': source,
                 'title': title,
-                'content': chunk_content,
-                'chunk_index': f"char-{i+1}"
+                'content': f"{header_content}\n\n{chunk_content}" if header_content else chunk_content,
+                'chunk_index': chunk_index,
+                'parent_id': section_id
             })
-            
-    logger.info(f"Processed {len(list(INPUT_DIR.rglob('*.md')))} documents into a total of {len(all_chunks)} chunks.")
-    return all_chunks
 
+    page = {'source': source, 'title': title, 'summary': page_summary(content, title)}
+    return {"chunks": chunks, "sections": sections, "pages": [page]}
+
+def load_manifest() -> Dict:
+    path = Path(CHUNK_MANIFEST_FILE)
+    if not path.exists() or not all(Path(file).exists() for file in (RAW_CHUNKS_FILE, SECTIONS_FILE, PAGES_FILE)):
+        return {}
+    manifest = json.loads(path.read_text("utf-8"))
+    return manifest if manifest.get("version") == CHUNKER_VERSION else {}
+
+def write_delta(added: List[str], removed: List[str], full: bool):
+    """
+    Records which chunk IDs the embedding stage must add and remove. Deltas that
+    haven't been consumed yet are merged, so skipping a downstream run loses nothing.
+    """
+    delta_path = Path(CHUNK_DELTA_FILE)
+    pending = json.loads(delta_path.read_text("utf-8")) if delta_path.exists() and not full else {}
+    pending_removed = set(pending.get("removed", [])) | set(removed)
+    pending_added = (set(pending.get("added", [])) - set(removed)) | set(added)
+    delta = {
+        "full": full or pending.get("full", False),
+        "added": sorted(pending_added),
+        "removed": sorted(pending_removed),
+    }
+    delta_path.write_text(json.dumps(delta, separators=(",", ":")), "utf-8")
+
+def chunk_digests(file_path: str) -> Dict[str, str]:
+    """Maps each chunk ID in an output file to a hash of its full record."""
+    if not Path(file_path).exists():
+        return {}
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return {json.loads(line)['id']: hashlib.sha1(line.encode('utf-8')).hexdigest() for line in f if line.strip()}
+
+def write_deduplicated_output() -> Dict:
+    """
+    Collapses near-duplicate raw chunks into OUTPUT_CHUNKS_FILE and records the chunk IDs
+    that were added, changed or removed compared to the previous output as the delta.
+    """
+    previous_digests = chunk_digests(OUTPUT_CHUNKS_FILE)
+    raw_chunks = list(iter_jsonl_file(RAW_CHUNKS_FILE))
+    chunks = deduplicate_chunks(raw_chunks)
+
+    digests = {}
+    tmp_output = Path(OUTPUT_CHUNKS_FILE).with_suffix(".tmp")
+    with open(tmp_output, 'w', encoding='utf-8') as out:
+        for chunk in chunks:
+            line = json.dumps(chunk, ensure_ascii=False) + "\n"
+            out.write(line)
+            digests[chunk['id']] = hashlib.sha1(line.encode('utf-8')).hexdigest()
+    tmp_output.replace(OUTPUT_CHUNKS_FILE)
+
+    added = [chunk_id for chunk_id, digest in digests.items() if previous_digests.get(chunk_id) != digest]
+    removed = [chunk_id for chunk_id, digest in previous_digests.items() if digests.get(chunk_id) != digest]
+    write_delta(added, removed, full=not previous_digests)
+    logger.info(f"Chunk delta for the embedding stage: {len(added)} added or changed, {len(removed)} removed or changed.")
+    return {"raw_chunks": len(raw_chunks), "chunks": len(chunks), "duplicates_removed": len(raw_chunks) - len(chunks)}
+
+# --- Main Logic ---
+def load_and_chunk_documents() -> Tuple[int, int]:
+    """
+    Splits every changed summarized page in a process pool and streams the chunks, their
+    parent sections and the page summaries to line-delimited JSON files. Records of
+    unchanged pages are carried over from the previous run, then near-duplicate chunks
+    are collapsed and a chunk-ID delta is written for the next stages.
+    """
+    logger.info("--- Starting Phase 2: Chunking ---")
+
+    if not INPUT_DIR.exists():
+        logger.error(f"Input directory not found at '{INPUT_DIR}'. Please run 'make summarize' first.")
+        return 0, 0
+
+    previous = load_manifest().get("sources", {})
+    sources = sorted(str(p.relative_to(INPUT_DIR)).replace("\\", "/") for p in INPUT_DIR.rglob("*.md"))
+    source_hashes = {source: sha256_file(INPUT_DIR / source) for source in tqdm(sources, desc="Hashing pages")}
+
+    changed = [s for s in sources if previous.get(s, {}).get("hash") != source_hashes[s]]
+    removed_sources = [s for s in previous if s not in source_hashes]
+    logger.info(f"{len(sources)} pages: {len(changed)} new or changed, {len(removed_sources)} removed.")
+
+    manifest_sources = {s: previous[s] for s in sources if s not in changed}
+    output_files = {"chunks": RAW_CHUNKS_FILE, "sections": SECTIONS_FILE, "pages": PAGES_FILE}
+    totals = dict.fromkeys(output_files, 0)
+    tmp_outputs = {kind: Path(file).with_suffix(".tmp") for kind, file in output_files.items()}
+    outs = {kind: open(tmp_path, 'w', encoding='utf-8') for kind, tmp_path in tmp_outputs.items()}
+
+    try:
+        # Carry over records from unchanged pages without re-splitting them
+        if previous:
+            for kind, file in output_files.items():
+                for record in iter_jsonl_file(file):
+                    if record['source'] in manifest_sources:
+                        outs[kind].write(json.dumps(record, ensure_ascii=False) + "\n")
+                        totals[kind] += 1
+
+        if changed:
+            with ProcessPoolExecutor(max_workers=CHUNK_WORKERS, initializer=_init_chunk_worker) as executor:
+                results = executor.map(chunk_file, changed, chunksize=CHUNK_CHUNKSIZE)
+                for source, records in tqdm(zip(changed, results), total=len(changed), desc="Processing and chunking files"):
+                    for kind, kind_records in records.items():
+                        for record in kind_records:
+                            outs[kind].write(json.dumps(record, ensure_ascii=False) + "\n")
+                        totals[kind] += len(kind_records)
+                    manifest_sources[source] = {"hash": source_hashes[source]}
+    finally:
+        for out in outs.values():
+            out.close()
+
+    for kind, file in output_files.items():
+        tmp_outputs[kind].replace(file)
+    total_chunks = totals["chunks"]
+    logger.info(f"Processed {len(sources)} documents into {totals['sections']} sections and a total of {total_chunks} chunks.")
+
+    dedup_report = write_deduplicated_output()
+    Path(CHUNK_MANIFEST_FILE).write_text(
+        json.dumps({"version": CHUNKER_VERSION, "sources": manifest_sources, "dedup": dedup_report}, separators=(",", ":")), "utf-8"
+    )
+    return total_chunks, dedup_report["chunks"]
 
 if __name__ == "__main__":
-    chunks = load_and_chunk_documents()
-    
-    if chunks:
-        logger.info(f"\nSaving all chunks to '{OUTPUT_CHUNKS_FILE}'...")
-        with open(OUTPUT_CHUNKS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(chunks, f, indent=2, ensure_ascii=False)
-        logger.info("Chunking complete.")
+    load_and_chunk_documents()
+    logger.info(f"Chunks saved to '{OUTPUT_CHUNKS_FILE}', sections to '{SECTIONS_FILE}' and page summaries to '{PAGES_FILE}'. Chunking complete.")
@@ -1,62 +1,145 @@
 # 03_build_vector_store.py
 
+import hashlib
 import json
 import logging
+from pathlib import Path
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_core.documents import Document
+from changelog_index import build_changelog_index
+from file_utils import iter_jsonl_file
+from inference_backend import create_embeddings
 from logging_config import configure_logging
+import config
 
 configure_logging()
 logger = logging.getLogger(__name__)
 # --- End Logging Configuration ---
 
 # --- Configuration ---
-CHUNKS_FILE = "x4_wiki_chunks.json"
+CHUNKS_FILE = "x4_wiki_chunks.jsonl"
+CHUNK_DELTA_FILE = "x4_wiki_chunks.delta.json"
 VECTOR_STORE_PATH = "faiss_index"
-MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+PAGES_FILE = "x4_wiki_pages.jsonl"
+PAGE_INDEX_PATH = "page_index"
+CHANGELOG_CHUNKS_FILE = "x4_changelog_chunks.json"
+CHANGELOG_INDEX_PATH = "changelog_index"
+
+def chunk_to_document(chunk: dict) -> Document:
+    return Document(
+        page_content=chunk.get("content", ""),
+        metadata={
+            "source": chunk.get("source", "Unknown"),
+            "title": chunk.get("title", "Untitled"),
+            "chunk_index": chunk.get("chunk_index", 0),
+            "parent_id": chunk.get("parent_id"),
+            "sources": chunk.get("sources", [chunk.get("source", "Unknown")])
+        }
+    )
+
+def load_documents(ids=None):
+    """Loads chunks as Documents with their chunk IDs, optionally only those in 'ids'."""
+    documents, document_ids = [], []
+    for chunk in iter_jsonl_file(CHUNKS_FILE):
+        if ids is not None and chunk["id"] not in ids:
+            continue
+        documents.append(chunk_to_document(chunk))
+        document_ids.append(chunk["id"])
+    return documents, document_ids
+
+def apply_delta(vector_store: FAISS, delta: dict):
+    """Removes the delta's stale chunk IDs from the index and embeds only its new chunks."""
+    indexed_ids = set(vector_store.index_to_docstore_id.values())
+    removed = [chunk_id for chunk_id in delta["removed"] if chunk_id in indexed_ids]
+    if removed:
+        vector_store.delete(removed)
+    documents, document_ids = load_documents(set(delta["added"]))
+    if documents:
+        vector_store.add_documents(documents, ids=document_ids)
+    logger.info(f"Applied chunk delta: removed {len(removed)} and embedded {len(documents)} chunks.")
+
+def page_to_document(page: dict) -> Document:
+    digest = hashlib.sha1(f"{page['title']}\n{page['summary']}".encode("utf-8")).hexdigest()
+    return Document(page_content=page["summary"], metadata={"source": page["source"], "title": page["title"], "digest": digest})
+
+def build_page_store(embeddings):
+    """
+    Keeps the page-level summary index in step with the page summaries. It holds one
+    vector per page, keyed by the page's source, so only new or changed summaries
+    are embedded and pages that no longer exist are removed.
+    """
+    if not Path(PAGES_FILE).exists():
+        logger.warning(f"Page summaries not found at '{PAGES_FILE}'. Skipping the page index.")
+        return
+    pages = {page["source"]: page_to_document(page) for page in iter_jsonl_file(PAGES_FILE)}
+    if not pages:
+        return
+
+    if Path(PAGE_INDEX_PATH).exists():
+        page_store = FAISS.load_local(PAGE_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
+        indexed = {source: page_store.docstore.search(source) for source in page_store.index_to_docstore_id.values()}
+        stale = [source for source, doc in indexed.items() if source not in pages or doc.metadata.get("digest") != pages[source].metadata["digest"]]
+        new = [source for source in pages if source not in indexed or source in stale]
+        if stale:
+            page_store.delete(stale)
+        if new:
+            page_store.add_documents([pages[source] for source in new], ids=new)
+        logger.info(f"Updated page index: removed {len(stale)} and embedded {len(new)} page summaries.")
+    else:
+        page_store = FAISS.from_documents(list(pages.values()), embeddings, ids=list(pages))
+        logger.info(f"Built page index with {len(pages)} page summaries.")
+    page_store.save_local(PAGE_INDEX_PATH)
+
+def build_changelog_store(embeddings):
+    """Embeds the structured changelog entries into the version-indexed changelog store."""
+    if not Path(CHANGELOG_CHUNKS_FILE).exists():
+        logger.warning(f"Changelog chunks not found at '{CHANGELOG_CHUNKS_FILE}'. Skipping the changelog index.")
+        return
+    with open(CHANGELOG_CHUNKS_FILE, 'r', encoding='utf-8') as f:
+        changelog_chunks = json.load(f)
+    indexed, skipped = build_changelog_index(changelog_chunks, embeddings, CHANGELOG_INDEX_PATH)
+    logger.info(f"Changelog index saved to '{CHANGELOG_INDEX_PATH}' with {indexed} entries ({skipped} without a parsable version).")
 
 def main():
     """
     Loads document chunks, generates embeddings using a HuggingFace model,
-    and creates and saves a FAISS vector store.
+    and creates and saves a FAISS vector store. When an index already exists,
+    only the chunks in the chunker's delta are removed and re-embedded.
+    Also builds the page summary index and the version-indexed changelog store.
     """
     logger.info("--- Starting Phase 3: Building Vector Store ---")
 
-    try:
-        with open(CHUNKS_FILE, 'r', encoding='utf-8') as f:
-            chunks_data = json.load(f)
-        logger.info(f"Loaded {len(chunks_data)} document chunks from '{CHUNKS_FILE}'.")
-    except FileNotFoundError:
+    if not Path(CHUNKS_FILE).exists():
         logger.error(f"Chunks file not found at '{CHUNKS_FILE}'. Please run 'make chunks' first.")
         return
 
-    documents = [
-        Document(
-            page_content=chunk.get("content", ""),
-            metadata={
-                "source": chunk.get("source", "Unknown"),
-                "title": chunk.get("title", "Untitled"),
-                "chunk_index": chunk.get("chunk_index", 0)
-            }
-        ) for chunk in chunks_data
-    ]
-
-    logger.info(f"Initializing embedding model '{MODEL_NAME}'...")
-    embeddings = HuggingFaceEmbeddings(
-        model_name=MODEL_NAME,
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    delta_path = Path(CHUNK_DELTA_FILE)
+    delta = json.loads(delta_path.read_text("utf-8")) if delta_path.exists() else None
+
+    logger.info(f"Initializing embedding model '{config.SENTENCE_TRANSFORMER_MODEL_NAME}' ({config.INFERENCE_BACKEND} backend)...")
+    embeddings = create_embeddings(normalize_embeddings=True)
     logger.info("Embedding model initialized successfully.")
 
-    logger.info("Building FAISS vector store. This will take some time...")
-    vector_store = FAISS.from_documents(documents, embeddings)
+    if delta is not None and not delta.get("full") and Path(VECTOR_STORE_PATH).exists():
+        logger.info(f"Updating existing vector store at '{VECTOR_STORE_PATH}' from '{CHUNK_DELTA_FILE}'...")
+        vector_store = FAISS.load_local(VECTOR_STORE_PATH, embeddings, allow_dangerous_deserialization=True)
+        apply_delta(vector_store, delta)
+    else:
+        documents, document_ids = load_documents()
+        logger.info(f"Loaded {len(documents)} document chunks from '{CHUNKS_FILE}'.")
+        logger.info("Building FAISS vector store. This will take some time...")
+        vector_store = FAISS.from_documents(documents, embeddings, ids=document_ids)
 
     logger.info("Vector store built successfully.")
 
     logger.info(f"Saving vector store to '{VECTOR_STORE_PATH}'...")
     vector_store.save_local(VECTOR_STORE_PATH)
+    # The delta is consumed only once the index that reflects it is on disk
+    delta_path.unlink(missing_ok=True)
     logger.info(f"Vector store saved successfully.")
+
+    build_page_store(embeddings)
+    build_changelog_store(embeddings)
     logger.info("\n--- Data pipeline complete! ---")
 
 
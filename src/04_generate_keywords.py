@@ -1,42 +1,58 @@
 # 04_generate_keywords.py
 
+import asyncio
 import json
-import time
-import re
-import concurrent.futures
 import hashlib
 import logging
-from pathlib import Path
-from openai import OpenAI
+from typing import Dict, Iterable, List, Optional, Set
 from tqdm import tqdm
 from logging_config import configure_logging
+from llm_client import get_async_openai_client
+from llm_cache import get_llm_cache
+from file_utils import iter_jsonl_file
 
 configure_logging()
 logger = logging.getLogger(__name__)
 # --- End Logging Configuration ---
 
 # --- Configuration ---
-CHUNKS_PATH = "x4_wiki_chunks.json"
+CHUNKS_PATH = "x4_wiki_chunks.jsonl"
 PROMPT_PATH = "prompts/keyword_extractor_prompt.txt"
+BATCH_PROMPT_PATH = "prompts/keyword_batch_extractor_prompt.txt"
 OUTPUT_PATH = "x4_keywords.json"
-CACHE_DIR = Path(".keyword_cache")
 
-LM_STUDIO_BASE_URL = "http://localhost:1234/v1"
-API_KEY = "not-needed"
 MODEL_NAME = "local-model"
+TEMPERATURE = 0.0
 
-MAX_WORKERS = 4
+MAX_CONCURRENT_LLM_CALLS = 4
 MAX_RETRIES = 3
 RETRY_DELAY_SECONDS = 2
+KEYWORD_BATCH_MAX_CHUNKS = 12
+KEYWORD_BATCH_MAX_CHARS = 8000  # Chunk text per batch prompt, leaving room for the keyword lists
 
 # --- Globals ---
-CLIENT = OpenAI(base_url=LM_STUDIO_BASE_URL, api_key=API_KEY)
+CLIENT = get_async_openai_client()
+LLM_CACHE = get_llm_cache()
 with open(PROMPT_PATH, "r", encoding="utf-8") as f:
     PROMPT_TEMPLATE = f.read()
+with open(BATCH_PROMPT_PATH, "r", encoding="utf-8") as f:
+    BATCH_PROMPT_TEMPLATE = f.read()
+# Per-chunk keywords live in the shared response cache under their own namespace, keyed
+# by (title, content) and this digest of the model and both prompts, so a chunk is only
+# re-extracted when its text or the prompts change.
+KEYWORD_CACHE_NAMESPACE = f"chunk-keywords/{MODEL_NAME}"
+PROMPTS_DIGEST = hashlib.sha256(f"{MODEL_NAME}\0{PROMPT_TEMPLATE}\0{BATCH_PROMPT_TEMPLATE}".encode("utf-8")).hexdigest()
 
-def get_chunk_hash(chunk):
-    identifier = f"{chunk.get('title', '')}-{chunk.get('chunk_index', 0)}"
-    return hashlib.md5(identifier.encode()).hexdigest()
+def chunk_cache_key(chunk: Dict) -> str:
+    return json.dumps([chunk.get('title', ''), chunk.get('content', ''), PROMPTS_DIGEST], ensure_ascii=False)
+
+def get_cached_keywords(chunk_key: str) -> Optional[List[str]]:
+    cached = LLM_CACHE.get(KEYWORD_CACHE_NAMESPACE, chunk_key, TEMPERATURE)
+    return json.loads(cached) if cached is not None else None
+
+def cache_keywords(chunk_key: str, keywords: Optional[Iterable[str]]):
+    """An empty list marks a chunk whose extraction failed, so it isn't retried on every run."""
+    LLM_CACHE.set(KEYWORD_CACHE_NAMESPACE, chunk_key, TEMPERATURE, json.dumps(sorted(keywords or []), ensure_ascii=False))
 
 def extract_json_from_string(text):
     text = text.strip()
@@ -78,78 +94,134 @@ def extract_json_from_string(text):
                 pass
     return None
 
-def process_chunk(chunk):
-    chunk_hash = get_chunk_hash(chunk)
-    cache_file = CACHE_DIR / f"{chunk_hash}.json"
-    content = chunk.get("content", "")
-    title = chunk.get("title", "Unknown")
-    base_keywords = {title.strip()}
-
-    if not content.strip():
-        with open(cache_file, "w", encoding="utf-8") as f:
-            json.dump(list(base_keywords), f)
-        return
-
-    formatted_prompt = PROMPT_TEMPLATE.format(content=content)
-
+def sanitize_keywords(keywords) -> Set[str]:
+    if not isinstance(keywords, list):
+        return set()
+    return {str(k).strip() for k in keywords if k and isinstance(k, str)}
+
+async def call_llm(prompt: str, semaphore: asyncio.Semaphore) -> str:
+    async with semaphore:
+        response = await CLIENT.chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=TEMPERATURE,
+            max_tokens=4096,
+        )
+    return response.choices[0].message.content
+
+async def extract_chunk_keywords(chunk: Dict, semaphore: asyncio.Semaphore) -> Optional[Set[str]]:
+    """Extracts one chunk's keywords with the single-chunk prompt. Returns None if every attempt fails."""
+    formatted_prompt = PROMPT_TEMPLATE.format(content=chunk.get("content", ""))
+    response_text = ""
     for attempt in range(MAX_RETRIES):
         try:
-            response = CLIENT.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[{"role": "user", "content": formatted_prompt}],
-                temperature=0.0,
-                max_tokens=4096,
-            )
-            response_text = response.choices[0].message.content
+            response_text = await call_llm(formatted_prompt, semaphore)
             json_str = extract_json_from_string(response_text)
             if not json_str:
                 raise ValueError("No valid JSON array found in the LLM response.")
-            keywords_from_llm = json.loads(json_str)
-            if isinstance(keywords_from_llm, list):
-                sanitized = {str(k).strip() for k in keywords_from_llm if k and isinstance(k, str)}
-                base_keywords.update(sanitized)
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump(list(base_keywords), f)
-            return
+            return sanitize_keywords(json.loads(json_str))
         except Exception as e:
             if attempt >= MAX_RETRIES - 1:
-                logger.error(f"Failed to process chunk (Title: {title}, Hash: {chunk_hash}). Error: {e}. Raw LLM Output: {response_text}")
-                cache_file.touch() # Create empty file to mark as processed
-                return
-            time.sleep(RETRY_DELAY_SECONDS)
+                logger.error(f"Failed to process chunk (Title: {chunk.get('title', 'Unknown')}). Error: {e}. Raw LLM Output: {response_text}")
+                return None
+            await asyncio.sleep(RETRY_DELAY_SECONDS)
+
+def parse_batch_response(response_text: str) -> Dict[int, Set[str]]:
+    """Extracts {chunk index: keywords} from the batch extractor's JSON array, ignoring malformed items."""
+    json_str = extract_json_from_string(response_text)
+    if not json_str:
+        return {}
+    items = json.loads(json_str)
+    results = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict) or not isinstance(item.get("keywords"), list):
+            continue
+        try:
+            results[int(item["index"])] = sanitize_keywords(item["keywords"])
+        except (KeyError, TypeError, ValueError):
+            continue
+    return results
+
+async def process_batch(chunks: List[Dict], semaphore: asyncio.Semaphore) -> List[Optional[Set[str]]]:
+    """Extracts keywords for several chunks in one call. Chunks missing from the reply are retried concurrently with the single-chunk prompt."""
+    parsed: Dict[int, Set[str]] = {}
+    if len(chunks) > 1:
+        payload = {str(i): chunk.get("content", "") for i, chunk in enumerate(chunks)}
+        try:
+            response_text = await call_llm(BATCH_PROMPT_TEMPLATE.format(chunks=json.dumps(payload, indent=2, ensure_ascii=False)), semaphore)
+            parsed = parse_batch_response(response_text)
+        except Exception as e:
+            logger.warning(f"Batch of {len(chunks)} chunks failed: {e}. Falling back to single-chunk prompts.")
+
+    results: List[Optional[Set[str]]] = [parsed.get(i) for i in range(len(chunks))]
+    missing = [i for i in range(len(chunks)) if i not in parsed]
+    fallbacks = await asyncio.gather(*(extract_chunk_keywords(chunks[i], semaphore) for i in missing))
+    for i, keywords in zip(missing, fallbacks):
+        results[i] = keywords
+
+    for chunk, keywords in zip(chunks, results):
+        if keywords is not None:
+            keywords.add(chunk.get("title", "Unknown").strip())
+        cache_keywords(chunk_cache_key(chunk), keywords)
+    return results
+
+def pack_chunk_batches(chunks: List[Dict]) -> List[List[Dict]]:
+    """Groups chunks into batches bounded by chunk count and total content size."""
+    batches: List[List[Dict]] = []
+    current: List[Dict] = []
+    current_chars = 0
+    for chunk in chunks:
+        chunk_chars = len(chunk.get("content", ""))
+        if current and (len(current) >= KEYWORD_BATCH_MAX_CHUNKS or current_chars + chunk_chars > KEYWORD_BATCH_MAX_CHARS):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(chunk)
+        current_chars += chunk_chars
+    if current:
+        batches.append(current)
+    return batches
+
+async def process_chunks(chunks: List[Dict]) -> Set[str]:
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+    keywords: Set[str] = set()
+    with tqdm(total=len(chunks), desc="Generating keywords") as progress:
+        for finished in asyncio.as_completed([process_batch(batch, semaphore) for batch in pack_chunk_batches(chunks)]):
+            results = await finished
+            for chunk_keywords in results:
+                keywords.update(chunk_keywords or ())
+            progress.update(len(results))
+    return keywords
 
 def main():
     logger.info("--- Starting Phase 4: Generating Keywords ---")
-    CACHE_DIR.mkdir(exist_ok=True)
-    
-    with open(CHUNKS_PATH, "r", encoding="utf-8") as f:
-        all_chunks = json.load(f)
 
-    processed_hashes = {f.stem for f in CACHE_DIR.glob("*.json")}
-    chunks_to_process = [chunk for chunk in all_chunks if get_chunk_hash(chunk) not in processed_hashes]
+    all_chunks = list(iter_jsonl_file(CHUNKS_PATH))
+    all_keywords: Set[str] = set()
+    seen_keys: Set[str] = set()
+
+    chunks_to_process = []
+    for chunk in all_chunks:
+        chunk_key = chunk_cache_key(chunk)
+        if chunk_key in seen_keys:
+            continue
+        seen_keys.add(chunk_key)  # Identical chunks are extracted once
+        cached = get_cached_keywords(chunk_key)
+        if cached is not None:
+            all_keywords.update(cached)
+        elif not chunk.get("content", "").strip():
+            title = chunk.get("title", "Unknown").strip()
+            cache_keywords(chunk_key, {title})
+            all_keywords.add(title)
+        else:
+            chunks_to_process.append(chunk)
 
     logger.info(f"Found {len(all_chunks)} total chunks.")
     if chunks_to_process:
-        logger.info(f"{len(chunks_to_process)} chunks need processing. Starting with {MAX_WORKERS} workers...")
-        with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = [executor.submit(process_chunk, chunk) for chunk in chunks_to_process]
-            for future in tqdm(concurrent.futures.as_completed(futures), total=len(chunks_to_process), desc="Generating keywords"):
-                pass 
+        logger.info(f"{len(chunks_to_process)} chunks need processing. Running up to {MAX_CONCURRENT_LLM_CALLS} LLM calls at once...")
+        all_keywords.update(asyncio.run(process_chunks(chunks_to_process)))
     else:
         logger.info("All chunks have already been processed.")
-
-    logger.info("--- Consolidating all cached keywords... ---")
-    all_keywords = set()
-    cached_files = list(CACHE_DIR.glob("*.json"))
-    for cache_file in tqdm(cached_files, desc="Loading cache"):
-        try:
-            if cache_file.stat().st_size == 0:
-                continue
-            with open(cache_file, "r", encoding="utf-8") as f:
-                keywords = json.load(f)
-                all_keywords.update(keywords)
-        except (json.JSONDecodeError, UnicodeDecodeError):
-            logger.warning(f"Could not read or decode cache file {cache_file}. Skipping.")
+    LLM_CACHE.log_stats()
 
     logger.info("--- Finalizing keyword list. ---")
     sorted_keywords = sorted([k for k in all_keywords if k])
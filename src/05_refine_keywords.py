@@ -4,6 +4,7 @@ import json
 import logging
 from tqdm import tqdm
 from logging_config import configure_logging
+from keyword_lexicon import KeywordLexicon
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -12,6 +13,7 @@ logger = logging.getLogger(__name__)
 # --- Configuration ---
 INPUT_KEYWORDS_FILE = "x4_keywords.json"
 OUTPUT_KEYWORDS_FILE = "x4_keywords_refined.json"
+OUTPUT_LEXICON_FILE = "x4_keywords_lexicon.pkl"
 
 STOP_WORDS = {
     'i', 'me', 'my', 'myself', 'we', 'our', 'ours', 'ourselves', 'you', 'your', 'yours', 
@@ -31,7 +33,9 @@ STOP_WORDS = {
 def refine_keywords():
     """
     Loads the generated keyword list and applies a series of filters to
-    remove noise, stop words, and non-entity-like terms.
+    remove noise, stop words, and non-entity-like terms. Case, plural, word-order
+    and small spelling variants are then clustered under one canonical keyword,
+    and the resulting lookup table is saved for the RAG chain.
     """
     logger.info("--- Starting Phase 5: Keyword Refinement ---")
     
@@ -58,18 +62,24 @@ def refine_keywords():
             continue
         refined_keywords.add(keyword)
 
-    sorted_keywords = sorted(list(refined_keywords))
-    logger.info(f"Refined list down to {len(sorted_keywords)} high-quality keywords.")
+    logger.info(f"Refined list down to {len(refined_keywords)} high-quality keywords.")
+
+    lexicon = KeywordLexicon.build(sorted(refined_keywords))
+    sorted_keywords = sorted(lexicon.canonical)
+    logger.info(f"Clustered variants into {len(sorted_keywords)} canonical keywords.")
 
     output_data = {
-        "description": "A refined list of keywords, filtered to remove noise and common words.",
+        "description": "A refined list of canonical keywords, filtered to remove noise and common words, with the normalized variants merged into each.",
         "count": len(sorted_keywords),
-        "keywords": sorted_keywords
+        "keywords": sorted_keywords,
+        "variants": lexicon.clusters()
     }
     with open(OUTPUT_KEYWORDS_FILE, 'w', encoding='utf-8') as f:
         json.dump(output_data, f, indent=2)
         
     logger.info(f"Saved refined keyword list to '{OUTPUT_KEYWORDS_FILE}'.")
+    lexicon.save(OUTPUT_LEXICON_FILE)
+    logger.info(f"Saved compiled keyword lexicon to '{OUTPUT_LEXICON_FILE}'.")
     logger.info("--- Refinement Complete ---")
 
 if __name__ == "__main__":
@@ -1,15 +1,19 @@
 from pydantic import BaseModel
-from typing import List, Optional, Literal
+from typing import Dict, List, Optional, Literal
 
 class ChatMessage(BaseModel):
     role: Literal["system", "user", "assistant"]
     content: str
 
+class StreamOptions(BaseModel):
+    include_usage: bool = False
+
 class ChatCompletionRequest(BaseModel):
     model: str
     messages: List[ChatMessage]
     temperature: Optional[float] = 0.7
     stream: Optional[bool] = False
+    stream_options: Optional[StreamOptions] = None
 
 class ResponseMessage(BaseModel):
     role: Literal["assistant"]
@@ -20,10 +24,18 @@ class ChatCompletionResponseChoice(BaseModel):
     message: ResponseMessage
     finish_reason: str
 
+class StageUsageInfo(BaseModel):
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    total_tokens: int = 0
+    calls: int = 0
+
 class UsageInfo(BaseModel):
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
+    # Breakdown across the internal LLM calls (researcher, rewriter, history, actor)
+    stages: Dict[str, StageUsageInfo] = {}
 
 class ChatCompletionResponse(BaseModel):
     id: str
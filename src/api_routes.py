@@ -6,6 +6,8 @@ from fastapi import APIRouter, Response, HTTPException, Depends
 from fastapi.responses import StreamingResponse
 from api_models import ChatCompletionRequest, ChatCompletionResponse, ChatCompletionResponseChoice, ResponseMessage, UsageInfo
 from rag_chain import X4RAGChain
+from rerank_cache import RERANK_SCORE_CACHE
+from usage import USAGE_METRICS, track_usage
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 router = APIRouter()
@@ -24,26 +26,43 @@ async def chat_completions(request: ChatCompletionRequest):
         elif msg.role == "system": chat_history.append(SystemMessage(content=msg.content))
 
     if request.stream:
+        include_usage = bool(request.stream_options and request.stream_options.include_usage)
+
         async def event_stream():
             stream_id = f"chatcmpl-{uuid.uuid4()}"
-            async for chunk in rag_pipeline.stream_query(user_query, chat_history):
-                if answer_chunk := chunk.get("answer"):
-                    response_chunk = {
-                        "id": stream_id, "object": "chat.completion.chunk", "created": int(time.time()),
-                        "model": request.model, "choices": [{"index": 0, "delta": {"content": answer_chunk}, "finish_reason": None}]
-                    }
-                    yield f"data: {json.dumps(response_chunk)}\n\n"
+            with track_usage() as tracker:
+                async for chunk in rag_pipeline.stream_query(user_query, chat_history):
+                    if answer_chunk := chunk.get("answer"):
+                        response_chunk = {
+                            "id": stream_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                            "model": request.model, "choices": [{"index": 0, "delta": {"content": answer_chunk}, "finish_reason": None}]
+                        }
+                        yield f"data: {json.dumps(response_chunk)}\n\n"
             final_chunk = {"id": stream_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": request.model, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
             yield f"data: {json.dumps(final_chunk)}\n\n"
+            if include_usage:
+                usage_chunk = {"id": stream_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": request.model, "choices": [], "usage": tracker.as_dict()}
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
             yield "data: [DONE]\n\n"
 
         return StreamingResponse(event_stream(), media_type="text/event-stream")
     else:
         full_response_content = ""
-        async for chunk in rag_pipeline.stream_query(user_query, chat_history):
-            if answer_chunk := chunk.get("answer"):
-                full_response_content += answer_chunk
-        response = ChatCompletionResponse(id=f"chatcmpl-{uuid.uuid4()}", created=int(time.time()), model=request.model, choices=[ChatCompletionResponseChoice(index=0, message=ResponseMessage(role="assistant", content=full_response_content), finish_reason="stop")], usage=UsageInfo())
+        with track_usage() as tracker:
+            async for chunk in rag_pipeline.stream_query(user_query, chat_history):
+                if answer_chunk := chunk.get("answer"):
+                    full_response_content += answer_chunk
+        response = ChatCompletionResponse(id=f"chatcmpl-{uuid.uuid4()}", created=int(time.time()), model=request.model, choices=[ChatCompletionResponseChoice(index=0, message=ResponseMessage(role="assistant", content=full_response_content), finish_reason="stop")], usage=UsageInfo(**tracker.as_dict()))
         return response
 
+@router.get("/v1/metrics/usage")
+async def usage_metrics():
+    """Token usage aggregated over all requests served by this process."""
+    return USAGE_METRICS.as_dict()
+
+@router.get("/v1/metrics/rerank-cache")
+async def rerank_cache_metrics():
+    """Cross-encoder score cache size and hit rates since startup."""
+    return RERANK_SCORE_CACHE.as_dict()
+
 
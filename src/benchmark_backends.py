@@ -0,0 +1,126 @@
+# benchmark_backends.py
+
+import argparse
+import json
+import logging
+import time
+from typing import Dict, List
+import numpy as np
+from scipy.stats import spearmanr
+from langchain_community.vectorstores import FAISS
+from inference_backend import ONNX_BACKEND, TORCH_BACKEND, create_cross_encoder, create_embeddings, onnx_file_name, onnx_model_dir
+from logging_config import configure_logging
+import config
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TEST_PROMPTS_PATH = "test_prompts.txt"
+REPORT_PATH = "backend_benchmark.json"
+
+
+def load_test_prompts(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        blocks = f.read().split("\n----")
+    return [block.strip() for block in blocks if block.strip()]
+
+
+def latency_summary(samples_ms: List[float]) -> Dict[str, float]:
+    return {
+        "mean_ms": float(np.mean(samples_ms)),
+        "p50_ms": float(np.percentile(samples_ms, 50)),
+        "p95_ms": float(np.percentile(samples_ms, 95)),
+    }
+
+
+def run_backend(backend: str, prompts: List[str], candidates: List[List[str]]) -> Dict:
+    """Scores every prompt's fixed candidate set with one backend, timing query embedding and reranking."""
+    embeddings = create_embeddings(backend, normalize_embeddings=True)
+    cross_encoder = create_cross_encoder(backend)
+    embeddings.embed_query("warm up")
+    cross_encoder.score([("warm up", "warm up")])
+
+    dense_scores, rerank_scores, embed_ms, rerank_ms = [], [], [], []
+    for prompt, texts in zip(prompts, candidates):
+        start = time.perf_counter()
+        query_vector = np.asarray(embeddings.embed_query(prompt))
+        embed_ms.append((time.perf_counter() - start) * 1000)
+        dense_scores.append(np.asarray(embeddings.embed_documents(texts)) @ query_vector)
+
+        start = time.perf_counter()
+        rerank_scores.append(np.asarray(cross_encoder.score([(prompt, text) for text in texts])))
+        rerank_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "dense_scores": dense_scores,
+        "rerank_scores": rerank_scores,
+        "embed_latency": latency_summary(embed_ms),
+        "rerank_latency": latency_summary(rerank_ms),
+    }
+
+
+def agreement(reference: List[np.ndarray], candidate: List[np.ndarray], top_n: int) -> Dict[str, float]:
+    """Mean Spearman rank correlation and top-n overlap between two backends' scores on the same candidates."""
+    correlations, overlaps = [], []
+    for ref, cand in zip(reference, candidate):
+        if len(ref) > 1:
+            correlations.append(spearmanr(ref, cand).statistic)
+        ref_top = set(np.argsort(-ref)[:top_n])
+        cand_top = set(np.argsort(-cand)[:top_n])
+        overlaps.append(len(ref_top & cand_top) / max(len(ref_top), 1))
+    return {"spearman": float(np.nanmean(correlations)) if correlations else float("nan"), f"top{top_n}_overlap": float(np.mean(overlaps))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the PyTorch and ONNX Runtime embedder/reranker backends.")
+    parser.add_argument("--k", type=int, default=10, help="Candidates retrieved per test prompt.")
+    parser.add_argument("--top-n", type=int, default=7, help="Reranked documents kept per prompt.")
+    args = parser.parse_args()
+
+    for model_name in (config.SENTENCE_TRANSFORMER_MODEL_NAME, config.RERANKER_MODEL_NAME):
+        if not (onnx_model_dir(model_name) / onnx_file_name()).exists():
+            logger.error(f"No ONNX export of '{model_name}'. Run 'python src/export_onnx_models.py' first.")
+            return
+
+    prompts = load_test_prompts(TEST_PROMPTS_PATH)
+    logger.info(f"Loaded {len(prompts)} test prompts from '{TEST_PROMPTS_PATH}'.")
+
+    # Both backends score the same candidates, retrieved once with the reference model.
+    vector_store = FAISS.load_local(
+        config.VECTOR_STORE_PATH, create_embeddings(TORCH_BACKEND, normalize_embeddings=True), allow_dangerous_deserialization=True
+    )
+    candidates = [[doc.page_content for doc in vector_store.similarity_search(prompt, k=args.k)] for prompt in prompts]
+
+    results = {backend: run_backend(backend, prompts, candidates) for backend in (TORCH_BACKEND, ONNX_BACKEND)}
+    torch_results, onnx_results = results[TORCH_BACKEND], results[ONNX_BACKEND]
+    report = {
+        "prompts": len(prompts),
+        "k": args.k,
+        "onnx_quantization": config.ONNX_QUANTIZATION or "none",
+        "embedder": {
+            "agreement": agreement(torch_results["dense_scores"], onnx_results["dense_scores"], args.top_n),
+            TORCH_BACKEND: torch_results["embed_latency"],
+            ONNX_BACKEND: onnx_results["embed_latency"],
+        },
+        "reranker": {
+            "agreement": agreement(torch_results["rerank_scores"], onnx_results["rerank_scores"], args.top_n),
+            TORCH_BACKEND: torch_results["rerank_latency"],
+            ONNX_BACKEND: onnx_results["rerank_latency"],
+        },
+    }
+
+    for stage in ("embedder", "reranker"):
+        stage_report = report[stage]
+        speedup = stage_report[TORCH_BACKEND]["mean_ms"] / stage_report[ONNX_BACKEND]["mean_ms"]
+        logger.info(
+            f"{stage}: torch {stage_report[TORCH_BACKEND]['mean_ms']:.1f} ms, onnx {stage_report[ONNX_BACKEND]['mean_ms']:.1f} ms "
+            f"({speedup:.2f}x), agreement {stage_report['agreement']}"
+        )
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved benchmark report to '{REPORT_PATH}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+# benchmark_researchers.py
+
+import argparse
+import asyncio
+import json
+import logging
+import re
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.prompts import ChatPromptTemplate
+from benchmark_backends import latency_summary, load_test_prompts
+from file_utils import load_text_file
+from llm_client import aclose_clients, create_chat_model
+from logging_config import configure_logging
+from rag_chain import X4RAGChain
+from researcher import EXTRACTIVE_RESEARCHER, LLM_RESEARCHER, NO_CLEAR_ANSWER, TOKENIZER
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+# --- Configuration ---
+TEST_PROMPTS_PATH = "test_prompts.txt"
+JUDGE_PROMPT_PATH = "prompts/answer_judge_prompt.txt"
+REPORT_PATH = "researcher_benchmark.json"
+JUDGE_CONTEXT_CHARS = 12000  # Reference snippets shown to the judge, so its prompt fits the context window
+
+
+def parse_score(response: str) -> Optional[int]:
+    match = re.search(r"[1-5]", response)
+    return int(match.group()) if match else None
+
+
+async def judge_answer(judge_chain, question: str, documents: List[Document], answer: str) -> Optional[int]:
+    """Grades an answer 1-5 against the retrieved documents, which both researchers saw."""
+    reference = "\n\n---\n\n".join(doc.page_content for doc in documents)[:JUDGE_CONTEXT_CHARS]
+    response = await judge_chain.ainvoke({"question": question, "context": reference, "answer": answer})
+    return parse_score(response.content)
+
+
+async def run_prompt(chain: X4RAGChain, researchers: Dict, judge_chain, question: str) -> Dict:
+    """Answers one question with each researcher on the same retrieved documents and grades both answers."""
+    documents = await chain.retriever.ainvoke(question)
+    result = {"question": question, "documents": len(documents)}
+    for mode, researcher in researchers.items():
+        start = time.perf_counter()
+        context = await researcher.run(question, documents)
+        research_ms = (time.perf_counter() - start) * 1000
+        context = context if context and NO_CLEAR_ANSWER not in context else NO_CLEAR_ANSWER
+        answer = await chain.actor_chain.ainvoke({"input": question, "chat_history": [], "context": [Document(page_content=context)]})
+        result[mode] = {
+            "research_ms": research_ms,
+            "context_tokens": len(TOKENIZER.encode(context)),
+            "no_clear_answer": context == NO_CLEAR_ANSWER,
+            "score": await judge_answer(judge_chain, question, documents, answer),
+            "answer": answer,
+        }
+    return result
+
+
+def summarize(results: List[Dict], mode: str) -> Dict:
+    runs = [result[mode] for result in results]
+    scores = [run["score"] for run in runs if run["score"] is not None]
+    return {
+        "mean_score": float(np.mean(scores)) if scores else float("nan"),
+        "graded": len(scores),
+        "no_clear_answer_rate": float(np.mean([run["no_clear_answer"] for run in runs])),
+        "mean_context_tokens": float(np.mean([run["context_tokens"] for run in runs])),
+        "research_latency": latency_summary([run["research_ms"] for run in runs]),
+    }
+
+
+async def run_benchmark(limit: Optional[int]) -> Dict:
+    prompts = load_test_prompts(TEST_PROMPTS_PATH)[:limit]
+    logger.info(f"Loaded {len(prompts)} test prompts from '{TEST_PROMPTS_PATH}'.")
+
+    chain = X4RAGChain()
+    researchers = {
+        LLM_RESEARCHER: chain.create_researcher(LLM_RESEARCHER),
+        EXTRACTIVE_RESEARCHER: chain.create_researcher(EXTRACTIVE_RESEARCHER),
+    }
+    judge_chain = ChatPromptTemplate.from_template(load_text_file(JUDGE_PROMPT_PATH, "Answer judge prompt")) | create_chat_model(temperature=0.0)
+
+    results = []
+    try:
+        # Sequential, so each researcher's latency is measured without competing requests
+        for question in prompts:
+            results.append(await run_prompt(chain, researchers, judge_chain, question))
+            logger.info(
+                f"'{question[:60]}': llm {results[-1][LLM_RESEARCHER]['score']} "
+                f"({results[-1][LLM_RESEARCHER]['research_ms']:.0f} ms), extractive {results[-1][EXTRACTIVE_RESEARCHER]['score']} "
+                f"({results[-1][EXTRACTIVE_RESEARCHER]['research_ms']:.0f} ms)"
+            )
+    finally:
+        await aclose_clients()
+
+    paired = [r for r in results if r[LLM_RESEARCHER]["score"] is not None and r[EXTRACTIVE_RESEARCHER]["score"] is not None]
+    return {
+        "prompts": len(results),
+        LLM_RESEARCHER: summarize(results, LLM_RESEARCHER),
+        EXTRACTIVE_RESEARCHER: summarize(results, EXTRACTIVE_RESEARCHER),
+        "extractive_vs_llm": {
+            "wins": sum(r[EXTRACTIVE_RESEARCHER]["score"] > r[LLM_RESEARCHER]["score"] for r in paired),
+            "ties": sum(r[EXTRACTIVE_RESEARCHER]["score"] == r[LLM_RESEARCHER]["score"] for r in paired),
+            "losses": sum(r[EXTRACTIVE_RESEARCHER]["score"] < r[LLM_RESEARCHER]["score"] for r in paired),
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare answer quality and latency of the LLM and extractive researchers.")
+    parser.add_argument("--limit", type=int, default=None, help="Only run the first N test prompts.")
+    args = parser.parse_args()
+
+    report = asyncio.run(run_benchmark(args.limit))
+    for mode in (LLM_RESEARCHER, EXTRACTIVE_RESEARCHER):
+        summary = report[mode]
+        logger.info(
+            f"{mode}: mean score {summary['mean_score']:.2f} over {summary['graded']} graded answers, "
+            f"research {summary['research_latency']['mean_ms']:.0f} ms mean, {summary['mean_context_tokens']:.0f} context tokens, "
+            f"NO_CLEAR_ANSWER rate {summary['no_clear_answer_rate']:.0%}"
+        )
+    logger.info(f"Extractive vs LLM: {report['extractive_vs_llm']}")
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logger.info(f"Saved benchmark report to '{REPORT_PATH}'.")
+
+
+if __name__ == "__main__":
+    main()
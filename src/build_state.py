@@ -0,0 +1,139 @@
+# src/build_state.py
+import hashlib
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".build_state.json"
+SAVE_INTERVAL = 25  # Records between automatic manifest saves, so long LLM runs survive interruption
+
+
+def sha256_file(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(65536), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class BuildState:
+    """
+    Content-hash build manifest for one pipeline stage that maps input_dir/*input_ext
+    to output_dir/*output_ext. For every output it records the hash of its input, the
+    hashes of the prompt templates that produced it and the stage's version string.
+    An output is stale when any of those changed, so touching a file or editing an
+    unrelated prompt no longer triggers a rebuild. Outputs whose input was deleted
+    are reported and removed as orphans. Inputs that produce no output are recorded
+    as skipped, so they are only tried again once their content or the version changes.
+    """
+
+    def __init__(self, input_dir: Path, output_dir: Path, input_ext: str, output_ext: str,
+                 prompt_paths: Iterable[str] = (), version: str = "1"):
+        self.input_dir = Path(input_dir)
+        self.output_dir = Path(output_dir)
+        self.input_ext = input_ext
+        self.output_ext = output_ext
+        self.version = version
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+        self.prompt_hashes = {str(p): sha256_file(Path(p)) for p in prompt_paths}
+
+        manifest = {}
+        if self.manifest_path.exists():
+            try:
+                manifest = json.loads(self.manifest_path.read_text("utf-8"))
+            except json.JSONDecodeError:
+                logger.warning(f"Build manifest '{self.manifest_path}' is corrupt. Rebuilding every output.")
+        self.outputs: Dict[str, dict] = manifest.get("outputs", {})
+        # [size, mtime_ns, sha256] per input, so unchanged files aren't re-hashed on every run
+        self.input_stats: Dict[str, list] = manifest.get("input_stats", {})
+        self._unsaved_records = 0
+
+    def _relative(self, path: Path, root: Path) -> str:
+        return str(path.relative_to(root)).replace("\\", "/")
+
+    def output_for(self, relative_input: str) -> str:
+        return str(Path(relative_input).with_suffix(self.output_ext)).replace("\\", "/")
+
+    def input_hash(self, relative_input: str) -> str:
+        stat = (self.input_dir / relative_input).stat()
+        cached = self.input_stats.get(relative_input)
+        if cached and cached[0] == stat.st_size and cached[1] == stat.st_mtime_ns:
+            return cached[2]
+        content_hash = sha256_file(self.input_dir / relative_input)
+        self.input_stats[relative_input] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        return content_hash
+
+    def is_stale(self, relative_input: str) -> bool:
+        relative_output = self.output_for(relative_input)
+        record = self.outputs.get(relative_output)
+        if record is None or not (record.get("skipped") or (self.output_dir / relative_output).exists()):
+            return True
+        if record.get("version") != self.version or record.get("input") != self.input_hash(relative_input):
+            return True
+        return any(self.prompt_hashes.get(path) != digest for path, digest in record.get("prompts", {}).items())
+
+    def inputs(self) -> List[str]:
+        """Relative paths of every input file."""
+        return sorted(self._relative(p, self.input_dir) for p in self.input_dir.glob(f"**/*{self.input_ext}"))
+
+    def stale_inputs(self) -> List[str]:
+        """Relative paths of every input whose output must be (re)built."""
+        return [relative_input for relative_input in self.inputs() if self.is_stale(relative_input)]
+
+    def remove_orphans(self) -> List[str]:
+        """Deletes outputs whose input no longer exists and forgets them. Returns the removed outputs."""
+        removed = []
+        on_disk = {self._relative(p, self.output_dir) for p in self.output_dir.glob(f"**/*{self.output_ext}")}
+        for relative_output in sorted(on_disk | set(self.outputs)):
+            relative_input = str(Path(relative_output).with_suffix(self.input_ext)).replace("\\", "/")
+            if (self.input_dir / relative_input).exists():
+                continue
+            output_path = self.output_dir / relative_output
+            if output_path.exists():
+                output_path.unlink()
+                removed.append(relative_output)
+            self.outputs.pop(relative_output, None)
+            self.input_stats.pop(relative_input, None)
+        if removed:
+            logger.info(f"Removed {len(removed)} orphaned outputs from '{self.output_dir}'.")
+        return removed
+
+    def record(self, relative_input: str, prompts_used: Optional[Iterable[str]] = None):
+        """Marks an output as freshly built from the current input, prompts and version."""
+        used = self.prompt_hashes.keys() if prompts_used is None else [str(p) for p in prompts_used]
+        self.outputs[self.output_for(relative_input)] = {
+            "input": self.input_hash(relative_input),
+            "prompts": {path: self.prompt_hashes[path] for path in used},
+            "version": self.version,
+        }
+        self._unsaved_records += 1
+        if self._unsaved_records >= SAVE_INTERVAL:
+            self.save()
+
+    def record_skipped(self, relative_input: str):
+        """
+        Marks an input that produces no output, such as a page without content, as done
+        for its current content and version. A previous output of it is deleted.
+        """
+        relative_output = self.output_for(relative_input)
+        (self.output_dir / relative_output).unlink(missing_ok=True)
+        self.outputs[relative_output] = {"input": self.input_hash(relative_input), "skipped": True, "version": self.version}
+        self._unsaved_records += 1
+        if self._unsaved_records >= SAVE_INTERVAL:
+            self.save()
+
+    def invalidate(self, relative_input: str):
+        """Forgets an output, so it is rebuilt on the next run even if its input doesn't change."""
+        if self.outputs.pop(self.output_for(relative_input), None) is not None:
+            self._unsaved_records += 1
+
+    def save(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        manifest = {"outputs": self.outputs, "input_stats": self.input_stats}
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(manifest, sort_keys=True, separators=(",", ":")), "utf-8")
+        tmp_path.replace(self.manifest_path)
+        self._unsaved_records = 0
@@ -0,0 +1,178 @@
+# src/changelog_index.py
+import bisect
+import json
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+ENTRIES_FILE = "entries.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+
+_VERSION_NUMBER = r"(\d{1,2})(?:\.(\d{1,2}))?"
+_RANGE_PATTERNS = [
+    (re.compile(rf"\bbetween\s+(?:v(?:ersion)?\s*)?{_VERSION_NUMBER}\s+and\s+(?:v(?:ersion)?\s*)?{_VERSION_NUMBER}\b", re.I), "between"),
+    (re.compile(rf"\b(?:since|after|from)\s+(?:v(?:ersion)?\s*)?{_VERSION_NUMBER}\b", re.I), "since"),
+    (re.compile(rf"\b(?:before|prior to)\s+(?:v(?:ersion)?\s*)?{_VERSION_NUMBER}\b", re.I), "before"),
+    (re.compile(rf"\b(?:until|up to)\s+(?:v(?:ersion)?\s*)?{_VERSION_NUMBER}\b", re.I), "until"),
+]
+_EXPLICIT_VERSION = re.compile(r"\b(?:v|version|patch|update)\s*(\d{1,2})(?:\.(\d{1,2}))?\b", re.I)
+_DECIMAL_VERSION = re.compile(r"\b(\d{1,2})\.(\d{1,2})\b")
+_ENTRY_VERSION = re.compile(r"(\d{1,2})\.(\d{1,2})")
+# Bare decimals like "3.5" are usually stats, so they only scope a question that is about changes
+_CHANGELOG_INTENT = re.compile(r"\b(chang\w*|patch\w*|updat\w*|release\w*|fix\w*|added|removed|improved|new in|introduced)\b", re.I)
+
+# Question words that select a changelog category. "changed" is left out because
+# "what changed in 7.0" asks about every category.
+CATEGORY_KEYWORDS = {
+    "fixed": "fixed", "fix": "fixed", "fixes": "fixed", "bug": "fixed", "bugs": "fixed",
+    "added": "added", "removed": "removed", "improved": "improved", "improvements": "improved",
+    "new feature": "new feature", "new features": "new feature",
+}
+
+
+def version_key(major: str, minor: Optional[str]) -> float:
+    """7.1 and 7.10 name the same X4 release, so versions compare as decimals."""
+    return float(f"{int(major)}.{minor or 0}")
+
+
+def entry_version_key(version_info: str) -> Optional[float]:
+    match = _ENTRY_VERSION.search(version_info)
+    return version_key(*match.groups()) if match else None
+
+
+@dataclass
+class ChangelogFilter:
+    min_version: float = float("-inf")
+    max_version: float = float("inf")  # Exclusive
+    categories: Optional[Set[str]] = None
+
+
+def parse_changelog_query(question: str) -> Optional[ChangelogFilter]:
+    """
+    Detects a version scope ("in 7.0", "version 6", "since 6.50", "between 5.0 and 6.0")
+    and optional category words in a question. Returns None for questions without one.
+    """
+    if not _EXPLICIT_VERSION.search(question) and not _CHANGELOG_INTENT.search(question):
+        return None
+    scope = None
+    for pattern, kind in _RANGE_PATTERNS:
+        match = pattern.search(question)
+        if not match:
+            continue
+        groups = match.groups()
+        low = version_key(groups[0], groups[1])
+        if kind == "between":
+            high = version_key(groups[2], groups[3])
+            scope = ChangelogFilter(min(low, high), max(low, high) + 0.001)
+        elif kind == "since":
+            scope = ChangelogFilter(min_version=low)
+        elif kind == "before":
+            scope = ChangelogFilter(max_version=low)
+        else:
+            scope = ChangelogFilter(max_version=low + 0.001)
+        break
+
+    if scope is None:
+        match = _EXPLICIT_VERSION.search(question) or _DECIMAL_VERSION.search(question)
+        if not match:
+            return None
+        major, minor = match.groups()
+        if minor is None:
+            # "version 7" covers every 7.x release
+            scope = ChangelogFilter(float(int(major)), float(int(major) + 1))
+        else:
+            low = version_key(major, minor)
+            scope = ChangelogFilter(low, low + 0.001)
+
+    lowered = question.lower()
+    categories = {category for word, category in CATEGORY_KEYWORDS.items() if re.search(rf"\b{word}\b", lowered)}
+    scope.categories = categories or None
+    return scope
+
+
+class ChangelogIndex:
+    """
+    Changelog entries from 01d with a secondary index on version and category.
+    Entries are kept sorted by version so a version range is one bisect, and each
+    category maps to its sorted entry positions. Only the entries that pass the filter
+    are ranked against the query embedding.
+    """
+
+    def __init__(self, entries: List[Dict], embeddings: np.ndarray):
+        order = sorted(range(len(entries)), key=lambda i: entries[i]["version_key"])
+        self.entries = [entries[i] for i in order]
+        self.embeddings = embeddings[order] if len(order) else embeddings
+        self.version_keys = [entry["version_key"] for entry in self.entries]
+        positions: Dict[str, List[int]] = {}
+        for position, entry in enumerate(self.entries):
+            positions.setdefault(entry.get("category", "general").lower(), []).append(position)
+        self.category_positions = {category: np.array(p, dtype=np.int64) for category, p in positions.items()}
+
+    @classmethod
+    def load(cls, path: str) -> "ChangelogIndex":
+        directory = Path(path)
+        entries = json.loads((directory / ENTRIES_FILE).read_text("utf-8"))
+        logger.info(f"Loaded {len(entries)} changelog entries from '{path}'.")
+        return cls(entries, np.load(directory / EMBEDDINGS_FILE))
+
+    def filter_positions(self, scope: ChangelogFilter) -> np.ndarray:
+        start = bisect.bisect_left(self.version_keys, scope.min_version)
+        end = bisect.bisect_left(self.version_keys, scope.max_version)
+        positions = np.arange(start, end, dtype=np.int64)
+        if scope.categories:
+            allowed = [self.category_positions[c] for c in scope.categories if c in self.category_positions]
+            category_positions = np.unique(np.concatenate(allowed)) if allowed else np.empty(0, dtype=np.int64)
+            positions = np.intersect1d(positions, category_positions, assume_unique=True)
+        return positions
+
+    def search(self, query_embedding: List[float], scope: ChangelogFilter, k: int) -> List[Document]:
+        positions = self.filter_positions(scope)
+        if not len(positions):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = self.embeddings[positions] @ query
+        top = positions[np.argsort(-scores)[:k]]
+        return [self.to_document(self.entries[position]) for position in top]
+
+    @staticmethod
+    def to_document(entry: Dict) -> Document:
+        return Document(
+            page_content=f"Version {entry['version_info']} ({entry.get('category', 'General')}): {entry['content']}",
+            metadata={
+                "source": entry["source"],
+                "title": entry["title"],
+                "chunk_index": entry["chunk_index"],
+                "version_info": entry["version_info"],
+                "category": entry.get("category", "General"),
+            },
+        )
+
+
+def build_changelog_index(chunks: List[Dict], embeddings, path: str) -> Tuple[int, int]:
+    """
+    Embeds the changelog chunks written by 01d and saves them with their parsed version
+    keys. Entries whose version can't be parsed are skipped. Returns (indexed, skipped).
+    """
+    entries = []
+    for chunk in chunks:
+        key = entry_version_key(chunk.get("version_info", ""))
+        if key is not None:
+            entries.append({**chunk, "version_key": key})
+    texts = [ChangelogIndex.to_document(entry).page_content for entry in entries]
+    vectors = np.asarray(embeddings.embed_documents(texts), dtype=np.float32) if texts else np.empty((0, 0), dtype=np.float32)
+    if len(vectors):
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True).clip(min=1e-12)
+
+    directory = Path(path)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / ENTRIES_FILE).write_text(json.dumps(entries, ensure_ascii=False, separators=(",", ":")), "utf-8")
+    np.save(directory / EMBEDDINGS_FILE, vectors)
+    return len(entries), len(chunks) - len(entries)
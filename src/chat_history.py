@@ -0,0 +1,135 @@
+# src/chat_history.py
+import hashlib
+import logging
+import tiktoken
+from collections import OrderedDict
+from typing import List
+from openai import APIError
+from langchain_core.messages import AIMessage, BaseMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+
+import config
+from file_utils import load_text_file
+
+logger = logging.getLogger(__name__)
+TOKENIZER = tiktoken.get_encoding("cl100k_base")
+
+
+class ChatHistoryManager:
+    """
+    Fits prior conversation turns into a token budget for the actor and condenses
+    follow-up questions into standalone queries for retrieval.
+    Recent messages are kept verbatim; older ones are folded into a rolling summary
+    that is cached per conversation prefix, so each turn only summarizes what is new.
+    """
+
+    def __init__(self, model):
+        summarizer_template = load_text_file(config.HISTORY_SUMMARIZER_PROMPT_PATH, "History summarizer prompt")
+        condenser_template = load_text_file(config.QUERY_CONDENSER_PROMPT_PATH, "Query condenser prompt")
+        self.summarizer_chain = ChatPromptTemplate.from_template(summarizer_template) | model
+        self.condenser_chain = ChatPromptTemplate.from_template(condenser_template) | model
+        self._summary_cache: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def _format_messages(messages: List[BaseMessage]) -> str:
+        lines = []
+        for msg in messages:
+            role = "Assistant" if isinstance(msg, AIMessage) else "User"
+            lines.append(f"{role}: {msg.content}")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _prefix_fingerprints(messages: List[BaseMessage]) -> List[str]:
+        """Chained hashes: entry i identifies the conversation prefix messages[:i + 1]."""
+        fingerprints = []
+        previous = ""
+        for msg in messages:
+            previous = hashlib.sha256(f"{previous}|{msg.type}|{msg.content}".encode("utf-8")).hexdigest()
+            fingerprints.append(previous)
+        return fingerprints
+
+    @staticmethod
+    def _truncate_to_tokens(text: str, max_tokens: int, keep_tail: bool = False) -> str:
+        tokens = TOKENIZER.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return TOKENIZER.decode(tokens[-max_tokens:] if keep_tail else tokens[:max_tokens])
+
+    async def _rolling_summary(self, messages: List[BaseMessage]) -> str:
+        fingerprints = self._prefix_fingerprints(messages)
+        if fingerprints[-1] in self._summary_cache:
+            self._summary_cache.move_to_end(fingerprints[-1])
+            return self._summary_cache[fingerprints[-1]]
+
+        # Resume from the longest prefix we've already summarized for this conversation.
+        start, previous_summary = 0, ""
+        for prefix_length in range(len(messages) - 1, 0, -1):
+            cached = self._summary_cache.get(fingerprints[prefix_length - 1])
+            if cached is not None:
+                start, previous_summary = prefix_length, cached
+                break
+
+        new_messages = self._truncate_to_tokens(
+            self._format_messages(messages[start:]), config.MAX_CONTEXT_TOKENS // 2, keep_tail=True
+        )
+        logger.info(f"--- Summarizing {len(messages) - start} older chat messages into the rolling history summary. ---")
+        try:
+            response = await self.summarizer_chain.ainvoke({
+                "summary": previous_summary or "(none)",
+                "conversation": new_messages,
+            })
+        except APIError as e:
+            logger.error(f"API Error during history summarization: {e}")
+            return previous_summary
+
+        summary = self._truncate_to_tokens(response.content.strip(), config.HISTORY_SUMMARY_MAX_TOKENS)
+        self._summary_cache[fingerprints[-1]] = summary
+        while len(self._summary_cache) > config.HISTORY_SUMMARY_CACHE_SIZE:
+            self._summary_cache.popitem(last=False)
+        return summary
+
+    async def compress(self, chat_history: List[BaseMessage]) -> List[BaseMessage]:
+        """Returns the history to hand to the actor, bounded by HISTORY_TOKEN_BUDGET."""
+        # Client supplied system messages are dropped; the actor's persona comes from our own system prompt.
+        messages = [msg for msg in chat_history if not isinstance(msg, SystemMessage)]
+        if not messages:
+            return []
+
+        verbatim_budget = config.HISTORY_TOKEN_BUDGET - config.HISTORY_SUMMARY_MAX_TOKENS
+        recent: List[BaseMessage] = []
+        used_tokens = 0
+        for msg in reversed(messages):
+            msg_tokens = len(TOKENIZER.encode(msg.content))
+            if len(recent) >= config.HISTORY_VERBATIM_MESSAGES or used_tokens + msg_tokens > verbatim_budget:
+                break
+            recent.insert(0, msg)
+            used_tokens += msg_tokens
+
+        older = messages[:len(messages) - len(recent)]
+        if not older:
+            return recent
+
+        summary = await self._rolling_summary(older)
+        if not summary:
+            return recent
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + recent
+
+    async def condense_question(self, question: str, chat_history: List[BaseMessage]) -> str:
+        """Rewrites a follow-up question into a standalone one using the (compressed) history."""
+        if not chat_history:
+            return question
+
+        history_text = "\n".join(
+            msg.content if isinstance(msg, SystemMessage) else self._format_messages([msg]) for msg in chat_history
+        )
+        try:
+            response = await self.condenser_chain.ainvoke({"chat_history": history_text, "question": question})
+        except APIError as e:
+            logger.error(f"API Error during query condensing: {e}")
+            return question
+
+        standalone_question = response.content.strip()
+        if not standalone_question:
+            return question
+        logger.info(f"--- Condensed follow-up question: '{standalone_question}' ---")
+        return standalone_question
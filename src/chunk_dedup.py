@@ -0,0 +1,119 @@
+# src/chunk_dedup.py
+import logging
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+NUM_PERMUTATIONS = 128
+LSH_BANDS = 32             # 32 bands x 4 rows: pairs above ~0.42 Jaccard become candidates
+SHINGLE_SIZE = 3           # Words per shingle
+SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard at which two chunks are merged
+_MERSENNE_PRIME = (1 << 31) - 1
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+def shingles(text: str) -> np.ndarray:
+    """crc32 hashes of the lower-cased word n-grams of a text."""
+    words = _WORD_PATTERN.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode("utf-8")) for g in grams), dtype=np.uint64))
+
+
+class MinHasher:
+    """MinHash signatures from NUM_PERMUTATIONS universal hash functions, seeded for reproducible runs."""
+
+    def __init__(self, num_permutations: int = NUM_PERMUTATIONS, seed: int = 1):
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(1, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+        self.b = rng.integers(0, _MERSENNE_PRIME, num_permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text) % _MERSENNE_PRIME
+        # (a * x + b) stays below 2**63 because a, b and x are all below 2**31
+        permuted = (np.outer(hashes, self.a) + self.b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+
+def _find(parent: List[int], i: int) -> int:
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def find_duplicate_clusters(texts: List[str]) -> List[List[int]]:
+    """
+    Groups near-duplicate texts with MinHash and LSH banding. Only pairs that share a
+    band bucket are compared, and they are merged when their estimated Jaccard
+    similarity reaches SIMILARITY_THRESHOLD. Returns clusters of indices into 'texts'.
+    """
+    hasher = MinHasher()
+    signatures = np.stack([hasher.signature(text) for text in texts]) if texts else np.empty((0, NUM_PERMUTATIONS))
+    return cluster_signatures(signatures)
+
+
+def cluster_signatures(signatures: np.ndarray) -> List[List[int]]:
+    """
+    Clusters MinHash signatures, one row per text. Within a band bucket, each member is
+    compared against one member of every cluster already found in that bucket, so two
+    near-duplicates are merged even when the bucket's first member is unlike both.
+    """
+    rows = NUM_PERMUTATIONS // LSH_BANDS
+    parent = list(range(len(signatures)))
+
+    for band in range(LSH_BANDS):
+        buckets: Dict[bytes, List[int]] = defaultdict(list)
+        band_values = signatures[:, band * rows:(band + 1) * rows]
+        for i, values in enumerate(band_values):
+            buckets[values.tobytes()].append(i)
+        for members in buckets.values():
+            representatives: List[int] = []  # One member of each cluster found in this bucket so far
+            for member in members:
+                similar = []
+                if representatives:
+                    agreement = np.mean(signatures[representatives] == signatures[member], axis=1)
+                    similar = [rep for rep, score in zip(representatives, agreement) if score >= SIMILARITY_THRESHOLD]
+                if not similar:
+                    representatives.append(member)
+                for rep in similar:
+                    root_a, root_b = _find(parent, rep), _find(parent, member)
+                    if root_a != root_b:
+                        parent[root_b] = root_a
+
+    clusters: Dict[int, List[int]] = defaultdict(list)
+    for i in range(len(signatures)):
+        clusters[_find(parent, i)].append(i)
+    return list(clusters.values())
+
+
+def deduplicate_chunks(chunks: List[Dict]) -> List[Dict]:
+    """
+    Collapses near-duplicate chunks into one representative, the longest chunk of each
+    cluster. The representative keeps the IDs and sources of every chunk it replaced
+    in 'duplicate_ids' and 'sources', so no provenance is lost.
+    """
+    clusters = find_duplicate_clusters([chunk["content"] for chunk in chunks])
+    deduplicated = []
+    for cluster in clusters:
+        members = sorted((chunks[i] for i in cluster), key=lambda c: (-len(c["content"]), c["id"]))
+        representative = dict(members[0])
+        representative["sources"] = sorted({member["source"] for member in members})
+        representative["duplicate_ids"] = sorted(member["id"] for member in members[1:])
+        deduplicated.append(representative)
+    deduplicated.sort(key=lambda c: c["id"])
+
+    removed = len(chunks) - len(deduplicated)
+    if chunks:
+        logger.info(
+            f"Near-duplicate removal: {len(chunks)} -> {len(deduplicated)} chunks "
+            f"({removed} removed, {removed / len(chunks):.1%} reduction)."
+        )
+    return deduplicated
@@ -1,12 +1,70 @@
 MAX_CONTEXT_TOKENS = 15750
 VECTOR_STORE_PATH = "faiss_index"
+SECTIONS_PATH = "x4_wiki_sections.jsonl"  # Parent sections of the embedded chunks (see 02_chunk_corpus.py)
+PARENT_SECTION_MAX_CHARS = 4000  # Longer sections are not expanded; their matching chunk is returned instead
+PAGE_INDEX_PATH = "page_index"  # One executive-summary vector per page (see 03_build_vector_store.py)
+PAGE_SEARCH_K = 8  # Chunks are only searched within this many best-matching pages; 0 searches every chunk
+CHANGELOG_INDEX_PATH = "changelog_index"
+CHANGELOG_SEARCH_K = 10
+# Cascade reranking (see reranker.py): candidates more than RERANK_DENSE_MARGIN below the best cosine
+# similarity skip the cross-encoder, and reranked documents under RERANK_RELATIVE_THRESHOLD x the best score are cut.
+RERANK_DENSE_MARGIN = 0.15
+RERANK_MIN_CANDIDATES = 3
+RERANK_RELATIVE_THRESHOLD = 0.25
+RERANK_MIN_DOCUMENTS = 2
+# Cross-encoder score cache (see rerank_cache.py). 0 disables it. The approximate tier reuses scores from
+# earlier paraphrases whose query embedding falls in the same bucket and is at least this similar.
+RERANK_CACHE_MAX_ENTRIES = 50000
+RERANK_CACHE_APPROXIMATE = False
+RERANK_CACHE_BUCKET_BITS = 16
+RERANK_CACHE_APPROX_MIN_SIMILARITY = 0.95
 SYSTEM_PROMPT_PATH = "prompts/system_prompt.txt"
 KEYWORDS_PATH = "x4_keywords_refined.json"
+KEYWORD_LEXICON_PATH = "x4_keywords_lexicon.pkl"
+STATS_STORE_PATH = "x4_stats.sqlite3"  # Unrolled table rows with parsed numbers (see stats_store.py)
+STATS_RESULT_LIMIT = 5  # Rows handed to the actor for a superlative or filter question
 RESEARCHER_PROMPT_PATH = "prompts/researcher_prompt.txt"
+HISTORY_SUMMARIZER_PROMPT_PATH = "prompts/history_summarizer_prompt.txt"
+QUERY_CONDENSER_PROMPT_PATH = "prompts/query_condenser_prompt.txt"
 BASE_URL = "http://localhost:1234/v1"
 API_KEY = "not-needed"
 RERANKER_MODEL_NAME = "BAAI/bge-reranker-base"
 SENTENCE_TRANSFORMER_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 SUMMARY_MODEL_NAME = "meta-llama-3b-8b-instruct"
 RESEARCHER_MODEL_NAME = "llama-3.2-3b-instruct"
-ACTOR_MODEL_NAME = "meta-llama-3b-8b-instruct"
\ No newline at end of file
+ACTOR_MODEL_NAME = "meta-llama-3b-8b-instruct"
+# Rewrite the query and prefetch its documents while the first research pass runs.
+# Costs one extra rewriter call per request; only worth it if the backend serves requests in parallel.
+SPECULATIVE_REWRITE = False
+# Stream the researcher's output and abort as soon as NO_CLEAR_ANSWER shows up in its opening characters.
+RESEARCHER_EARLY_EXIT = True
+RESEARCHER_SENTINEL_WINDOW_CHARS = 64
+# "llm" synthesizes the context with the researcher model; "extractive" keeps the sentences most similar
+# to the question (see ExtractiveResearcher in researcher.py), with no LLM call.
+RESEARCHER_MODE = "llm"
+EXTRACTIVE_CONTEXT_TOKENS = 1500
+EXTRACTIVE_MIN_SIMILARITY = 0.25
+EXTRACTIVE_MIN_SENTENCE_CHARS = 20
+# Chat history handed to the actor: recent messages verbatim, older ones as a rolling summary.
+HISTORY_TOKEN_BUDGET = 2000
+HISTORY_SUMMARY_MAX_TOKENS = 400
+HISTORY_VERBATIM_MESSAGES = 6
+HISTORY_SUMMARY_CACHE_SIZE = 256
+# --- Shared LLM HTTP client (see llm_client.py) ---
+LLM_TIMEOUT_SECONDS = 300.0
+LLM_CONNECT_TIMEOUT_SECONDS = 10.0
+LLM_MAX_CONNECTIONS = 32
+LLM_MAX_KEEPALIVE_CONNECTIONS = 16
+LLM_KEEPALIVE_EXPIRY_SECONDS = 60.0
+LLM_HTTP2 = False  # Requires the 'h2' package and a TLS endpoint
+LLM_MAX_RETRIES = 3
+LLM_RETRY_BASE_DELAY_SECONDS = 0.5
+LLM_RETRY_MAX_DELAY_SECONDS = 8.0
+LLM_CACHE_PATH = ".llm_cache.sqlite3"  # Offline pipeline response cache (see llm_cache.py)
+LLM_CACHE_MAX_BYTES = 512 * 1024 * 1024
+LLM_STREAM_USAGE = True  # Ask the backend for usage on streamed responses (stream_options.include_usage)
+# --- Embedder / reranker inference backend (see inference_backend.py) ---
+INFERENCE_BACKEND = "torch"  # "torch", or "onnx" after running export_onnx_models.py
+ONNX_MODELS_DIR = "onnx_models"
+ONNX_QUANTIZATION = "avx2"  # Dynamic int8 config: "avx2", "avx512", "avx512_vnni", "arm64", or "" for fp32 ONNX
+ONNX_INTRA_OP_THREADS = 4
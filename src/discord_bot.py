@@ -1,13 +1,12 @@
 import os
-import ssl
 import discord
-import httpx
-from openai import OpenAI, APIError
+from openai import APIError
 import asyncio
 import logging
 import tiktoken
 import config as CONFIG
 from logging_config import configure_logging
+from llm_client import get_async_openai_client, aclose_clients
 
 configure_logging()
 
@@ -23,11 +22,7 @@ PRIVATE_CA_CERT_PATH = "rootCA.pem"
 if not os.path.exists(PRIVATE_CA_CERT_PATH):
     raise FileNotFoundError(f"The CA was not found at: {PRIVATE_CA_CERT_PATH}")
 
-ssl_ctx = ssl.create_default_context(cafile=PRIVATE_CA_CERT_PATH)
-custom_httpx_client = httpx.Client(verify=ssl_ctx)
-
-
-LLM_CLIENT = OpenAI(base_url=OPENAPI_ENDPOINT, api_key="", http_client=custom_httpx_client)
+LLM_CLIENT = get_async_openai_client(base_url=OPENAPI_ENDPOINT, api_key="", ca_cert_path=PRIVATE_CA_CERT_PATH)
 
 
 
@@ -43,6 +38,7 @@ class MyClient(discord.Client):
     async def close(self):
         if self.session:
             await self.session.close()
+        await aclose_clients()
         await super().close()
 
     async def on_message(self, message: discord.Message):
@@ -53,7 +49,7 @@ class MyClient(discord.Client):
             logger.debug(f'Received Betty command from {message.author}')
             try:
                 # Stripping the first 7 to not pass in !betty
-                response = call_llm(prompt=message.content[7:], context_for_logging="")
+                response = await call_llm(prompt=message.content[7:], context_for_logging="")
                 if response:
                     await message.channel.send(f"{response}")
                 else:
@@ -62,7 +58,7 @@ class MyClient(discord.Client):
                 logger.error(f"Error calling OpenAPI: {e}")
                 await message.channel.send("Error calling OpenAPI service.")
 
-def call_llm(prompt: str, context_for_logging: str) -> str:
+async def call_llm(prompt: str, context_for_logging: str) -> str:
     """Generic LLM call function with error handling."""
     try:
         prompt_tokens = len(TOKENIZER.encode(prompt))
@@ -70,7 +66,7 @@ def call_llm(prompt: str, context_for_logging: str) -> str:
             logger.warning(f"Prompt for context '{context_for_logging}' is too large ({prompt_tokens} tokens).")
             return ""
         
-        response = LLM_CLIENT.chat.completions.create(
+        response = await LLM_CLIENT.chat.completions.create(
             model=CONFIG.SUMMARY_MODEL_NAME,
             messages=[{"role": "user", "content": prompt}],
             temperature=0.2,
@@ -0,0 +1,32 @@
+# export_onnx_models.py
+
+import logging
+from sentence_transformers import CrossEncoder, SentenceTransformer, export_dynamic_quantized_onnx_model
+from inference_backend import onnx_file_name, onnx_model_dir
+from logging_config import configure_logging
+import config
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+def export_model(model_class, model_name: str):
+    """Exports a model to ONNX and, if configured, writes a dynamically int8-quantized copy next to it."""
+    model_dir = onnx_model_dir(model_name)
+    logger.info(f"Exporting '{model_name}' to ONNX at '{model_dir}'...")
+    model = model_class(model_name, backend="onnx")  # Converted to ONNX on load
+    model.save_pretrained(str(model_dir))
+    if config.ONNX_QUANTIZATION:
+        logger.info(f"Quantizing '{model_name}' with the '{config.ONNX_QUANTIZATION}' int8 configuration...")
+        export_dynamic_quantized_onnx_model(model, config.ONNX_QUANTIZATION, str(model_dir))
+    logger.info(f"Saved '{model_dir / onnx_file_name()}'.")
+
+
+def main():
+    export_model(SentenceTransformer, config.SENTENCE_TRANSFORMER_MODEL_NAME)
+    export_model(CrossEncoder, config.RERANKER_MODEL_NAME)
+    logger.info("Set INFERENCE_BACKEND = \"onnx\" in config.py to serve the exported models.")
+
+
+if __name__ == "__main__":
+    main()
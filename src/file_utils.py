@@ -12,3 +12,10 @@ def load_json_file(file_path: str, description: str) -> dict:
     if not path.exists():
         raise FileNotFoundError(f"{description} file not found at '{file_path}'")
     return json.loads(path.read_text("utf-8"))
+
+def iter_jsonl_file(file_path: str):
+    """Yields one record per line of a line-delimited JSON file."""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
@@ -0,0 +1,71 @@
+# src/inference_backend.py
+import logging
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+import config
+
+logger = logging.getLogger(__name__)
+
+TORCH_BACKEND = "torch"
+ONNX_BACKEND = "onnx"
+
+
+def onnx_model_dir(model_name: str) -> Path:
+    return Path(config.ONNX_MODELS_DIR) / model_name.replace("/", "__")
+
+
+def onnx_file_name() -> str:
+    """Path of the ONNX graph inside an exported model directory, as sentence-transformers names it."""
+    if config.ONNX_QUANTIZATION:
+        return f"onnx/model_qint8_{config.ONNX_QUANTIZATION}.onnx"
+    return "onnx/model.onnx"
+
+
+def _session_options():
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    # One request's batch is small, so all threads go to parallelism inside each operator.
+    options.intra_op_num_threads = config.ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = 1
+    return options
+
+
+def resolve_model(model_name: str, backend: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Returns the model path and sentence-transformers kwargs for the selected backend.
+    The ONNX backend needs the model exported by export_onnx_models.py first and falls
+    back to PyTorch with a warning when it is missing.
+    """
+    backend = backend or config.INFERENCE_BACKEND
+    if backend == TORCH_BACKEND:
+        return model_name, {}
+    if backend != ONNX_BACKEND:
+        raise ValueError(f"Unknown inference backend '{backend}'. Use '{TORCH_BACKEND}' or '{ONNX_BACKEND}'.")
+
+    model_dir = onnx_model_dir(model_name)
+    if not (model_dir / onnx_file_name()).exists():
+        logger.warning(f"No ONNX export of '{model_name}' at '{model_dir / onnx_file_name()}'. Using the PyTorch backend.")
+        return model_name, {}
+    return str(model_dir), {
+        "backend": ONNX_BACKEND,
+        "model_kwargs": {
+            "file_name": onnx_file_name(),
+            "provider": "CPUExecutionProvider",
+            "session_options": _session_options(),
+        },
+    }
+
+
+def create_embeddings(backend: Optional[str] = None, **encode_kwargs) -> HuggingFaceEmbeddings:
+    model_name, model_kwargs = resolve_model(config.SENTENCE_TRANSFORMER_MODEL_NAME, backend)
+    return HuggingFaceEmbeddings(model_name=model_name, model_kwargs=model_kwargs, encode_kwargs=encode_kwargs)
+
+
+def create_cross_encoder(backend: Optional[str] = None) -> HuggingFaceCrossEncoder:
+    model_name, model_kwargs = resolve_model(config.RERANKER_MODEL_NAME, backend)
+    return HuggingFaceCrossEncoder(model_name=model_name, model_kwargs=model_kwargs)
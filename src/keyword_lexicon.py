@@ -0,0 +1,186 @@
+# src/keyword_lexicon.py
+import logging
+import pickle
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from rapidfuzz.distance import Levenshtein
+
+logger = logging.getLogger(__name__)
+
+LEXICON_FORMAT_VERSION = 1
+BLOCK_AFFIX_LENGTH = 4  # Keys sharing a 4-char prefix or suffix are compared, so one edit at either end still meets
+MIN_FUZZY_TOKEN_LENGTH = 4  # "Xenon K" and "Xenon I" are different ships, so short words must match exactly
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['\-][a-z0-9]+)*")
+
+
+def singularize(token: str) -> str:
+    if len(token) <= 3 or not token.isalpha():
+        return token
+    if token.endswith("ies"):
+        return token[:-3] + "y"
+    if token.endswith(("sses", "xes", "ches", "shes")):
+        return token[:-2]
+    if token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def fold_tokens(text: str) -> List[str]:
+    """Lower-cased, accent-folded word tokens of a keyword or query."""
+    folded = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    return _TOKEN_PATTERN.findall(folded)
+
+
+def normalize_tokens(text: str) -> List[str]:
+    """Lower-cased, accent-folded, singular word tokens of a keyword or query."""
+    return [singularize(token) for token in fold_tokens(text)]
+
+
+def token_sort_key(text: str) -> str:
+    """Key shared by case, plural, punctuation and word-order variants of a keyword."""
+    return " ".join(sorted(normalize_tokens(text)))
+
+
+def max_edits(key: str) -> int:
+    return 1 if len(key) <= 12 else 2
+
+
+def fuzzy_compatible(key: str, other: str) -> bool:
+    """Only allows edits inside long alphabetic words; digits and short words must match exactly."""
+    tokens, other_tokens = key.split(), other.split()
+    if len(tokens) != len(other_tokens):
+        return False
+    for token, other_token in zip(tokens, other_tokens):
+        if token == other_token:
+            continue
+        if not (token.isalpha() and other_token.isalpha()) or min(len(token), len(other_token)) < MIN_FUZZY_TOKEN_LENGTH:
+            return False
+    return True
+
+
+def cluster_keys(keys: List[str]) -> List[List[str]]:
+    """
+    Merges token-sort keys that are within a small edit distance ("argon prime" /
+    "argon prme"). Keys are only compared inside blocks of a shared prefix or suffix
+    and a compatible length, instead of all pairs.
+    """
+    parent = {key: key for key in keys}
+
+    def find(key: str) -> str:
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    blocks: Dict[str, List[str]] = defaultdict(list)
+    for key in keys:
+        if len(key) > BLOCK_AFFIX_LENGTH:
+            blocks["^" + key[:BLOCK_AFFIX_LENGTH]].append(key)
+            blocks["$" + key[-BLOCK_AFFIX_LENGTH:]].append(key)
+
+    for block in blocks.values():
+        block.sort(key=len)
+        for i, key in enumerate(block):
+            allowed = max_edits(key)
+            for other in block[i + 1:]:
+                if len(other) - len(key) > allowed:
+                    break
+                if find(key) == find(other) or not fuzzy_compatible(key, other):
+                    continue
+                if Levenshtein.distance(key, other, score_cutoff=allowed) <= allowed:
+                    parent[find(other)] = find(key)
+
+    clusters: Dict[str, List[str]] = defaultdict(list)
+    for key in keys:
+        clusters[find(key)].append(key)
+    return list(clusters.values())
+
+
+def choose_canonical(variants: Iterable[str]) -> str:
+    """
+    Ignoring case, prefers the most common word order among the variants, then a
+    singular form, then the shortest, so "Barons" never beats "baron". That form is
+    then spelled with its most common capitalization, a proper noun winning ties.
+    """
+    variants = list(variants)
+    word_orders = Counter(" ".join(normalize_tokens(v)) for v in variants)
+    spellings: Dict[str, Counter] = defaultdict(Counter)
+    for variant in variants:
+        spellings[variant.lower()][variant] += 1
+
+    def form_rank(form: str):
+        plural = fold_tokens(form) != normalize_tokens(form)
+        return (-word_orders[" ".join(normalize_tokens(form))], plural, len(form), form)
+
+    counts = spellings[min(spellings, key=form_rank)]
+    return min(counts, key=lambda v: (-counts[v], not any(c.isupper() for c in v), v))
+
+
+@dataclass
+class KeywordLexicon:
+    """
+    Canonical keywords with every normalized key that maps to them. Saved as a pickle
+    next to the refined JSON, so the RAG chain loads a ready lookup table at startup.
+    """
+
+    canonical: List[str]
+    key_to_id: Dict[str, int]
+    max_tokens: int
+    version: int = LEXICON_FORMAT_VERSION
+
+    @classmethod
+    def build(cls, keywords: Iterable[str]) -> "KeywordLexicon":
+        variants_by_key: Dict[str, List[str]] = defaultdict(list)
+        for keyword in keywords:
+            key = token_sort_key(keyword)
+            if key:
+                variants_by_key[key].append(keyword)
+
+        # A misspelled word rarely appears in other keywords, so among fuzzy-merged keys
+        # the spelling whose words are used most across the whole list wins.
+        token_counts = Counter(token for key in variants_by_key for token in key.split())
+        canonical, key_to_id = [], {}
+        for cluster in cluster_keys(sorted(variants_by_key)):
+            best_key = max(cluster, key=lambda k: (len(variants_by_key[k]), sum(token_counts[t] for t in k.split()), len(k), k))
+            canonical.append(choose_canonical(variants_by_key[best_key]))
+            for key in cluster:
+                key_to_id[key] = len(canonical) - 1
+        max_tokens = max((len(key.split()) for key in key_to_id), default=0)
+        return cls(canonical, key_to_id, max_tokens)
+
+    def clusters(self) -> Dict[str, List[str]]:
+        """Canonical keyword -> the normalized keys merged into it."""
+        merged: Dict[str, List[str]] = defaultdict(list)
+        for key, keyword_id in self.key_to_id.items():
+            merged[self.canonical[keyword_id]].append(key)
+        return {canonical: sorted(keys) for canonical, keys in merged.items()}
+
+    def find_entities(self, text: str) -> List[str]:
+        """Canonical keywords whose variants appear as a word n-gram of the text."""
+        tokens = normalize_tokens(text)
+        found = set()
+        for n in range(1, min(self.max_tokens, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                keyword_id = self.key_to_id.get(" ".join(sorted(tokens[i:i + n])))
+                if keyword_id is not None:
+                    found.add(self.canonical[keyword_id])
+        return sorted(found)
+
+    def save(self, path: str):
+        tmp_path = Path(path).with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: str) -> "KeywordLexicon":
+        with open(path, "rb") as f:
+            lexicon = pickle.load(f)
+        if not isinstance(lexicon, cls) or lexicon.version != LEXICON_FORMAT_VERSION:
+            raise ValueError(f"Keyword lexicon at '{path}' has an unsupported format. Re-run 05_refine_keywords.py.")
+        return lexicon
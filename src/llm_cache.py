@@ -0,0 +1,120 @@
+# src/llm_cache.py
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Optional
+
+import config
+
+logger = logging.getLogger(__name__)
+
+EVICTION_CHECK_INTERVAL = 100  # Writes between total-size checks
+EVICTION_TARGET_RATIO = 0.9    # Evict down to this fraction of the size limit
+
+
+class LLMResponseCache:
+    """
+    Content-addressed store of LLM responses, keyed by sha256(model, prompt, temperature).
+    Responses are zlib-compressed in a single SQLite file in WAL mode, so several
+    threads and pipeline processes can read and write it at the same time.
+    Least recently used entries are evicted once the stored size exceeds max_bytes.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._writes_lock = threading.Lock()
+        self._writes_since_check = 0
+        self.hits = 0
+        self.misses = 0
+        self._connect()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key BLOB PRIMARY KEY, response BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL"
+                ") WITHOUT ROWID"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float) -> bytes:
+        return hashlib.sha256(json.dumps([model, prompt, temperature]).encode("utf-8")).digest()
+
+    def get(self, model: str, prompt: str, temperature: float) -> Optional[str]:
+        key = self.make_key(model, prompt, temperature)
+        conn = self._connect()
+        row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return zlib.decompress(row[0]).decode("utf-8")
+
+    def set(self, model: str, prompt: str, temperature: float, response: str):
+        key = self.make_key(model, prompt, temperature)
+        blob = zlib.compress(response.encode("utf-8"))
+        self._connect().execute(
+            "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+            (key, blob, len(blob) + len(key), time.time()),
+        )
+        with self._writes_lock:
+            self._writes_since_check += 1
+            if self._writes_since_check < EVICTION_CHECK_INTERVAL:
+                return
+            self._writes_since_check = 0
+        self.evict()
+
+    def evict(self):
+        """Drops least recently used entries until the cache is back under its size limit."""
+        conn = self._connect()
+        total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_bytes <= self.max_bytes:
+            return
+        bytes_to_free = total_bytes - int(self.max_bytes * EVICTION_TARGET_RATIO)
+        freed, evicted = 0, 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+                if freed >= bytes_to_free:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                freed += size
+                evicted += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        logger.info(f"LLM cache over {self.max_bytes} bytes. Evicted {evicted} entries ({freed} bytes).")
+
+    def log_stats(self):
+        total = self.hits + self.misses
+        if total:
+            logger.info(f"LLM cache: {self.hits}/{total} hits ({self.hits / total:.0%}).")
+
+
+_CACHE: Optional[LLMResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """Returns the pipeline-wide response cache at config.LLM_CACHE_PATH."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = LLMResponseCache(config.LLM_CACHE_PATH, config.LLM_CACHE_MAX_BYTES)
+        return _CACHE
@@ -0,0 +1,205 @@
+# src/llm_client.py
+import asyncio
+import logging
+import random
+import ssl
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, OpenAI
+from langchain_openai import ChatOpenAI
+
+import config
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# Connection-level failures that are safe to replay. Read timeouts are deliberately
+# excluded: a generation that timed out is likely to time out again.
+RETRYABLE_EXCEPTIONS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.ReadError, httpx.RemoteProtocolError)
+
+_LOCK = threading.RLock()
+_HTTP_CLIENTS: Dict[Optional[str], httpx.Client] = {}
+_ASYNC_HTTP_CLIENTS: Dict[Optional[str], httpx.AsyncClient] = {}
+_OPENAI_CLIENTS: Dict[Tuple[str, str, Optional[str]], OpenAI] = {}
+_ASYNC_OPENAI_CLIENTS: Dict[Tuple[str, str, Optional[str]], AsyncOpenAI] = {}
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Full-jitter exponential backoff, honoring a server supplied Retry-After in seconds."""
+    if retry_after:
+        try:
+            return min(float(retry_after), config.LLM_RETRY_MAX_DELAY_SECONDS)
+        except ValueError:
+            pass
+    cap = min(config.LLM_RETRY_MAX_DELAY_SECONDS, config.LLM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+class RetryTransport(httpx.BaseTransport):
+    """Wraps a pooled transport and retries transient failures with jittered backoff."""
+
+    def __init__(self, transport: httpx.BaseTransport, max_retries: int):
+        self._transport = transport
+        self.max_retries = max_retries
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self._transport.handle_request(request)
+            except RETRYABLE_EXCEPTIONS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"LLM request to {request.url} failed ({e!r}). Retrying in {delay:.2f}s...")
+                time.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("retry-after"))
+            response.close()
+            logger.warning(f"LLM request to {request.url} returned {response.status_code}. Retrying in {delay:.2f}s...")
+            time.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    def close(self) -> None:
+        self._transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of RetryTransport."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, max_retries: int):
+        self._transport = transport
+        self.max_retries = max_retries
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._transport.handle_async_request(request)
+            except RETRYABLE_EXCEPTIONS as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"LLM request to {request.url} failed ({e!r}). Retrying in {delay:.2f}s...")
+                await asyncio.sleep(delay)
+                continue
+
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt >= self.max_retries:
+                return response
+            delay = backoff_delay(attempt, response.headers.get("retry-after"))
+            await response.aclose()
+            logger.warning(f"LLM request to {request.url} returned {response.status_code}. Retrying in {delay:.2f}s...")
+            await asyncio.sleep(delay)
+        raise RuntimeError("unreachable")
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+
+def _http2_enabled() -> bool:
+    if not config.LLM_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed. Falling back to HTTP/1.1.")
+        return False
+    return True
+
+
+def _transport_kwargs(ca_cert_path: Optional[str]) -> dict:
+    return {
+        "limits": httpx.Limits(
+            max_connections=config.LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        "http2": _http2_enabled(),
+        "verify": ssl.create_default_context(cafile=ca_cert_path) if ca_cert_path else True,
+    }
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(config.LLM_TIMEOUT_SECONDS, connect=config.LLM_CONNECT_TIMEOUT_SECONDS)
+
+
+def get_http_client(ca_cert_path: Optional[str] = None) -> httpx.Client:
+    """Returns the process-wide pooled sync HTTP client, creating it on first use."""
+    with _LOCK:
+        if ca_cert_path not in _HTTP_CLIENTS:
+            transport = httpx.HTTPTransport(**_transport_kwargs(ca_cert_path))
+            _HTTP_CLIENTS[ca_cert_path] = httpx.Client(
+                transport=RetryTransport(transport, config.LLM_MAX_RETRIES), timeout=_timeout()
+            )
+        return _HTTP_CLIENTS[ca_cert_path]
+
+
+def get_async_http_client(ca_cert_path: Optional[str] = None) -> httpx.AsyncClient:
+    """
+    Returns the process-wide pooled async HTTP client, creating it on first use.
+    Pooled connections belong to the event loop that opened them, so a process
+    should drive this client from a single long-lived loop.
+    """
+    with _LOCK:
+        if ca_cert_path not in _ASYNC_HTTP_CLIENTS:
+            transport = httpx.AsyncHTTPTransport(**_transport_kwargs(ca_cert_path))
+            _ASYNC_HTTP_CLIENTS[ca_cert_path] = httpx.AsyncClient(
+                transport=AsyncRetryTransport(transport, config.LLM_MAX_RETRIES), timeout=_timeout()
+            )
+        return _ASYNC_HTTP_CLIENTS[ca_cert_path]
+
+
+def get_openai_client(base_url: str = config.BASE_URL, api_key: str = config.API_KEY, ca_cert_path: Optional[str] = None) -> OpenAI:
+    """Returns a shared OpenAI client. Retries are handled by the transport, not the SDK."""
+    key = (base_url, api_key, ca_cert_path)
+    with _LOCK:
+        if key not in _OPENAI_CLIENTS:
+            _OPENAI_CLIENTS[key] = OpenAI(
+                base_url=base_url, api_key=api_key, http_client=get_http_client(ca_cert_path), max_retries=0
+            )
+        return _OPENAI_CLIENTS[key]
+
+
+def get_async_openai_client(base_url: str = config.BASE_URL, api_key: str = config.API_KEY, ca_cert_path: Optional[str] = None) -> AsyncOpenAI:
+    """Returns a shared AsyncOpenAI client. Retries are handled by the transport, not the SDK."""
+    key = (base_url, api_key, ca_cert_path)
+    with _LOCK:
+        if key not in _ASYNC_OPENAI_CLIENTS:
+            _ASYNC_OPENAI_CLIENTS[key] = AsyncOpenAI(
+                base_url=base_url, api_key=api_key, http_client=get_async_http_client(ca_cert_path), max_retries=0
+            )
+        return _ASYNC_OPENAI_CLIENTS[key]
+
+
+def create_chat_model(temperature: float, **kwargs) -> ChatOpenAI:
+    """Builds a LangChain chat model that shares the pooled HTTP clients."""
+    return ChatOpenAI(
+        base_url=config.BASE_URL,
+        api_key=config.API_KEY,
+        temperature=temperature,
+        http_client=get_http_client(),
+        http_async_client=get_async_http_client(),
+        max_retries=0,
+        stream_usage=config.LLM_STREAM_USAGE,
+        **kwargs,
+    )
+
+
+async def aclose_clients():
+    """Closes all pooled async connections. Call once on application shutdown."""
+    for client in list(_ASYNC_HTTP_CLIENTS.values()):
+        await client.aclose()
+    _ASYNC_HTTP_CLIENTS.clear()
+    _ASYNC_OPENAI_CLIENTS.clear()
+
+
+def close_clients():
+    """Closes all pooled sync connections."""
+    for client in list(_HTTP_CLIENTS.values()):
+        client.close()
+    _HTTP_CLIENTS.clear()
+    _OPENAI_CLIENTS.clear()
@@ -16,7 +16,15 @@ class TqdmLoggingHandler(logging.Handler):
         except Exception:
             self.handleError(record)
 
+_CONFIGURED = False
+
 def configure_logging():
+    # Scripts import each other's helpers, so only install the handlers once per process.
+    global _CONFIGURED
+    if _CONFIGURED:
+        return
+    _CONFIGURED = True
+
     logging.root.setLevel(logging.INFO)
     file_handler = logging.FileHandler("console.log")
     file_handler.setLevel(logging.INFO)
@@ -6,6 +6,7 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api_routes import router as api_router
 from  logging_config import configure_logging
+from llm_client import aclose_clients, close_clients
 
 configure_logging()
 logger = logging.getLogger(__name__)
@@ -28,6 +29,11 @@ app.add_middleware(
 
 app.include_router(api_router)
 
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await aclose_clients()
+    close_clients()
+
 if __name__ == "__main__":
     cert_file = "ssl-cert.pem"
     key_file = "ssl-cert-key.pem"
@@ -0,0 +1,38 @@
+# src/pipeline_stages.py
+# Directories, prompt templates and versions of the incremental page stages. This module
+# has no side effects, so 01c can list a stage's stale inputs without importing the stage
+# script, which opens the LLM cache and client and configures logging.
+from pathlib import Path
+from build_state import BuildState
+
+DATA_SOURCE_DIR = Path("x4-foundations-wiki")
+SANITIZED_DIR = Path(DATA_SOURCE_DIR, "hashed_pages")
+MD_PAGES_DIR = Path(DATA_SOURCE_DIR, "pages_md")
+SUMMARIZED_PAGES_DIR = Path(DATA_SOURCE_DIR, "pages_summarized")
+
+# 01a_html_to_md.py
+MARKDOWN_BUILD_VERSION = "1"  # Bump when the conversion output changes, to rebuild every page
+
+# 01b_summarize_md.py
+SUMMARIES_BUILD_VERSION = "1"  # Bump when the enrichment output changes, to rebuild every page
+SUMMARIZER_PROMPT_PATH = "prompts/document_summarizer_prompt.txt"
+TABLE_ROW_PROMPT_PATH = "prompts/table_row_summarizer_prompt.txt"
+TABLE_ROWS_BATCH_PROMPT_PATH = "prompts/table_rows_batch_summarizer_prompt.txt"
+
+
+def markdown_build_state() -> BuildState:
+    return BuildState(SANITIZED_DIR, MD_PAGES_DIR, ".html", ".md", version=MARKDOWN_BUILD_VERSION)
+
+
+def summaries_build_state() -> BuildState:
+    return BuildState(
+        MD_PAGES_DIR, SUMMARIZED_PAGES_DIR, ".md", ".md",
+        prompt_paths=[SUMMARIZER_PROMPT_PATH, TABLE_ROW_PROMPT_PATH, TABLE_ROWS_BATCH_PROMPT_PATH],
+        version=SUMMARIES_BUILD_VERSION,
+    )
+
+
+STAGES = {
+    "markdown": markdown_build_state,
+    "summaries": summaries_build_state,
+}
@@ -1,30 +1,39 @@
 # src/rag_chain.py
+import asyncio
 import logging
+from pathlib import Path
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.messages import BaseMessage
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
 from langchain.chains.combine_documents import create_stuff_documents_chain
-from typing import AsyncGenerator, List, Dict, Optional
+from typing import AsyncGenerator, List, Dict, Optional, Tuple
 from thefuzz import process, fuzz
 
 import config
-from researcher import Researcher
+from inference_backend import create_embeddings
+from researcher import EXTRACTIVE_RESEARCHER, LLM_RESEARCHER, NO_CLEAR_ANSWER, ExtractiveResearcher, Researcher
 from retriever import create_retriever
+from llm_client import create_chat_model
+from chat_history import ChatHistoryManager
+from usage import UsageCallbackHandler
 from file_utils import load_text_file, load_json_file
+from keyword_lexicon import KeywordLexicon
+from stats_store import StatsStore, format_stats_context, parse_stats_query
 
 logger = logging.getLogger(__name__)
 
 class X4RAGChain:
     def __init__(self):
         self._load_config()
-        self.retriever = create_retriever()
-        self.researcher = Researcher(self.researcher_prompt_template, self.researcher_template_str)
-        self.actor_model = ChatOpenAI(base_url=config.BASE_URL, api_key=config.API_KEY, temperature=0.7)
+        self.embeddings = create_embeddings(normalize_embeddings=True)
+        self.retriever = create_retriever(embeddings=self.embeddings)
+        self.researcher = self.create_researcher(config.RESEARCHER_MODE)
+        self.actor_model = create_chat_model(temperature=0.7, callbacks=[UsageCallbackHandler("actor")])
         # New model instance for the query rewriter to ensure it's a distinct logical step
-        self.query_rewriter_model = ChatOpenAI(base_url=config.BASE_URL, api_key=config.API_KEY, temperature=0.0)
+        self.query_rewriter_model = create_chat_model(temperature=0.0, callbacks=[UsageCallbackHandler("rewriter")])
         self.actor_chain = self._create_actor_chain()
         self.rewriter_chain = self.query_rewriter_prompt_template | self.query_rewriter_model
+        self.history_manager = ChatHistoryManager(create_chat_model(temperature=0.0, callbacks=[UsageCallbackHandler("history")]))
 
 
     def _load_config(self):
@@ -35,10 +44,30 @@ class X4RAGChain:
         self.researcher_prompt_template = ChatPromptTemplate.from_template(self.researcher_template_str)
         self.query_rewriter_prompt_template = ChatPromptTemplate.from_template(self.query_rewriter_template_str)
         
-        keywords_data = load_json_file(config.KEYWORDS_PATH, "Refined Keywords")
-        self.keywords = keywords_data.get("keywords", [])
+        # The compiled lexicon loads in milliseconds; the JSON list is the fallback for older builds.
+        self.keyword_lexicon: Optional[KeywordLexicon] = None
+        try:
+            self.keyword_lexicon = KeywordLexicon.load(config.KEYWORD_LEXICON_PATH)
+            self.keywords = self.keyword_lexicon.canonical
+        except (FileNotFoundError, ValueError) as e:
+            logger.warning(f"Keyword lexicon unavailable ({e}). Falling back to '{config.KEYWORDS_PATH}'.")
+            keywords_data = load_json_file(config.KEYWORDS_PATH, "Refined Keywords")
+            self.keywords = keywords_data.get("keywords", [])
         logger.info(f"Loaded {len(self.keywords)} refined keywords.")
 
+        self.stats_store: Optional[StatsStore] = None
+        if Path(config.STATS_STORE_PATH).exists():
+            self.stats_store = StatsStore(config.STATS_STORE_PATH)
+        else:
+            logger.warning(f"Stats store not found at '{config.STATS_STORE_PATH}'. Numeric table questions go through retrieval.")
+
+    def create_researcher(self, mode: str):
+        if mode == LLM_RESEARCHER:
+            return Researcher(self.researcher_prompt_template, self.researcher_template_str)
+        if mode == EXTRACTIVE_RESEARCHER:
+            return ExtractiveResearcher(self.embeddings)
+        raise ValueError(f"Unknown researcher mode '{mode}'. Use '{LLM_RESEARCHER}' or '{EXTRACTIVE_RESEARCHER}'.")
+
     def _create_actor_chain(self):
         actor_prompt_template = ChatPromptTemplate.from_messages([
             ("system", self.base_system_prompt),
@@ -49,6 +78,8 @@ class X4RAGChain:
         return create_stuff_documents_chain(self.actor_model, actor_prompt_template)
 
     def _find_all_entities_in_query(self, query: str) -> List[str]:
+        if self.keyword_lexicon is not None:
+            return self.keyword_lexicon.find_entities(query)
         all_matches = process.extract(query, self.keywords, scorer=fuzz.token_set_ratio, limit=5)
         good_matches = [match[0] for match in all_matches if match[1] >= 90]
         return list(set(good_matches))
@@ -67,26 +98,95 @@ class X4RAGChain:
         logger.info(f"--- Rewritten query: '{rewritten_question}' ---")
         return rewritten_question
 
+    async def _rewrite_and_retrieve(self, question: str, context_docs: List[Document]) -> Tuple[str, List[Document]]:
+        """Rewrites the question and prefetches the documents for the rewritten query."""
+        rewritten_question = await self._rewrite_query(question, context_docs)
+        if rewritten_question.lower() == question.lower():
+            return rewritten_question, []
+        return rewritten_question, await self.retriever.ainvoke(rewritten_question)
 
-    async def _get_context_stream(self, question: str, chat_history: List[BaseMessage]) -> AsyncGenerator[Dict, None]:
+    async def _self_correct(self, question: str, retrieved_docs: List[Document], speculative_task: Optional[asyncio.Task]) -> Optional[str]:
+        """Second pass: rewrite the query, retrieve again and re-run the researcher."""
+        if speculative_task:
+            rewritten_question, second_pass_docs = await speculative_task
+        else:
+            rewritten_question, second_pass_docs = await self._rewrite_and_retrieve(question, retrieved_docs)
+
+        # If the rewritten question is the same as the original, we're in a loop.
+        if rewritten_question.lower() == question.lower():
+            logger.warning("Query rewrite resulted in the same question. Aborting self-correction.")
+            return "NO_CLEAR_ANSWER"
+        return await self.researcher.run(rewritten_question, second_pass_docs)
+
+
+    def _query_stats(self, question: str) -> Tuple[Optional[str], bool]:
+        """
+        Ranked stat table rows for superlative and numeric filter questions, or None. The
+        second value is True when the rows answer the question on their own: it asks about
+        a kind of item ("fastest L-class ship") rather than a named entity, whose wiki text
+        ("is the Starburst Missile the most powerful warhead?") still has to be retrieved.
+        """
+        if self.stats_store is None:
+            return None, False
+        stats_query = parse_stats_query(question)
+        if stats_query is None:
+            return None, False
+        column, rows = self.stats_store.query(stats_query, config.STATS_RESULT_LIMIT)
+        if not rows:
+            logger.info(f"--- Stats query matched no table rows ({stats_query.attribute_terms}). Using retrieval. ---")
+            return None, False
+        # Lexicon terms like "Ships", "L-class" or "Argon" don't name one entity, so they keep the exact path
+        entities = [entity for entity in self._find_all_entities_in_query(question) if not self.stats_store.is_generic_term(entity)]
+        standalone = stats_query.subject is not None and not entities
+        if standalone:
+            logger.info(f"--- Answered from the stats store: {len(rows)} rows ranked by '{column}'. Skipping retrieval and research. ---")
+        else:
+            logger.info(f"--- Adding {len(rows)} stat rows ranked by '{column}' to the retrieved context (subject: {stats_query.subject}, entities: {entities}). ---")
+        return format_stats_context(stats_query, column, rows), standalone
+
+    async def _research(self, question: str) -> Optional[str]:
         # --- Pass 1: Initial Retrieval and Research ---
         logger.info("--- Performing initial retrieval and research pass... ---")
         retrieved_docs = await self.retriever.ainvoke(question)
-        final_context_str = await self.researcher.run(question, retrieved_docs)
 
-        # --- Pass 2: Self-Correction via Query Rewriting (if needed) ---
-        if not final_context_str:
-            logger.info("--- Initial research failed. Triggering self-correction pass. ---")
-            rewritten_question = await self._rewrite_query(question, retrieved_docs)
-            
-            # If the rewritten question is the same as the original, we're in a loop.
-            if rewritten_question.lower() == question.lower():
-                 logger.warning("Query rewrite resulted in the same question. Aborting self-correction.")
-                 final_context_str = "NO_CLEAR_ANSWER"
-            else:
-                # Perform a second retrieval and research pass with the new query
-                second_pass_docs = await self.retriever.ainvoke(rewritten_question)
-                final_context_str = await self.researcher.run(rewritten_question, second_pass_docs)
+        # In speculative mode the rewrite + second retrieval run alongside the first
+        # research pass and are only consumed if that pass fails.
+        speculative_task = None
+        if config.SPECULATIVE_REWRITE and retrieved_docs:
+            speculative_task = asyncio.create_task(self._rewrite_and_retrieve(question, retrieved_docs))
+
+        try:
+            final_context_str = await self.researcher.run(question, retrieved_docs)
+
+            # --- Pass 2: Self-Correction via Query Rewriting (if needed) ---
+            if not final_context_str:
+                logger.info("--- Initial research failed. Triggering self-correction pass. ---")
+                final_context_str = await self._self_correct(question, retrieved_docs, speculative_task)
+        finally:
+            if speculative_task:
+                if not speculative_task.done():
+                    logger.info("--- Initial research succeeded. Cancelling speculative rewrite. ---")
+                    speculative_task.cancel()
+                elif not speculative_task.cancelled():
+                    speculative_task.exception()  # Mark any failure as retrieved
+        return final_context_str
+
+    async def _get_context_stream(self, question: str, chat_history: List[BaseMessage]) -> AsyncGenerator[Dict, None]:
+        # --- Fit the history into its token budget and resolve follow-up references ---
+        history = await self.history_manager.compress(chat_history)
+        user_question = question
+        question = await self.history_manager.condense_question(question, history)
+
+        # Superlative and filter questions over the stat tables are answered exactly, without the LLM researcher.
+        # When the question is about a named entity, the ranked rows supplement the researched context instead.
+        stats_context, standalone = self._query_stats(question)
+        if standalone:
+            final_context_str = stats_context
+        else:
+            final_context_str = await self._research(question)
+            if stats_context:
+                researched = final_context_str and NO_CLEAR_ANSWER not in final_context_str
+                final_context_str = f"{stats_context}\n\n{final_context_str}" if researched else stats_context
 
         if not final_context_str:
             final_context_str = "NO_CLEAR_ANSWER"
@@ -94,8 +194,8 @@ class X4RAGChain:
         final_documents = [Document(page_content=final_context_str)]
 
         async for chunk in self.actor_chain.astream({
-            "input": question,
-            "chat_history": [],
+            "input": user_question,
+            "chat_history": history,
             "context": final_documents
         }):
             yield {"answer": chunk}
@@ -0,0 +1,150 @@
+# src/rerank_cache.py
+import hashlib
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+import config
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, whitespace and trailing punctuation do not change what a question asks."""
+    folded = unicodedata.normalize("NFKC", query).lower()
+    return _WHITESPACE.sub(" ", folded).strip(" ?!.")
+
+
+def chunk_id(doc: Document) -> str:
+    """Docstore ID of a wiki chunk; documents without one (changelog entries) are keyed by content."""
+    return doc.id or hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def index_version(paths: Iterable[str]) -> str:
+    """
+    Fingerprint of the index files on disk and the reranker model. Rebuilding an index
+    rewrites its files, so cached scores never outlive the chunks they were computed for.
+    """
+    digest = hashlib.sha1(f"{config.RERANKER_MODEL_NAME}|{config.INFERENCE_BACKEND}".encode("utf-8"))
+    for path in paths:
+        root = Path(path)
+        files = sorted(p for p in root.rglob("*") if p.is_file()) if root.is_dir() else [root] if root.exists() else []
+        for file in files:
+            stat = file.stat()
+            digest.update(f"|{file}:{stat.st_size}:{stat.st_mtime_ns}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+class RerankScoreCache:
+    """
+    Bounded LRU of cross-encoder scores. The exact tier is keyed by (normalized query,
+    chunk ID). The optional approximate tier is keyed by (SimHash bucket of the query
+    embedding, chunk ID); a hit there only counts if the cached query's embedding is
+    close enough to the new one, so unrelated queries sharing a bucket are re-scored.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = config.RERANK_CACHE_MAX_ENTRIES,
+        approximate: bool = config.RERANK_CACHE_APPROXIMATE,
+        bucket_bits: int = config.RERANK_CACHE_BUCKET_BITS,
+        min_similarity: float = config.RERANK_CACHE_APPROX_MIN_SIMILARITY,
+    ):
+        self.max_entries = max_entries
+        self.approximate = approximate
+        self.bucket_bits = bucket_bits
+        self.min_similarity = min_similarity
+        self.version: Optional[str] = None
+        self._exact: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._approx: "OrderedDict[Tuple[int, str], Tuple[np.ndarray, float]]" = OrderedDict()
+        self._hyperplanes: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.approx_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def ensure_version(self, version: str):
+        with self._lock:
+            if version == self.version:
+                return
+            if self.version is not None:
+                self.invalidations += 1
+            self._exact.clear()
+            self._approx.clear()
+            self.version = version
+
+    def bucket(self, query_vector: np.ndarray) -> int:
+        """Sign pattern of the query embedding projected on fixed random hyperplanes."""
+        if self._hyperplanes is None or self._hyperplanes.shape[1] != query_vector.shape[0]:
+            rng = np.random.default_rng(0)
+            self._hyperplanes = rng.standard_normal((self.bucket_bits, query_vector.shape[0])).astype(np.float32)
+        bits = ((self._hyperplanes @ query_vector) > 0).astype(np.uint64)
+        return int(bits @ (np.uint64(1) << np.arange(self.bucket_bits, dtype=np.uint64)))
+
+    def lookup_exact(self, query_key: str, chunk_ids: Iterable[str]) -> Dict[str, float]:
+        found = {}
+        with self._lock:
+            for cid in chunk_ids:
+                score = self._exact.get((query_key, cid))
+                if score is not None:
+                    self._exact.move_to_end((query_key, cid))
+                    found[cid] = score
+            self.exact_hits += len(found)
+        return found
+
+    def lookup_approximate(self, query_vector: np.ndarray, bucket: int, chunk_ids: Iterable[str]) -> Dict[str, float]:
+        found = {}
+        with self._lock:
+            for cid in chunk_ids:
+                entry = self._approx.get((bucket, cid))
+                if entry is not None and float(entry[0] @ query_vector) >= self.min_similarity:
+                    self._approx.move_to_end((bucket, cid))
+                    found[cid] = entry[1]
+            self.approx_hits += len(found)
+        return found
+
+    def record_misses(self, count: int):
+        with self._lock:
+            self.misses += count
+
+    def store(self, query_key: str, scores: Dict[str, float], query_vector: Optional[np.ndarray] = None, bucket: Optional[int] = None):
+        with self._lock:
+            for cid, score in scores.items():
+                self._exact[(query_key, cid)] = score
+                self._exact.move_to_end((query_key, cid))
+                if query_vector is not None and bucket is not None:
+                    self._approx[(bucket, cid)] = (query_vector, score)
+                    self._approx.move_to_end((bucket, cid))
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+            while len(self._approx) > self.max_entries:
+                self._approx.popitem(last=False)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.exact_hits + self.approx_hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "approximate": self.approximate,
+                "index_version": self.version,
+                "entries": len(self._exact),
+                "approximate_entries": len(self._approx),
+                "lookups": lookups,
+                "exact_hits": self.exact_hits,
+                "approximate_hits": self.approx_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.approx_hits) / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+RERANK_SCORE_CACHE = RerankScoreCache()
@@ -0,0 +1,102 @@
+# src/reranker.py
+import logging
+from typing import Any, List, Optional, Sequence
+import numpy as np
+from langchain_community.cross_encoders import BaseCrossEncoder
+from langchain_core.callbacks import Callbacks
+from langchain_core.documents import BaseDocumentCompressor, Document
+from pydantic import ConfigDict
+from rerank_cache import RerankScoreCache, chunk_id, normalize_query
+import config
+
+logger = logging.getLogger(__name__)
+
+DENSE_SCORE_KEY = "dense_score"
+RERANK_SCORE_KEY = "rerank_score"
+
+
+def prune_by_dense_score(documents: Sequence[Document], margin: float, min_keep: int) -> List[Document]:
+    """
+    First cascade stage: drops candidates whose cosine similarity is more than 'margin'
+    below the best candidate's. Documents without a dense score, such as changelog
+    entries, always pass.
+    """
+    scores = [doc.metadata.get(DENSE_SCORE_KEY) for doc in documents]
+    known = [score for score in scores if score is not None]
+    if not known:
+        return list(documents)
+    floor = max(known) - margin
+    ranked = sorted(range(len(documents)), key=lambda i: -(scores[i] if scores[i] is not None else float("inf")))
+    return [documents[i] for n, i in enumerate(ranked) if n < min_keep or scores[i] is None or scores[i] >= floor]
+
+
+def cut_by_relative_score(scored: List[tuple], threshold: float, min_keep: int, top_n: int) -> List[Document]:
+    """
+    Last cascade stage: keeps up to top_n documents scoring at least threshold x the best
+    score. Single-label cross-encoders return sigmoid probabilities, so the ratio is meaningful.
+    """
+    scored = sorted(scored, key=lambda item: item[1], reverse=True)
+    if not scored:
+        return []
+    floor = scored[0][1] * threshold if scored[0][1] > 0 else float("-inf")
+    return [doc for n, (doc, score) in enumerate(scored[:top_n]) if n < min_keep or score >= floor]
+
+
+class CascadeReranker(BaseDocumentCompressor):
+    """
+    Reranks retrieved documents in three stages. Candidates far below the best dense
+    similarity are dropped before the cross-encoder, so fewer pairs reach the expensive
+    model. After cross-encoding, documents below a fraction of the best score are cut,
+    so the researcher sees fewer, more relevant documents than a fixed top_n. With a
+    score cache, only (query, chunk) pairs not scored before reach the cross-encoder.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True, extra="forbid")
+
+    model: BaseCrossEncoder
+    top_n: int = 7
+    dense_margin: float = config.RERANK_DENSE_MARGIN
+    min_candidates: int = config.RERANK_MIN_CANDIDATES
+    relative_threshold: float = config.RERANK_RELATIVE_THRESHOLD
+    min_documents: int = config.RERANK_MIN_DOCUMENTS
+
+    cache: Optional[RerankScoreCache] = None
+    embeddings: Optional[Any] = None  # Query embedder for the cache's approximate tier
+    index_version: str = ""
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        if self.cache is None or not self.cache.enabled:
+            return [float(score) for score in self.model.score([(query, doc.page_content) for doc in documents])]
+
+        self.cache.ensure_version(self.index_version)
+        query_key = normalize_query(query)
+        ids = [chunk_id(doc) for doc in documents]
+        scores = self.cache.lookup_exact(query_key, ids)
+
+        query_vector, bucket = None, None
+        if self.cache.approximate and self.embeddings is not None and len(scores) < len(set(ids)):
+            query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+            bucket = self.cache.bucket(query_vector)
+            scores.update(self.cache.lookup_approximate(query_vector, bucket, [cid for cid in ids if cid not in scores]))
+
+        missing = {cid: doc for cid, doc in zip(ids, documents) if cid not in scores}
+        self.cache.record_misses(len(missing))
+        if missing:
+            fresh = self.model.score([(query, doc.page_content) for doc in missing.values()])
+            fresh_scores = {cid: float(score) for cid, score in zip(missing, fresh)}
+            self.cache.store(query_key, fresh_scores, query_vector, bucket)
+            scores.update(fresh_scores)
+        return [scores[cid] for cid in ids]
+
+    def compress_documents(self, documents: Sequence[Document], query: str, callbacks: Optional[Callbacks] = None) -> Sequence[Document]:
+        if not documents:
+            return []
+        candidates = prune_by_dense_score(documents, self.dense_margin, self.min_candidates)
+        scores = self.score(query, candidates)
+        scored = [
+            (Document(page_content=doc.page_content, metadata={**doc.metadata, RERANK_SCORE_KEY: float(score)}, id=doc.id), float(score))
+            for doc, score in zip(candidates, scores)
+        ]
+        kept = cut_by_relative_score(scored, self.relative_threshold, self.min_documents, self.top_n)
+        logger.info(f"Cascade rerank: {len(documents)} retrieved -> {len(candidates)} cross-encoded -> {len(kept)} kept.")
+        return kept
@@ -1,21 +1,56 @@
+import asyncio
 import logging
+import re
+import numpy as np
 import tiktoken
 from openai import APIError
 from langchain_core.documents import Document
-from langchain_openai import ChatOpenAI
-from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+from typing import List, Optional, Tuple
 import config
+from llm_client import create_chat_model
+from usage import UsageCallbackHandler
 
 logger = logging.getLogger(__name__)
 TOKENIZER = tiktoken.get_encoding("cl100k_base")
+NO_CLEAR_ANSWER = "NO_CLEAR_ANSWER"
+LLM_RESEARCHER = "llm"
+EXTRACTIVE_RESEARCHER = "extractive"
+_SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+_MARKDOWN_PREFIX = re.compile(r"^\s*(?:#+|[-*+>]|\d+\.)\s*")
 
 class Researcher:
     def __init__(self, researcher_prompt_template, researcher_template_str):
-        self.researcher_model = ChatOpenAI(base_url=config.BASE_URL, api_key=config.API_KEY, temperature=0.0)
+        self.researcher_model = create_chat_model(temperature=0.0, callbacks=[UsageCallbackHandler("researcher")])
         self.researcher_chain = researcher_prompt_template | self.researcher_model
         prompt_template_size = len(TOKENIZER.encode(researcher_template_str.format(question="", context="")))
         self.effective_context_size = config.MAX_CONTEXT_TOKENS - prompt_template_size - 200  # Safety buffer
 
+    async def _synthesize(self, question: str, context: str) -> str:
+        """Runs one researcher generation, streaming it so a failure signal can end it early."""
+        if not config.RESEARCHER_EARLY_EXIT:
+            response = await self.researcher_chain.ainvoke({"question": question, "context": context})
+            return response.content.strip()
+
+        parts = []
+        checking_for_sentinel = True
+        stream = self.researcher_chain.astream({"question": question, "context": context})
+        try:
+            async for chunk in stream:
+                parts.append(chunk.content)
+                if not checking_for_sentinel:
+                    continue
+                head = "".join(parts).lstrip()[:config.RESEARCHER_SENTINEL_WINDOW_CHARS]
+                if NO_CLEAR_ANSWER in head:
+                    logger.info("--- Researcher signalled NO_CLEAR_ANSWER early. Aborting generation. ---")
+                    return NO_CLEAR_ANSWER
+                if len(head) >= config.RESEARCHER_SENTINEL_WINDOW_CHARS:
+                    checking_for_sentinel = False
+        finally:
+            # Closing the stream drops the HTTP response, which stops the backend generating.
+            await stream.aclose()
+        return "".join(parts).strip()
+
     async def _recursive_summarize(self, question: str, texts: List[str]) -> str:
         if not texts:
             return ""
@@ -24,11 +59,10 @@ class Researcher:
 
         if len(TOKENIZER.encode(combined_text)) <= self.effective_context_size:
             try:
-                response = await self.researcher_chain.ainvoke({"question": question, "context": combined_text})
-                return response.content.strip()
+                return await self._synthesize(question, combined_text)
             except APIError as e:
                 logger.error(f"API Error during summarization: {e}")
-                return "NO_CLEAR_ANSWER"
+                return NO_CLEAR_ANSWER
         else:
             logger.info(f"Content for recursive summarization is too large. Splitting text in half.")
             # Simple split for now, can be improved with more sophisticated chunking if needed
@@ -62,9 +96,78 @@ class Researcher:
         final_synthesized_context = await self._recursive_summarize(question, all_doc_content)
         # --- MODIFICATION END ---
 
-        if not final_synthesized_context or "NO_CLEAR_ANSWER" in final_synthesized_context:
+        if not final_synthesized_context or NO_CLEAR_ANSWER in final_synthesized_context:
             logger.info("--- Researcher found no clear answer in the consolidated documents. ---")
             return None
 
         logger.info(f"--- Final Researcher synthesized context: ---\n{final_synthesized_context}\n--------------------")
         return final_synthesized_context
+
+
+def split_sentences(text: str) -> List[str]:
+    """Sentences of a document, treating every markdown line (header, list item, table row) as its own unit."""
+    sentences = []
+    for line in text.splitlines():
+        line = _MARKDOWN_PREFIX.sub("", line).strip()
+        if len(line) < config.EXTRACTIVE_MIN_SENTENCE_CHARS or set(line) <= set("-|:= "):
+            continue
+        sentences.extend(part.strip() for part in _SENTENCE_BOUNDARY.split(line) if part.strip())
+    return sentences
+
+
+class ExtractiveResearcher:
+    """
+    Non-LLM alternative to Researcher. Scores every sentence of the reranked documents
+    against the question with the already-loaded sentence embedder, in one batch, and
+    keeps the best sentences up to a token budget in their original order. Trades the
+    researcher's generation for a single embedding pass on the CPU.
+    """
+
+    def __init__(self, embeddings: Embeddings):
+        self.embeddings = embeddings
+
+    def select(self, question: str, documents: List[Document]) -> List[Tuple[int, int, str]]:
+        """(document index, sentence index, sentence) of the kept sentences, in document order."""
+        candidates, seen = [], set()
+        for doc_index, doc in enumerate(documents):
+            title = doc.metadata.get("title", "Unknown")
+            for sentence_index, sentence in enumerate(split_sentences(doc.page_content)):
+                if sentence not in seen:
+                    seen.add(sentence)
+                    candidates.append((doc_index, sentence_index, sentence, title))
+        if not candidates:
+            return []
+
+        # The page title gives sentences like "It has 5,000 hull" their subject
+        vectors = np.asarray(self.embeddings.embed_documents([f"{title}: {sentence}" for _, _, sentence, title in candidates]), dtype=np.float32)
+        query_vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        scores = vectors @ query_vector  # Both sides are normalized, so this is cosine similarity
+
+        kept, budget = [], config.EXTRACTIVE_CONTEXT_TOKENS
+        for i in np.argsort(-scores):
+            if scores[i] < config.EXTRACTIVE_MIN_SIMILARITY:
+                break
+            doc_index, sentence_index, sentence, _ = candidates[i]
+            cost = len(TOKENIZER.encode(sentence))
+            if cost > budget:
+                continue
+            budget -= cost
+            kept.append((doc_index, sentence_index, sentence))
+        return sorted(kept)
+
+    async def run(self, question: str, documents: List[Document]) -> Optional[str]:
+        if not documents:
+            return None
+
+        kept = await asyncio.to_thread(self.select, question, documents)
+        if not kept:
+            logger.info("--- Extractive researcher found no sentence similar enough to the question. ---")
+            return None
+
+        sections = []
+        for doc_index in dict.fromkeys(doc_index for doc_index, _, _ in kept):
+            sentences = " ".join(sentence for i, _, sentence in kept if i == doc_index)
+            sections.append(f"Source: {documents[doc_index].metadata.get('title', 'Unknown')}\n\n{sentences}")
+        context = "\n\n---\n\n".join(sections)
+        logger.info(f"--- Extractive researcher kept {len(kept)} sentences from {len(sections)} of {len(documents)} documents. ---")
+        return context
@@ -1,20 +1,227 @@
+import logging
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import numpy as np
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import CrossEncoderReranker
-from langchain_community.cross_encoders import HuggingFaceCrossEncoder
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.stores import InMemoryStore
+from changelog_index import ChangelogIndex, parse_changelog_query
+from file_utils import iter_jsonl_file
+from inference_backend import create_cross_encoder, create_embeddings
+from rerank_cache import RERANK_SCORE_CACHE, index_version
+from reranker import DENSE_SCORE_KEY, RERANK_SCORE_KEY, CascadeReranker
 import config
 
-def create_retriever(k=10, top_n=7):
-    embeddings = HuggingFaceEmbeddings(model_name=config.SENTENCE_TRANSFORMER_MODEL_NAME)
+logger = logging.getLogger(__name__)
+
+
+class ScoredVectorStoreRetriever(BaseRetriever):
+    """FAISS similarity search that records each hit's cosine similarity for the cascade reranker."""
+
+    vectorstore: Any
+    k: int = 10
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        # The index holds normalized vectors and FAISS returns squared L2 distances,
+        # so cosine similarity is 1 - distance / 2 when the query is normalized too.
+        return [
+            Document(page_content=doc.page_content, metadata={**doc.metadata, DENSE_SCORE_KEY: 1.0 - float(distance) / 2.0}, id=doc.id)
+            for doc, distance in self.vectorstore.similarity_search_with_score(query, k=self.k)
+        ]
+
+
+class PageScopedRetriever(BaseRetriever):
+    """
+    Two-level retrieval: the page summary index picks the best-matching pages, then only
+    the chunks of those pages are scored against the query. The chunk search and the
+    reranker input stay bounded by page_k pages however large the wiki grows. Falls back
+    to searching every chunk when none of the pages have indexed chunks.
+    """
+
+    vectorstore: Any
+    page_store: Any
+    embeddings: Any
+    positions_by_source: Dict[str, np.ndarray]
+    page_k: int = config.PAGE_SEARCH_K
+    k: int = 10
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        pages = self.page_store.similarity_search_by_vector(query_vector.tolist(), k=self.page_k)
+        page_positions = [self.positions_by_source[page.metadata["source"]] for page in pages if page.metadata["source"] in self.positions_by_source]
+        if not page_positions:
+            return [
+                Document(page_content=doc.page_content, metadata={**doc.metadata, DENSE_SCORE_KEY: 1.0 - float(distance) / 2.0}, id=doc.id)
+                for doc, distance in self.vectorstore.similarity_search_with_score_by_vector(query_vector.tolist(), k=self.k)
+            ]
+
+        # A chunk shared by several pages after deduplication is listed under each of them
+        positions = np.unique(np.concatenate(page_positions))
+        scores = self.vectorstore.index.reconstruct_batch(positions) @ query_vector
+        best = np.argsort(-scores)[:self.k]
+        logger.info(f"Page-scoped search: {len(pages)} pages, {len(positions)} candidate chunks.")
+        documents = []
+        for i in best:
+            doc_id = self.vectorstore.index_to_docstore_id[int(positions[i])]
+            doc = self.vectorstore.docstore.search(doc_id)
+            documents.append(Document(page_content=doc.page_content, metadata={**doc.metadata, DENSE_SCORE_KEY: float(scores[i])}, id=doc_id))
+        return documents
+
+
+def chunk_positions_by_source(vectorstore: FAISS) -> Dict[str, np.ndarray]:
+    """FAISS row positions of each page's chunks, including chunks kept for duplicates on other pages."""
+    positions: Dict[str, List[int]] = {}
+    for position, doc_id in vectorstore.index_to_docstore_id.items():
+        metadata = vectorstore.docstore.search(doc_id).metadata
+        for source in metadata.get("sources") or [metadata.get("source")]:
+            positions.setdefault(source, []).append(position)
+    return {source: np.asarray(rows, dtype=np.int64) for source, rows in positions.items()}
+
+
+class VersionScopedRetriever(BaseRetriever):
+    """
+    Sends questions scoped to a game version ("what changed in 7.0 for mining") to the
+    changelog index, which only ranks the entries inside that version range and category.
+    Every other question, or a scope with no matching entries, goes to the wiki retriever.
+    """
+
+    wiki_retriever: BaseRetriever
+    changelog_index: Any
+    embeddings: Any
+    k: int = config.CHANGELOG_SEARCH_K
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        scope = parse_changelog_query(query)
+        if scope is not None:
+            docs = self.changelog_index.search(self.embeddings.embed_query(query), scope, self.k)
+            if docs:
+                logger.info(f"Version-scoped query ({scope}). Retrieved {len(docs)} changelog entries.")
+                return docs
+        return self.wiki_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+
+
+class ParentSectionRetriever(BaseRetriever):
+    """
+    Small-to-big retrieval: the index only holds small chunks, which match precisely,
+    but each reranked chunk is replaced by the markdown section it came from, so the
+    researcher gets the full context. Chunks of the same section collapse into one
+    document, in the order of their best-ranked chunk. Documents without a parent,
+    such as changelog entries, and oversized sections are passed through as they are.
+    """
+
+    child_retriever: BaseRetriever
+    docstore: Any
+    max_section_chars: int = config.PARENT_SECTION_MAX_CHARS
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.expand(self.child_retriever.invoke(query, config={"callbacks": run_manager.get_child()}))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return self.expand(await self.child_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()}))
+
+    def expand(self, children: List[Document]) -> List[Document]:
+        parent_ids = list(dict.fromkeys(doc.metadata["parent_id"] for doc in children if doc.metadata.get("parent_id")))
+        sections = dict(zip(parent_ids, self.docstore.mget(parent_ids)))
+
+        documents, expanded = [], {}
+        for child in children:
+            parent_id = child.metadata.get("parent_id")
+            section = sections.get(parent_id)
+            if section is None or len(section.page_content) > self.max_section_chars:
+                documents.append(child)
+            elif parent_id in expanded:
+                expanded[parent_id].metadata["matched_chunks"] += 1
+            else:
+                expanded[parent_id] = Document(
+                    page_content=section.page_content,
+                    metadata={
+                        **section.metadata,
+                        "sources": child.metadata.get("sources", [section.metadata["source"]]),
+                        RERANK_SCORE_KEY: child.metadata.get(RERANK_SCORE_KEY),
+                        "matched_chunks": 1,
+                    },
+                    id=parent_id,
+                )
+                documents.append(expanded[parent_id])
+        logger.info(f"Small-to-big: {len(children)} reranked chunks -> {len(documents)} documents ({len(expanded)} parent sections).")
+        return documents
+
+
+def load_section_store() -> Optional[InMemoryStore]:
+    if not Path(config.SECTIONS_PATH).exists():
+        logger.warning(f"Parent sections not found at '{config.SECTIONS_PATH}'. Returning the matched chunks only.")
+        return None
+    store = InMemoryStore()
+    store.mset([
+        (
+            section["id"],
+            Document(
+                page_content=section["content"],
+                metadata={"source": section["source"], "title": section["title"], "section_index": section["section_index"]},
+                id=section["id"],
+            ),
+        )
+        for section in iter_jsonl_file(config.SECTIONS_PATH)
+    ])
+    return store
+
+
+def load_page_store(embeddings) -> Optional[FAISS]:
+    if config.PAGE_SEARCH_K <= 0:
+        return None
+    if not Path(config.PAGE_INDEX_PATH).exists():
+        logger.warning(f"Page index not found at '{config.PAGE_INDEX_PATH}'. Searching every chunk.")
+        return None
+    return FAISS.load_local(config.PAGE_INDEX_PATH, embeddings, allow_dangerous_deserialization=True)
+
+
+def load_changelog_index() -> Optional[ChangelogIndex]:
+    if not Path(config.CHANGELOG_INDEX_PATH).exists():
+        logger.warning(f"Changelog index not found at '{config.CHANGELOG_INDEX_PATH}'. Version-scoped routing is disabled.")
+        return None
+    return ChangelogIndex.load(config.CHANGELOG_INDEX_PATH)
+
+
+def create_retriever(k=10, top_n=7, embeddings=None):
+    """Builds the retrieval pipeline. Pass 'embeddings' to share an already-loaded normalized embedder."""
+    embeddings = embeddings or create_embeddings(normalize_embeddings=True)
     base_vectorstore = FAISS.load_local(config.VECTOR_STORE_PATH, embeddings, allow_dangerous_deserialization=True)
-    base_retriever = base_vectorstore.as_retriever(search_kwargs={"k": k})
+    page_store = load_page_store(embeddings)
+    if page_store is not None:
+        base_retriever = PageScopedRetriever(
+            vectorstore=base_vectorstore,
+            page_store=page_store,
+            embeddings=embeddings,
+            positions_by_source=chunk_positions_by_source(base_vectorstore),
+            k=k,
+        )
+    else:
+        base_retriever = ScoredVectorStoreRetriever(vectorstore=base_vectorstore, k=k)
+
+    changelog_index = load_changelog_index()
+    if changelog_index is not None:
+        base_retriever = VersionScopedRetriever(
+            wiki_retriever=base_retriever, changelog_index=changelog_index, embeddings=embeddings
+        )
 
-    reranker_model = HuggingFaceCrossEncoder(model_name=config.RERANKER_MODEL_NAME)
-    compressor = CrossEncoderReranker(model=reranker_model, top_n=top_n)
+    reranker_model = create_cross_encoder()
+    compressor = CascadeReranker(
+        model=reranker_model,
+        top_n=top_n,
+        cache=RERANK_SCORE_CACHE,
+        embeddings=embeddings,
+        index_version=index_version([config.VECTOR_STORE_PATH, config.CHANGELOG_INDEX_PATH]),
+    )
 
     retriever = ContextualCompressionRetriever(
         base_compressor=compressor, base_retriever=base_retriever
     )
 
+    section_store = load_section_store()
+    if section_store is not None:
+        retriever = ParentSectionRetriever(child_retriever=retriever, docstore=section_store)
+
     return retriever
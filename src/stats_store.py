@@ -0,0 +1,376 @@
+# src/stats_store.py
+import json
+import logging
+import re
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATS_FORMAT_VERSION = "1"  # Bump when row parsing changes, to re-store every page
+MIN_NUMERIC_ROWS = 3  # Columns with fewer numeric cells are not ranked
+NAME_COLUMNS = ("name", "ship", "weapon", "ware", "module", "item", "title")
+CATEGORY_COLUMNS = ("faction", "race", "manufacturer", "owner")
+SIZE_COLUMNS = ("class", "size")
+
+# A multiplier must be attached to the number ("12.5k", "1.5M"); "350 m/s" and "100m" are units
+_NUMBER = re.compile(r"^[~≈]?\s*([-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?)([kK]|M(?![a-zA-Z/]))?\s*([^\d\s][^\d]{0,15})?$")
+_MULTIPLIERS = {"k": 1e3, "m": 1e6}
+_COLUMN_NOISE = re.compile(r"\([^)]*\)|\[[^\]]*\]|[*_`]")
+_WORD = re.compile(r"[a-z0-9]+")
+
+# Superlatives that name their own attribute; "most/highest/lowest <attribute>" is handled generically.
+IMPLIED_ATTRIBUTES = {
+    "fastest": (["speed"], True),
+    "quickest": (["speed"], True),
+    "slowest": (["speed"], False),
+    "cheapest": (["price", "cost"], False),
+    "priciest": (["price", "cost"], True),
+    "most expensive": (["price", "cost"], True),
+    "toughest": (["hull"], True),
+    "tankiest": (["hull"], True),
+    "weakest": (["hull"], False),
+    "deadliest": (["dps", "damage"], True),
+    "most powerful": (["dps", "damage"], True),
+}
+_IMPLIED_PATTERN = re.compile(r"\b(" + "|".join(sorted(IMPLIED_ATTRIBUTES, key=len, reverse=True)) + r")\b")
+_SUPERLATIVE_PATTERN = re.compile(
+    r"\b(most|highest|largest|biggest|greatest|best|maximum|max|top|least|lowest|smallest|fewest|minimum|min|worst)"
+    r"\s+(?:the\s+)?([a-z]+)(?:\s+([a-z]+))?"
+)
+_DESCENDING_WORDS = {"most", "highest", "largest", "biggest", "greatest", "best", "maximum", "max", "top"}
+_COMPARISON_PATTERN = re.compile(
+    r"\b(?:([a-z]+)\s+)?(over|above|more than|greater than|at least|under|below|less than|at most)\s+"
+    r"(\d[\d,]*(?:\.\d+)?)(k\b)?(?:\s*([a-z]+))?"
+)
+_COMPARISON_OPERATORS = {
+    "over": ">", "above": ">", "more than": ">", "greater than": ">", "at least": ">=",
+    "under": "<", "below": "<", "less than": "<", "at most": "<=",
+}
+# Not after an apostrophe, so the possessive in "Argon's ships" is not read as size class S
+_SIZE_NOUNS = ("ship", "fighter", "dock", "turret", "weapon", "shield", "engine")
+_SIZE_PATTERN = re.compile(
+    r"(?<!['’])\b(xs|s|m|l|xl)(?:[- ]?(?:class|size|sized)\b|\s+(?:" + "|".join(f"{noun}s?" for noun in _SIZE_NOUNS) + r")\b)"
+)
+_SIZE_VALUES = {
+    "xs": ["xs", "extra small"], "s": ["s", "small"], "m": ["m", "medium"], "l": ["l", "large"], "xl": ["xl", "extra large"],
+}
+_PLACEHOLDER_VALUES = {"", "n/a", "na", "none", "unknown", "?"}  # Category cells that name no faction or manufacturer
+_STOP_WORDS = {"a", "an", "the", "of", "in", "for", "and", "ship", "ships", "which", "what", "is", "has", "with", "one"}
+SUBJECTS = ("ship", "weapon", "turret", "shield", "engine", "thruster", "missile", "station", "module", "ware", "drone")
+# Words that name a kind of item rather than one item, such as "L-class ships" or "small fighter"
+_GENERIC_WORDS = (
+    set(SUBJECTS) | set(_SIZE_NOUNS) | set(_STOP_WORDS) | {v for values in _SIZE_VALUES.values() for value in values for v in value.split()}
+    | {"class", "size", "sized"}
+)
+
+
+def parse_number(text: str) -> Optional[Tuple[float, str]]:
+    """Value and unit of a stat cell such as "1,250 m/s", "12.5k" or "45%". Free text returns None."""
+    match = _NUMBER.match(text.strip())
+    if not match:
+        return None
+    value = float(match.group(1).replace(",", ""))
+    if match.group(2):
+        value *= _MULTIPLIERS[match.group(2).lower()]
+    return value, (match.group(3) or "").strip()
+
+
+def normalize_column(name: str) -> str:
+    """'Max Speed (m/s)' -> 'max speed'. Units in brackets and markdown emphasis are dropped."""
+    return " ".join(_WORD.findall(_COLUMN_NOISE.sub(" ", name).lower()))
+
+
+def row_entity(row: Dict[str, str]) -> str:
+    for column, value in row.items():
+        if normalize_column(column) in NAME_COLUMNS:
+            return value
+    return next(iter(row.values()), "")
+
+
+def _names_category(value: str) -> bool:
+    """False for placeholder cells such as "-", "—" or "N/A", whose empty word set would match every question."""
+    return value.strip() not in _PLACEHOLDER_VALUES and bool(_WORD.findall(value))
+
+
+def _singular(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+@dataclass
+class StatsQuery:
+    """A ranking or filter over one numeric column, optionally restricted by text filters."""
+
+    attribute_terms: List[str]
+    descending: bool = True
+    size: Optional[str] = None
+    numeric_filters: List[Tuple[List[str], str, float]] = field(default_factory=list)
+    subject: Optional[str] = None
+    words: List[str] = field(default_factory=list)
+
+
+def parse_stats_query(question: str) -> Optional[StatsQuery]:
+    """
+    Detects superlative ("fastest L-class ship", "which ship has the most hull") and
+    numeric filter ("ships with speed over 300") questions. Returns None for every other
+    question, so it can be tried before retrieval on each request.
+    """
+    text = question.lower().replace("-", " ")
+    words = _WORD.findall(text)
+    query: Optional[StatsQuery] = None
+
+    implied = _IMPLIED_PATTERN.search(text)
+    if implied:
+        terms, descending = IMPLIED_ATTRIBUTES[implied.group(1)]
+        query = StatsQuery(attribute_terms=list(terms), descending=descending)
+    else:
+        superlative = _SUPERLATIVE_PATTERN.search(text)
+        if superlative and superlative.group(2) not in _STOP_WORDS:
+            first, second = superlative.group(2), superlative.group(3)
+            terms = [f"{first} {second}", first] if second and second not in _STOP_WORDS else [first]
+            query = StatsQuery(attribute_terms=[_singular(t) for t in terms], descending=superlative.group(1) in _DESCENDING_WORDS)
+
+    numeric_filters = []
+    for match in _COMPARISON_PATTERN.finditer(text):
+        before, operator, number, multiplier, after = match.groups()
+        column = after if after and after not in _STOP_WORDS else before
+        if not column or column in _STOP_WORDS:
+            continue
+        value = float(number.replace(",", "")) * (_MULTIPLIERS[multiplier.lower()] if multiplier else 1)
+        numeric_filters.append(([_singular(column)], _COMPARISON_OPERATORS[operator], value))
+
+    if query is None:
+        if not numeric_filters:
+            return None
+        query = StatsQuery(attribute_terms=list(numeric_filters[0][0]), descending=numeric_filters[0][1].startswith(">"))
+    query.numeric_filters = numeric_filters
+
+    size = _SIZE_PATTERN.search(text)
+    query.size = size.group(1) if size else None
+    query.subject = next((s for s in SUBJECTS if s in {_singular(w) for w in words}), None)
+    query.words = words
+    return query
+
+
+@dataclass
+class StatRow:
+    source: str
+    title: str
+    entity: str
+    cells: Dict[str, str]
+    value: float
+
+
+class StatsStore:
+    """
+    Every table row unrolled by 01b_summarize_md.py, in SQLite. Each cell is stored once
+    per (row, column) with its text and, for stat cells, its parsed number and unit, so
+    "highest value of column X among rows where column Y is Z" is one indexed query
+    instead of an LLM comparing hundreds of unrolled rows.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (source TEXT PRIMARY KEY, title TEXT NOT NULL, input_hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS stat_rows (
+                row_id INTEGER PRIMARY KEY, source TEXT NOT NULL, table_index INTEGER NOT NULL,
+                entity TEXT NOT NULL, cells TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS stat_values (
+                row_id INTEGER NOT NULL, column_key TEXT NOT NULL, text_value TEXT NOT NULL,
+                num_value REAL, unit TEXT, PRIMARY KEY (row_id, column_key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_rows_source ON stat_rows(source);
+            CREATE INDEX IF NOT EXISTS idx_values_numeric ON stat_values(column_key, num_value);
+            CREATE INDEX IF NOT EXISTS idx_values_text ON stat_values(column_key, text_value COLLATE NOCASE);
+            """
+        )
+        self._columns: Optional[List[Tuple[str, int]]] = None
+        self._category_values: Optional[List[str]] = None
+
+    def page_hashes(self) -> Dict[str, str]:
+        """Stored pages and the input hash they were parsed from, including the format version."""
+        return dict(self.conn.execute("SELECT source, input_hash FROM pages"))
+
+    @staticmethod
+    def versioned_hash(input_hash: str) -> str:
+        return f"{STATS_FORMAT_VERSION}:{input_hash}"
+
+    def replace_page(self, source: str, title: str, input_hash: str, tables: List[List[Dict[str, str]]]) -> int:
+        """Replaces every stored row of one page. Returns the number of rows stored."""
+        rows = 0
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                self._delete_pages([source])
+                self.conn.execute("INSERT INTO pages (source, title, input_hash) VALUES (?, ?, ?)", (source, title, self.versioned_hash(input_hash)))
+                for table_index, table in enumerate(tables):
+                    for row in table:
+                        cursor = self.conn.execute(
+                            "INSERT INTO stat_rows (source, table_index, entity, cells) VALUES (?, ?, ?, ?)",
+                            (source, table_index, row_entity(row), json.dumps(row, ensure_ascii=False)),
+                        )
+                        values = {}
+                        for column, text in row.items():
+                            key = normalize_column(column)
+                            if key and key not in values:
+                                number = parse_number(text)
+                                values[key] = (cursor.lastrowid, key, text, *(number or (None, None)))
+                        self.conn.executemany(
+                            "INSERT INTO stat_values (row_id, column_key, text_value, num_value, unit) VALUES (?, ?, ?, ?, ?)",
+                            values.values(),
+                        )
+                        rows += 1
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        self._columns, self._category_values = None, None
+        return rows
+
+    def _delete_pages(self, sources: Iterable[str]):
+        for source in sources:
+            self.conn.execute("DELETE FROM stat_values WHERE row_id IN (SELECT row_id FROM stat_rows WHERE source = ?)", (source,))
+            self.conn.execute("DELETE FROM stat_rows WHERE source = ?", (source,))
+            self.conn.execute("DELETE FROM pages WHERE source = ?", (source,))
+
+    def remove_pages(self, sources: Iterable[str]):
+        with self._lock:
+            self.conn.execute("BEGIN")
+            self._delete_pages(sources)
+            self.conn.execute("COMMIT")
+        self._columns, self._category_values = None, None
+
+    def numeric_columns(self) -> List[Tuple[str, int]]:
+        """(column key, numeric cell count) of every rankable column."""
+        if self._columns is None:
+            self._columns = self.conn.execute(
+                "SELECT column_key, COUNT(*) FROM stat_values WHERE num_value IS NOT NULL GROUP BY column_key HAVING COUNT(*) >= ?",
+                (MIN_NUMERIC_ROWS,),
+            ).fetchall()
+        return self._columns
+
+    def resolve_columns(self, terms: List[str]) -> List[str]:
+        """Numeric columns named by the terms: exact names first, then names containing a term as a word."""
+        columns = self.numeric_columns()
+        ranked = []
+        for priority, term in enumerate(terms):
+            pattern = re.compile(rf"\b{re.escape(term)}s?\b")
+            for key, count in columns:
+                if key == term or key == term + "s":
+                    ranked.append(((priority, 0, len(key), -count), key))
+                elif pattern.search(key):
+                    ranked.append(((priority, 1, len(key), -count), key))
+        return list(dict.fromkeys(key for _, key in sorted(ranked)))
+
+    def category_values(self) -> List[str]:
+        """Lower-cased faction and manufacturer names in the stat tables, without placeholders."""
+        if self._category_values is None:
+            placeholders = ",".join("?" * len(CATEGORY_COLUMNS))
+            self._category_values = [
+                value for (value,) in self.conn.execute(
+                    f"SELECT DISTINCT lower(text_value) FROM stat_values WHERE column_key IN ({placeholders})", CATEGORY_COLUMNS
+                )
+                if _names_category(value)
+            ]
+        return self._category_values
+
+    def is_generic_term(self, term: str) -> bool:
+        """
+        True for keywords that only name a kind of item, a size class, a faction or a stat
+        column ("Ships", "L-class", "Argon", "Hull"), as opposed to one named entity.
+        """
+        generic = set(_GENERIC_WORDS)
+        for name in self.category_values() + [key for key, _ in self.numeric_columns()]:
+            generic.update(_WORD.findall(name))
+        return all(_singular(word) in generic or word in generic for word in _WORD.findall(term.lower().replace("-", " ")))
+
+    def _category_filter(self, words: List[str]) -> Tuple[str, List]:
+        """Restricts rows to a faction or manufacturer named in the question, if any."""
+        word_set = set(words)
+        placeholders = ",".join("?" * len(CATEGORY_COLUMNS))
+        values = [value for value in self.category_values() if set(_WORD.findall(value)) <= word_set]
+        if not values:
+            return "", []
+        return (
+            f" AND EXISTS (SELECT 1 FROM stat_values c WHERE c.row_id = v.row_id AND c.column_key IN ({placeholders}) "
+            f"AND lower(c.text_value) IN ({','.join('?' * len(values))}))",
+            [*CATEGORY_COLUMNS, *values],
+        )
+
+    def query(self, stats_query: StatsQuery, limit: int) -> Tuple[Optional[str], List[StatRow]]:
+        """
+        Ranks rows by the first column matching the query's attribute that has rows left
+        after the filters. Returns that column and the best rows, one per entity.
+        """
+        where, params = "", []
+        if stats_query.size:
+            size_columns = ",".join("?" * len(SIZE_COLUMNS))
+            size_values = _SIZE_VALUES[stats_query.size]
+            where += (
+                f" AND EXISTS (SELECT 1 FROM stat_values s WHERE s.row_id = v.row_id AND s.column_key IN ({size_columns}) "
+                f"AND lower(s.text_value) IN ({','.join('?' * len(size_values))}))"
+            )
+            params += [*SIZE_COLUMNS, *size_values]
+        for terms, operator, value in stats_query.numeric_filters:
+            filter_columns = self.resolve_columns(terms)[:1]
+            if not filter_columns:
+                return None, []
+            where += f" AND EXISTS (SELECT 1 FROM stat_values n WHERE n.row_id = v.row_id AND n.column_key = ? AND n.num_value {operator} ?)"
+            params += [filter_columns[0], value]
+        category_where, category_params = self._category_filter(stats_query.words)
+        where += category_where
+        params += category_params
+
+        subject_clauses = [""]
+        if stats_query.subject:
+            subject_clauses.insert(0, " AND (lower(p.title) LIKE ? OR lower(r.source) LIKE ?)")
+
+        order = "DESC" if stats_query.descending else "ASC"
+        for column in self.resolve_columns(stats_query.attribute_terms):
+            for subject_clause in subject_clauses:
+                subject_params = [f"%{stats_query.subject}%"] * 2 if subject_clause else []
+                records = self.conn.execute(
+                    "SELECT r.source, p.title, r.entity, r.cells, v.num_value FROM stat_values v "
+                    "JOIN stat_rows r ON r.row_id = v.row_id JOIN pages p ON p.source = r.source "
+                    f"WHERE v.column_key = ? AND v.num_value IS NOT NULL{where}{subject_clause} "
+                    f"ORDER BY v.num_value {order} LIMIT ?",
+                    [column, *params, *subject_params, limit * 4],
+                ).fetchall()
+                rows, seen = [], set()
+                for source, title, entity, cells, value in records:
+                    if entity.lower() in seen:
+                        continue
+                    seen.add(entity.lower())
+                    rows.append(StatRow(source, title, entity, json.loads(cells), value))
+                if rows:
+                    return column, rows[:limit]
+        return None, []
+
+    def close(self):
+        self.conn.close()
+
+
+def format_stats_context(stats_query: StatsQuery, column: str, rows: List[StatRow]) -> str:
+    """Renders ranked rows as exact facts for the actor, with every cell of each row."""
+    direction = "highest first" if stats_query.descending else "lowest first"
+    filters = []
+    if stats_query.size:
+        filters.append(f"size class {stats_query.size.upper()}")
+    filters += [f"{' '.join(terms)} {operator} {value:g}" for terms, operator, value in stats_query.numeric_filters]
+    header = f"Exact values from the wiki's stat tables, ranked by '{column}' ({direction})"
+    if filters:
+        header += f", filtered to {', '.join(filters)}"
+    lines = [header + ":"]
+    for rank, row in enumerate(rows, start=1):
+        cells = "; ".join(f"{key}: {value}" for key, value in row.cells.items())
+        lines.append(f"{rank}. {row.entity} ({row.title}) - {cells}")
+    return "\n".join(lines)
@@ -0,0 +1,158 @@
+# src/usage.py
+import logging
+import tiktoken
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import LLMResult
+
+logger = logging.getLogger(__name__)
+TOKENIZER = tiktoken.get_encoding("cl100k_base")
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and separator tokens the chat format adds per message
+
+
+@dataclass
+class StageUsage:
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: "StageUsage"):
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.calls += other.calls
+
+    def as_dict(self) -> Dict[str, int]:
+        return {**asdict(self), "total_tokens": self.total_tokens}
+
+
+class UsageTracker:
+    """Token usage of every internal LLM call made while answering one request, per pipeline stage."""
+
+    def __init__(self):
+        self.stages: Dict[str, StageUsage] = defaultdict(StageUsage)
+
+    def record(self, stage: str, prompt_tokens: int, completion_tokens: int):
+        self.stages[stage].add(StageUsage(prompt_tokens, completion_tokens, 1))
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(stage.prompt_tokens for stage in self.stages.values())
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(stage.completion_tokens for stage in self.stages.values())
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+
+class UsageMetrics:
+    """Process-wide aggregate of all finished request trackers."""
+
+    def __init__(self):
+        self.requests = 0
+        self.stages: Dict[str, StageUsage] = defaultdict(StageUsage)
+
+    def add(self, tracker: UsageTracker):
+        self.requests += 1
+        for name, stage in tracker.stages.items():
+            self.stages[name].add(stage)
+
+    def as_dict(self) -> Dict[str, Any]:
+        totals = StageUsage()
+        for stage in self.stages.values():
+            totals.add(stage)
+        return {
+            "requests": self.requests,
+            **totals.as_dict(),
+            "avg_tokens_per_request": totals.total_tokens / self.requests if self.requests else 0.0,
+            "stages": {name: stage.as_dict() for name, stage in self.stages.items()},
+        }
+
+
+CURRENT_TRACKER: ContextVar[Optional[UsageTracker]] = ContextVar("usage_tracker", default=None)
+USAGE_METRICS = UsageMetrics()
+
+
+@contextmanager
+def track_usage():
+    """Attributes LLM calls made inside this block (including spawned tasks) to a fresh tracker."""
+    tracker = UsageTracker()
+    token = CURRENT_TRACKER.set(tracker)
+    try:
+        yield tracker
+    finally:
+        CURRENT_TRACKER.reset(token)
+        USAGE_METRICS.add(tracker)
+        logger.info(f"--- Request token usage: {tracker.as_dict()} ---")
+
+
+def count_message_tokens(messages: List[BaseMessage]) -> int:
+    return sum(len(TOKENIZER.encode(str(msg.content))) + MESSAGE_OVERHEAD_TOKENS for msg in messages)
+
+
+def _backend_usage(response: LLMResult) -> Optional[Tuple[int, int]]:
+    """Reads usage reported by the backend, if any, from either the non-streaming or streaming result shape."""
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage.get("prompt_tokens") is not None:
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    return None
+
+
+class UsageCallbackHandler(AsyncCallbackHandler):
+    """
+    Records each chat model call against the current request's tracker under a stage name.
+    Uses backend usage fields when present and falls back to local tiktoken counts,
+    which also covers streams that were aborted before the backend reported usage.
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self._prompt_tokens: Dict[UUID, int] = {}
+
+    async def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any):
+        self._prompt_tokens[run_id] = sum(count_message_tokens(batch) for batch in messages)
+
+    def _record(self, response: Optional[LLMResult], run_id: UUID):
+        local_prompt_tokens = self._prompt_tokens.pop(run_id, 0)
+        tracker = CURRENT_TRACKER.get()
+        if tracker is None:
+            return
+        usage = _backend_usage(response) if response else None
+        if usage is None:
+            completion_text = "".join(
+                generation.text for generations in (response.generations if response else []) for generation in generations
+            )
+            usage = (local_prompt_tokens, len(TOKENIZER.encode(completion_text)))
+        tracker.record(self.stage, *usage)
+
+    async def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any):
+        self._record(response, run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any):
+        # Aborted streams land here; the partial generation is passed as 'response'.
+        self._record(kwargs.get("response"), run_id)
@@ -0,0 +1,24 @@
+# tests/test_build_state.py
+from build_state import BuildState
+
+
+def make_state(tmp_path):
+    return BuildState(tmp_path / "in", tmp_path / "out", ".html", ".md")
+
+
+def test_skipped_input_settles_until_it_changes(tmp_path):
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "empty.html").write_text("<html></html>", "utf-8")
+    (tmp_path / "out").mkdir()
+    (tmp_path / "out" / "empty.md").write_text("old output", "utf-8")
+
+    state = make_state(tmp_path)
+    assert state.stale_inputs() == ["empty.html"]
+    state.record_skipped("empty.html")
+    state.save()
+
+    assert not (tmp_path / "out" / "empty.md").exists()
+    assert make_state(tmp_path).stale_inputs() == []
+
+    (tmp_path / "in" / "empty.html").write_text("<html><main></main></html>", "utf-8")
+    assert make_state(tmp_path).stale_inputs() == ["empty.html"]
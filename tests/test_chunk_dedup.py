@@ -0,0 +1,29 @@
+# tests/test_chunk_dedup.py
+import numpy as np
+from chunk_dedup import LSH_BANDS, NUM_PERMUTATIONS, cluster_signatures, find_duplicate_clusters
+
+ROWS = NUM_PERMUTATIONS // LSH_BANDS
+
+
+def test_near_duplicates_merge_behind_a_dissimilar_first_member():
+    rng = np.random.default_rng(0)
+    a = rng.integers(0, 1 << 30, NUM_PERMUTATIONS)
+    # b differs from a in one value of every band but the first seven: 103/128 agreement
+    b = a.copy()
+    for band in range(7, LSH_BANDS):
+        b[band * ROWS] += 1
+    # Each of those seven bands also holds an unrelated signature that comes first in the bucket
+    others = []
+    for band in range(7):
+        other = rng.integers(1 << 30, 1 << 31, NUM_PERMUTATIONS)
+        other[band * ROWS:(band + 1) * ROWS] = a[band * ROWS:(band + 1) * ROWS]
+        others.append(other)
+
+    clusters = cluster_signatures(np.stack(others + [a, b]))
+    assert sorted(map(sorted, clusters)) == [[i] for i in range(7)] + [[7, 8]]
+
+
+def test_find_duplicate_clusters():
+    base = "The Argon Nova is a medium fighter built by the Argon Federation for patrol duty and escort work in the sectors"
+    texts = [base, base + " near Argon Prime.", "Teladi traders sell Spacefuel at most trading stations in their space."]
+    assert sorted(map(sorted, find_duplicate_clusters(texts))) == [[0, 1], [2]]
@@ -0,0 +1,17 @@
+# tests/test_keyword_lexicon.py
+from keyword_lexicon import KeywordLexicon, choose_canonical
+
+
+def test_choose_canonical_prefers_singular_over_capitalized_plural():
+    assert choose_canonical(["Barons", "baron"]) == "baron"
+    assert choose_canonical(["Ships", "ship", "ships"]) == "ship"
+
+
+def test_choose_canonical_uses_most_common_capitalization():
+    assert choose_canonical(["Argon Prime", "argon prime", "Argon Prime", "Argon Primes"]) == "Argon Prime"
+    assert choose_canonical(["teladi", "Teladi"]) == "Teladi"
+
+
+def test_lexicon_maps_variants_to_one_canonical_entity():
+    lexicon = KeywordLexicon.build(["Barons", "baron", "Argon Prime", "argon prime", "Prime Argon"])
+    assert sorted(lexicon.canonical) == ["Argon Prime", "baron"]
@@ -0,0 +1,42 @@
+# tests/test_rag_routing.py
+import pytest
+
+pytest.importorskip("langchain")
+
+from keyword_lexicon import KeywordLexicon
+from rag_chain import X4RAGChain
+from stats_store import StatsStore
+
+
+@pytest.fixture
+def chain():
+    store = StatsStore(":memory:")
+    store.replace_page(
+        "ships.md",
+        "Ships",
+        "hash",
+        [[
+            {"Name": "Argon Nova", "Class": "S", "Speed": "500 m/s", "Manufacturer": "Argon"},
+            {"Name": "Argon Colossus", "Class": "L", "Speed": "200 m/s", "Manufacturer": "Argon"},
+            {"Name": "Teladi Phoenix", "Class": "L", "Speed": "300 m/s", "Manufacturer": "Teladi"},
+        ]],
+    )
+    chain = X4RAGChain.__new__(X4RAGChain)
+    chain.stats_store = store
+    chain.keywords = ["Ships", "L-class", "Argon", "Teladi", "Argon Nova", "Argon Colossus"]
+    chain.keyword_lexicon = KeywordLexicon.build(chain.keywords)
+    yield chain
+    store.close()
+
+
+@pytest.mark.parametrize("question", ["What is the fastest L-class ship?", "What is the fastest Argon ship?", "Which ships have the most speed?"])
+def test_generic_lexicon_terms_keep_stats_answers_standalone(chain, question):
+    context, standalone = chain._query_stats(question)
+    assert context is not None
+    assert standalone
+
+
+def test_named_entity_still_needs_retrieval(chain):
+    context, standalone = chain._query_stats("Is the Argon Nova the fastest ship?")
+    assert context is not None
+    assert not standalone
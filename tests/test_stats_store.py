@@ -0,0 +1,92 @@
+# tests/test_stats_store.py
+import pytest
+from stats_store import StatsStore, parse_number, parse_stats_query
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("1,250 m/s", (1250.0, "m/s")),
+        ("350 m/s", (350.0, "m/s")),
+        ("12.5k", (12500.0, "")),
+        ("1.5M Cr", (1500000.0, "Cr")),
+        ("45%", (45.0, "%")),
+        ("~200", (200.0, "")),
+    ],
+)
+def test_parse_number(text, expected):
+    assert parse_number(text) == expected
+
+
+@pytest.mark.parametrize("text", ["-", "—", "N/A", "Argon Federation", ""])
+def test_parse_number_rejects_free_text(text):
+    assert parse_number(text) is None
+
+
+def test_parse_implied_superlative():
+    query = parse_stats_query("What is the fastest L-class ship?")
+    assert query.attribute_terms == ["speed"]
+    assert query.descending
+    assert query.size == "l"
+    assert query.subject == "ship"
+
+
+def test_parse_generic_superlative_and_filter():
+    query = parse_stats_query("Which ship has the least hull?")
+    assert query.attribute_terms == ["hull"]
+    assert not query.descending
+
+    query = parse_stats_query("ships with speed over 300")
+    assert query.numeric_filters == [(["speed"], ">", 300.0)]
+
+
+def test_parse_possessive_is_not_a_size_class():
+    assert parse_stats_query("What is the fastest of Argon's ships?").size is None
+    assert parse_stats_query("What is the fastest of Argon’s ships?").size is None
+    assert parse_stats_query("fastest s ship").size == "s"
+
+
+def test_parse_ignores_other_questions():
+    assert parse_stats_query("Which factions sell the Starburst Missile?") is None
+
+
+@pytest.fixture
+def store():
+    store = StatsStore(":memory:")
+    store.replace_page(
+        "ships.md",
+        "Ships",
+        "hash",
+        [[
+            {"Name": "A", "Speed": "500 m/s", "Manufacturer": "Argon"},
+            {"Name": "B", "Speed": "200 m/s", "Manufacturer": "-"},
+            {"Name": "C", "Speed": "900 m/s", "Manufacturer": "Teladi"},
+            {"Name": "D", "Speed": "700 m/s", "Manufacturer": "—"},
+        ]],
+    )
+    yield store
+    store.close()
+
+
+def entities(store, question):
+    return [row.entity for row in store.query(parse_stats_query(question), 5)[1]]
+
+
+def test_query_ranks_every_row_despite_placeholder_categories(store):
+    assert entities(store, "What is the fastest ship?") == ["C", "D", "A", "B"]
+
+
+def test_query_filters_by_named_category(store):
+    assert entities(store, "What is the fastest Teladi ship?") == ["C"]
+    assert entities(store, "What is the slowest Argon ship?") == ["A"]
+
+
+def test_query_numeric_filter(store):
+    assert entities(store, "ships with speed under 600") == ["B", "A"]
+
+
+def test_generic_terms(store):
+    for term in ["Ships", "L-class", "Argon", "Teladi", "Speed", "Fighters"]:
+        assert store.is_generic_term(term), term
+    for term in ["Argon Nova", "Starburst Missile"]:
+        assert not store.is_generic_term(term), term
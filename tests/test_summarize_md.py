@@ -0,0 +1,76 @@
+# tests/test_summarize_md.py
+import asyncio
+import importlib
+import os
+from pathlib import Path
+from types import SimpleNamespace
+import pytest
+import config
+from build_state import BuildState
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def summarize_md(tmp_path_factory):
+    tiktoken = pytest.importorskip("tiktoken")
+    try:
+        tiktoken.get_encoding("cl100k_base")
+    except Exception as e:  # The encoding is downloaded on first use
+        pytest.skip(f"tiktoken encoding unavailable: {e}")
+    # The script reads its prompts relative to the repository root and opens the LLM cache on import
+    config.LLM_CACHE_PATH = str(tmp_path_factory.mktemp("cache") / "llm_cache.sqlite3")
+    cwd = os.getcwd()
+    os.chdir(REPO_ROOT)
+    try:
+        return importlib.import_module("01b_summarize_md")
+    finally:
+        os.chdir(cwd)
+
+
+def reply(content):
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def fake_client(fail_on):
+    async def create(model, messages, temperature):
+        if fail_on in messages[0]["content"]:
+            raise RuntimeError("backend unavailable")
+        return reply("A summary of the section.")
+    return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+PAGE = """# Argon Nova
+
+## Overview
+The Argon Nova is a medium fighter built by the Argon Federation for patrol duty and escort work.
+
+## History
+The Nova entered service after the Terran conflict, replacing older fighters in the Argon fleet.
+"""
+
+
+@pytest.fixture
+def pages(tmp_path, summarize_md, monkeypatch):
+    md_dir, out_dir = tmp_path / "md", tmp_path / "summarized"
+    md_dir.mkdir()
+    (md_dir / "nova.md").write_text(PAGE, "utf-8")
+    monkeypatch.setattr(summarize_md, "MD_PAGES_DIR", md_dir)
+    monkeypatch.setattr(summarize_md, "SUMMARIZED_PAGES_DIR", out_dir)
+    prompts = [str(REPO_ROOT / path) for path in (summarize_md.SUMMARIZER_PROMPT_PATH,)]
+    monkeypatch.setattr(summarize_md, "SUMMARIZER_PROMPT_PATH", prompts[0])
+    return lambda: BuildState(md_dir, out_dir, ".md", ".md", prompt_paths=prompts)
+
+
+def test_failed_llm_call_leaves_page_stale(summarize_md, pages, monkeypatch):
+    monkeypatch.setattr(summarize_md, "CLIENT", fake_client(fail_on="History"))
+    state = pages()
+    assert not asyncio.run(summarize_md.process_file("nova.md", state))
+    state.save()
+    assert pages().stale_inputs() == ["nova.md"]
+
+    monkeypatch.setattr(summarize_md, "CLIENT", fake_client(fail_on="never"))
+    state = pages()
+    assert asyncio.run(summarize_md.process_file("nova.md", state))
+    state.save()
+    assert pages().stale_inputs() == []